@@ -0,0 +1,476 @@
+"""
+Бенчмарки renamer.
+
+    python renamer_bench.py translit [--names N] [--repeat R]
+    python renamer_bench.py memory [--items N] [--dirs D]
+    python renamer_bench.py memo [--names N] [--sizes S1,S2,...]
+    python renamer_bench.py plan [--names N] [--workers W1,W2,...]
+    python renamer_bench.py suite [--depth D] [--fanout F] [--files N] [-o result.json]
+    python renamer_bench.py compare OLD.json NEW.json
+
+translit — скомпилированный движок транслита против исходного
+посимвольного прохода (результаты должны совпадать).
+memory — байт на элемент: список словарей против ItemStore.
+memo — попадания и скорость TranslitMemo при разных размерах памяти.
+plan — планирование имён в пуле процессов против одного процесса.
+suite — синтетическое дерево во временной папке и замер каждого этапа
+(транслит, сканирование, конфликты, сортировка, авто-решение, сессии,
+переименование): время, элементов/с, пик памяти; результат — JSON.
+compare — сравнение двух JSON-результатов suite (например, двух версий).
+"""
+
+import argparse
+import json
+import os
+import platform
+import random
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import renamer_core as core
+
+
+# типичные «кирпичики» имён: транслит, служебные префиксы, даты, цифры
+_NAME_WORDS = [
+    "dokument", "scan", "IMG", "foto", "otchet", "Moskva", "shchuka", "Zhurnal",
+    "yolka", "KHOROSHO", "tsvetok", "chaj", "shkola", "yubilej", "Yasha", "s'emka",
+    "podyezd", "kniga", "arkhiv", "leto", "zima", "DSC", "report", "final", "v2",
+]
+_NAME_SEPARATORS = ["_", "-", " ", ""]
+
+
+def make_names(count: int, seed: int = 0):
+    """Детерминированный список синтетических имён файлов (без расширений)."""
+    rnd = random.Random(seed)
+    names = []
+    for _ in range(count):
+        parts = []
+        for _ in range(rnd.randint(1, 4)):
+            if rnd.random() < 0.2:
+                parts.append(f"{rnd.randint(0, 9999):04d}")
+            else:
+                parts.append(rnd.choice(_NAME_WORDS))
+        names.append(rnd.choice(_NAME_SEPARATORS).join(parts))
+    return names
+
+
+def _best_time(func, names, repeat):
+    best = None
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        for name in names:
+            func(name)
+        elapsed = time.perf_counter() - t0
+        if best is None or elapsed < best:
+            best = elapsed
+    return best
+
+
+def bench_translit(count: int = 100_000, repeat: int = 3, seed: int = 0) -> dict:
+    """
+    Время исходного прохода и скомпилированного движка на одних и тех же
+    именах. Бросает AssertionError, если результаты расходятся.
+    """
+    names = make_names(count, seed)
+
+    for name in names:
+        expected = core._translit_reference(name)
+        got = core.translit_to_cyrillic(name)
+        assert got == expected, f"{name!r}: {got!r} != {expected!r}"
+
+    t_ref = _best_time(core._translit_reference, names, repeat)
+    t_new = _best_time(core.translit_to_cyrillic, names, repeat)
+
+    return {
+        "names": count,
+        "reference_sec": t_ref,
+        "engine_sec": t_new,
+        "reference_names_per_sec": count / t_ref if t_ref else 0.0,
+        "engine_names_per_sec": count / t_new if t_new else 0.0,
+        "speedup": t_ref / t_new if t_new else 0.0,
+    }
+
+
+def bench_memo(count: int = 200_000, sizes=(1024, 16384, 65536), seed: int = 0) -> list:
+    """
+    Один проход TranslitMemo.translit_many() по count именам для каждого
+    размера памяти имён (память слов — четверть от него). Результаты
+    сверяются с движком.
+    """
+    names = make_names(count, seed)
+    engine = core.get_translit_engine()
+    expected = [engine.translit(name) for name in names]
+
+    t0 = time.perf_counter()
+    for name in names:
+        engine.translit(name)
+    engine_sec = time.perf_counter() - t0
+
+    results = []
+    for size in sizes:
+        memo = core.TranslitMemo(engine, maxsize=size, word_maxsize=max(1, size // 4))
+        got = memo.translit_many(names)
+        assert got == expected, f"memo size {size}: результаты расходятся с движком"
+        stats = memo.stats()
+        stats["size"] = size
+        stats["speedup"] = engine_sec * stats["names_per_sec"] / count if count else 0.0
+        results.append(stats)
+    return results
+
+
+def bench_plan(count: int = 1_000_000, workers=(2, 4), chunk_size: int = core.PLAN_CHUNK_SIZE,
+               seed: int = 0) -> list:
+    """
+    Время iter_planned() на count записях (rel_dir, name, is_dir) для
+    каждого числа процессов против планирования в этом процессе.
+    Результаты должны совпадать по порядку и содержимому.
+    """
+    rnd = random.Random(seed)
+    entries = [(f"dir{rnd.randint(0, 999)}", name + rnd.choice(("", ".txt", ".jpg")), rnd.random() < 0.1)
+               for name in make_names(count, seed)]
+
+    # тот же пакетный путь, что у процессов пула, но в этом процессе
+    t0 = time.perf_counter()
+    new_names = core._plan_chunk([entry[1:] for entry in entries])
+    expected = [core.make_item(rel_dir, name, is_dir, new_name)
+                for (rel_dir, name, is_dir), new_name in zip(entries, new_names)]
+    serial_sec = time.perf_counter() - t0
+
+    results = []
+    for n in workers:
+        t0 = time.perf_counter()
+        got = list(core.iter_planned(iter(entries), n, chunk_size))
+        elapsed = time.perf_counter() - t0
+        assert got == expected, f"{n} процессов: результаты расходятся"
+        results.append({
+            "workers": n,
+            "entries": count,
+            "serial_sec": serial_sec,
+            "pool_sec": elapsed,
+            "speedup": serial_sec / elapsed if elapsed else 0.0,
+        })
+    return results
+
+
+def make_items(count: int, dirs: int = 1000, seed: int = 0):
+    """
+    Синтетические элементы-словари: count имён, разложенных по dirs папкам.
+    Как и при сканировании, элементы одной папки ссылаются на одну строку rel_dir.
+    """
+    rnd = random.Random(seed)
+    dir_names = [
+        "/".join(rnd.choice(_NAME_WORDS) + str(i) for _ in range(rnd.randint(1, 4)))
+        for i in range(dirs)
+    ]
+    return [core.make_item(rnd.choice(dir_names), name, False) for name in make_names(count, seed)]
+
+
+def _traced(build):
+    """(результат, байт) — сколько памяти осталось занято после build()."""
+    tracemalloc.start()
+    try:
+        before = tracemalloc.get_traced_memory()[0]
+        result = build()
+        after = tracemalloc.get_traced_memory()[0]
+    finally:
+        tracemalloc.stop()
+    return result, after - before
+
+
+def bench_memory(count: int = 100_000, dirs: int = 1000, seed: int = 0) -> dict:
+    """
+    Память модели на count элементах: список словарей (как раньше) и
+    ItemStore. Строки имён и папок уже существуют до замера, поэтому
+    в обоих случаях считаются только сами контейнеры элементов.
+    """
+    rows = [tuple(it[k] for k in core.ITEM_FIELDS) for it in make_items(count, dirs, seed)]
+
+    def build_dicts():
+        return [dict(zip(core.ITEM_FIELDS, row)) for row in rows]
+
+    def build_store():
+        store = core.ItemStore()
+        for rel_dir, old_name, new_name, do_rename, is_dir, locked, modified in rows:
+            store.add(rel_dir, old_name, new_name, is_dir, do_rename, locked, modified)
+        return store
+
+    dicts, dict_bytes = _traced(build_dicts)
+    store, store_bytes = _traced(build_store)
+    assert [dict(v) for v in store] == dicts
+
+    return {
+        "items": count,
+        "dirs": len(store.dirs),
+        "dicts_bytes": dict_bytes,
+        "store_bytes": store_bytes,
+        "dicts_bytes_per_item": dict_bytes / count if count else 0.0,
+        "store_bytes_per_item": store_bytes / count if count else 0.0,
+        "ratio": dict_bytes / store_bytes if store_bytes else 0.0,
+    }
+
+
+def _random_name(rnd, names: str) -> str:
+    """Имя без расширения: repeat — из повторяющихся «кирпичиков», unique — случайные буквы."""
+    if names == "unique":
+        return "".join(rnd.choice("abcdefghijklmnoprstuvyz") for _ in range(rnd.randint(4, 12)))
+    parts = []
+    for _ in range(rnd.randint(1, 3)):
+        if rnd.random() < 0.2:
+            parts.append(f"{rnd.randint(0, 9999):04d}")
+        else:
+            parts.append(rnd.choice(_NAME_WORDS))
+    return rnd.choice(_NAME_SEPARATORS).join(parts) or "x"
+
+
+def make_tree(root: str, depth: int = 3, fanout: int = 4, files: int = 50, cyrillic: float = 0.1,
+              collisions: float = 0.05, names: str = "repeat", seed: int = 0) -> dict:
+    """
+    Синтетическое дерево в root: depth уровней по fanout подпапок, в каждой
+    папке files файлов. Доля cyrillic имён уже кириллические (их транслит не
+    трогает), для доли collisions рядом с латинским файлом создаётся его
+    кириллический «двойник» — будущий конфликт. Возвращает счётчики.
+    """
+    rnd = random.Random(seed)
+    counts = {"dirs": 0, "files": 0, "cyrillic": 0, "collisions": 0}
+    exts = ("", ".txt", ".jpg", ".pdf", ".docx")
+
+    def unique(taken, name):
+        while name in taken:
+            name += "_" + str(rnd.randint(0, 9))
+        taken.add(name)
+        return name
+
+    def fill(path, level):
+        taken = set()
+        for _ in range(files):
+            base = _random_name(rnd, names)
+            ext = rnd.choice(exts)
+            if rnd.random() < cyrillic:
+                base = core.translit_to_cyrillic(base)
+                counts["cyrillic"] += 1
+            name = unique(taken, base + ext)
+            open(os.path.join(path, name), "wb").close()
+            counts["files"] += 1
+            twin = core.plan_new_name(name, False)
+            if twin != name and twin not in taken and rnd.random() < collisions:
+                taken.add(twin)
+                open(os.path.join(path, twin), "wb").close()
+                counts["files"] += 1
+                counts["collisions"] += 1
+        if level >= depth:
+            return
+        for _ in range(fanout):
+            sub = os.path.join(path, unique(taken, _random_name(rnd, names)))
+            os.mkdir(sub)
+            counts["dirs"] += 1
+            fill(sub, level + 1)
+
+    os.makedirs(root, exist_ok=True)
+    fill(root, 1)
+    return counts
+
+
+def _stage(results, name, count, func, trace=True):
+    """Выполняет func(), записывает время, скорость и пик памяти Python в results[name]."""
+    if trace:
+        tracemalloc.start()
+    try:
+        t0 = time.perf_counter()
+        value = func()
+        elapsed = time.perf_counter() - t0
+        peak = tracemalloc.get_traced_memory()[1] if trace else None
+    finally:
+        if trace:
+            tracemalloc.stop()
+    if callable(count):
+        count = count(value)
+    results[name] = {
+        "sec": elapsed,
+        "items": count,
+        "per_sec": count / elapsed if elapsed else 0.0,
+        "peak_bytes": peak,
+    }
+    return value
+
+
+def bench_suite(depth: int = 3, fanout: int = 4, files: int = 50, cyrillic: float = 0.1,
+                collisions: float = 0.05, names: str = "repeat", workers: int = core.DEFAULT_RENAME_WORKERS,
+                seed: int = 0, trace: bool = True, keep: bool = False) -> dict:
+    """
+    Все этапы на одном синтетическом дереве. Дерево создаётся во временной
+    папке и в конце удаляется (переименование его меняет), если не keep.
+    trace=False — без tracemalloc (точнее время, но без пика памяти).
+    """
+    tmp = tempfile.mkdtemp(prefix="renamer-bench-")
+    root = os.path.join(tmp, "tree")
+    params = {
+        "depth": depth, "fanout": fanout, "files": files, "cyrillic": cyrillic,
+        "collisions": collisions, "names": names, "workers": workers, "seed": seed, "trace": trace,
+    }
+    stages = {}
+    try:
+        t0 = time.perf_counter()
+        tree = make_tree(root, depth, fanout, files, cyrillic, collisions, names, seed)
+        generate_sec = time.perf_counter() - t0
+
+        listing = core.DirListing(root)
+        items = _stage(stages, "scan", len, lambda: core.scan_tree(root, listing=listing), trace)
+        n = len(items)
+
+        all_names = [info["old_name"] for info in items]
+        _stage(stages, "translit", n, lambda: [core.translit_to_cyrillic(name) for name in all_names], trace)
+
+        index = _stage(stages, "conflicts", n, lambda: core.ConflictIndex(root, items, listing=listing), trace)
+        conflicts_found = len(index.conflict_indices)
+
+        def sort_all():
+            sorter = core.SortIndex(items)
+            for col in core.SORT_COLUMNS:
+                sorter.order(col, index.conflict_indices)
+        _stage(stages, "sort", n * len(core.SORT_COLUMNS), sort_all, trace)
+
+        _stage(stages, "auto_resolve", conflicts_found,
+               lambda: core.auto_resolve_conflicts(root, items, index.conflict_indices,
+                                                   on_change=index.update, listing=listing), trace)
+
+        for fmt, ext in (("ndjson", core.SESSION_EXT), ("json", ".json")):
+            path = os.path.join(tmp, "session" + ext)
+            _stage(stages, f"session_save_{fmt}", n, lambda: core.save_session(path, root, items), trace)
+            _stage(stages, f"session_load_{fmt}", n, lambda: core.load_session(path), trace)
+            stages[f"session_save_{fmt}"]["file_bytes"] = os.path.getsize(path)
+
+        executor = core.RenameExecutor(root, items, index.conflict_indices, workers=workers)
+        _stage(stages, "rename", lambda _: executor.renamed, executor.run, trace)
+        stages["rename"]["errors"] = executor.errors
+    finally:
+        if not keep:
+            shutil.rmtree(tmp, ignore_errors=True)
+
+    return {
+        "tool": "renamer_bench suite",
+        "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "params": params,
+        "tree": dict(tree, items=n, conflicts=conflicts_found, generate_sec=generate_sec,
+                     path=tmp if keep else None),
+        "stages": stages,
+    }
+
+
+def compare_results(old: dict, new: dict) -> list:
+    """(этап, старое время, новое время, новое/старое) по этапам, которые есть в обоих."""
+    rows = []
+    for name, stage in new["stages"].items():
+        before = old["stages"].get(name)
+        if before is None:
+            continue
+        ratio = stage["sec"] / before["sec"] if before["sec"] else 0.0
+        rows.append((name, before["sec"], stage["sec"], ratio))
+    return rows
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(prog="renamer_bench", description="Бенчмарки renamer.")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p_tr = sub.add_parser("translit", help="движок транслита против исходного прохода")
+    p_tr.add_argument("--names", type=int, default=100_000, help="количество имён")
+    p_tr.add_argument("--repeat", type=int, default=3, help="повторов (берётся лучшее время)")
+    p_tr.add_argument("--seed", type=int, default=0)
+
+    p_memo = sub.add_parser("memo", help="память транслита: попадания и скорость")
+    p_memo.add_argument("--names", type=int, default=200_000, help="количество имён")
+    p_memo.add_argument("--sizes", default="1024,16384,65536",
+                        help="размеры памяти имён через запятую")
+    p_memo.add_argument("--seed", type=int, default=0)
+
+    p_plan = sub.add_parser("plan", help="планирование имён в пуле процессов")
+    p_plan.add_argument("--names", type=int, default=1_000_000, help="количество записей")
+    p_plan.add_argument("--workers", default="2,4", help="числа процессов через запятую")
+    p_plan.add_argument("--chunk", type=int, default=core.PLAN_CHUNK_SIZE, help="размер пачки")
+    p_plan.add_argument("--seed", type=int, default=0)
+
+    p_suite = sub.add_parser("suite", help="все этапы на синтетическом дереве, результат в JSON")
+    p_suite.add_argument("--depth", type=int, default=3, help="уровней вложенности")
+    p_suite.add_argument("--fanout", type=int, default=4, help="подпапок в каждой папке")
+    p_suite.add_argument("--files", type=int, default=50, help="файлов в каждой папке")
+    p_suite.add_argument("--cyrillic", type=float, default=0.1, help="доля уже кириллических имён")
+    p_suite.add_argument("--collisions", type=float, default=0.05,
+                         help="доля латинских файлов с кириллическим двойником рядом")
+    p_suite.add_argument("--names", choices=("repeat", "unique"), default="repeat",
+                         help="распределение имён: повторяющиеся слова или случайные")
+    p_suite.add_argument("-j", "--workers", type=int, default=core.DEFAULT_RENAME_WORKERS,
+                         help="потоков переименования")
+    p_suite.add_argument("--no-trace", action="store_true",
+                         help="без tracemalloc: точнее время, но без пика памяти")
+    p_suite.add_argument("--keep", action="store_true", help="не удалять дерево после замера")
+    p_suite.add_argument("-o", "--output", default=None, help="куда записать JSON (по умолчанию stdout)")
+    p_suite.add_argument("--seed", type=int, default=0)
+
+    p_cmp = sub.add_parser("compare", help="сравнить два результата suite")
+    p_cmp.add_argument("old", help="JSON прежней версии")
+    p_cmp.add_argument("new", help="JSON новой версии")
+
+    p_mem = sub.add_parser("memory", help="память модели: список словарей против ItemStore")
+    p_mem.add_argument("--items", type=int, default=100_000, help="количество элементов")
+    p_mem.add_argument("--dirs", type=int, default=1000, help="количество папок")
+    p_mem.add_argument("--seed", type=int, default=0)
+
+    args = parser.parse_args(argv)
+
+    if args.command == "translit":
+        res = bench_translit(args.names, args.repeat, args.seed)
+        print(f"имён:             {res['names']}")
+        print(f"исходный проход:  {res['reference_sec']:.3f} с "
+              f"({res['reference_names_per_sec']:,.0f} имён/с)")
+        print(f"движок:           {res['engine_sec']:.3f} с "
+              f"({res['engine_names_per_sec']:,.0f} имён/с)")
+        print(f"ускорение:        x{res['speedup']:.2f}")
+    elif args.command == "memo":
+        sizes = [int(x) for x in args.sizes.split(",") if x]
+        print(f"{'память':>8} {'имена':>7} {'слова':>7} {'имён/с':>12} {'ускорение':>10}")
+        for res in bench_memo(args.names, sizes, args.seed):
+            print(f"{res['size']:>8} {res['name_hit_rate']:>7.1%} {res['word_hit_rate']:>7.1%} "
+                  f"{res['names_per_sec']:>12,.0f} {res['speedup']:>9.2f}x")
+    elif args.command == "plan":
+        workers = [int(x) for x in args.workers.split(",") if x]
+        print(f"{'процессов':>9} {'записей':>9} {'1 процесс':>10} {'пул':>8} {'ускорение':>10}")
+        for res in bench_plan(args.names, workers, args.chunk, args.seed):
+            print(f"{res['workers']:>9} {res['entries']:>9} {res['serial_sec']:>9.2f}с "
+                  f"{res['pool_sec']:>7.2f}с {res['speedup']:>9.2f}x")
+    elif args.command == "suite":
+        res = bench_suite(args.depth, args.fanout, args.files, args.cyrillic, args.collisions,
+                          args.names, args.workers, args.seed, not args.no_trace, args.keep)
+        if args.output:
+            with open(args.output, "w", encoding="utf-8") as f:
+                json.dump(res, f, ensure_ascii=False, indent=2)
+        else:
+            json.dump(res, sys.stdout, ensure_ascii=False, indent=2)
+            print()
+        for name, st in res["stages"].items():
+            peak = f"{st['peak_bytes'] / 2**20:8.1f} МБ" if st["peak_bytes"] is not None else ""
+            print(f"{name:<20} {st['sec']:8.3f} с {st['per_sec']:>12,.0f}/с {peak}", file=sys.stderr)
+    elif args.command == "compare":
+        with open(args.old, encoding="utf-8") as f:
+            old = json.load(f)
+        with open(args.new, encoding="utf-8") as f:
+            new = json.load(f)
+        print(f"{'этап':<20} {'было':>9} {'стало':>9} {'стало/было':>11}")
+        for name, before, after, ratio in compare_results(old, new):
+            print(f"{name:<20} {before:8.3f}с {after:8.3f}с {ratio:>10.2f}x")
+    elif args.command == "memory":
+        res = bench_memory(args.items, args.dirs, args.seed)
+        print(f"элементов:        {res['items']} (папок: {res['dirs']})")
+        print(f"список словарей:  {res['dicts_bytes_per_item']:.0f} байт/элемент")
+        print(f"ItemStore:        {res['store_bytes_per_item']:.0f} байт/элемент")
+        print(f"экономия:         x{res['ratio']:.2f}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,2760 @@
+"""
+Ядро renamer без GUI: транслит, сканирование, конфликты, переименование.
+
+Модуль не импортирует tkinter и может использоваться из пакетных заданий
+и на серверах без графической оболочки (см. `python -m renamer --help`).
+"""
+
+import csv
+import errno
+import fnmatch
+import functools
+import os
+import re
+import json
+import multiprocessing
+import queue
+import stat
+import threading
+import time
+import unicodedata
+from array import array
+from bisect import bisect_left, bisect_right
+from collections import Counter, deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from itertools import accumulate
+
+import renamer_perf as perf
+
+
+# ==== НАСТРОЙКИ ТРАНСЛИТА (можно править руками) ===========================
+
+DEFAULT_MAPPING_MULTI = [
+    ("shch", "щ"),
+    ("sch", "щ"),
+    ("yo", "ё"),
+    ("jo", "ё"),
+    ("zh", "ж"),
+    ("kh", "х"),
+    ("ts", "ц"),
+    ("ch", "ч"),
+    ("sh", "ш"),
+    ("yu", "ю"),
+    ("ju", "ю"),
+    ("ya", "я"),
+    ("ja", "я"),
+    ("ye", "е"),
+    ("je", "е"),
+]
+
+DEFAULT_MAPPING_SINGLE = {
+    "a": "а",
+    "b": "б",
+    "v": "в",
+    "g": "г",
+    "d": "д",
+    "e": "е",
+    "z": "з",
+    "i": "и",
+    "j": "й",
+    "y": "й",
+    "k": "к",
+    "l": "л",
+    "m": "м",
+    "n": "н",
+    "o": "о",
+    "p": "п",
+    "r": "р",
+    "s": "с",
+    "t": "т",
+    "u": "у",
+    "f": "ф",
+    "h": "х",
+    "c": "ц",
+    "x": "кс",
+    "q": "к",
+    "w": "в",
+    "'": "ь",   # апостроф = мягкий знак
+}
+
+
+TRANSLIT_CONFIG_PATH = os.path.join(os.path.dirname(__file__), "translit_config.json")
+
+# как часто (в секундах) проверять, не изменился ли translit_config.json
+CONFIG_CHECK_INTERVAL = 1.0
+
+# размеры LRU-памяти транслита: целые имена и отдельные слова
+TRANSLIT_MEMO_SIZE = 65536
+TRANSLIT_WORD_MEMO_SIZE = 16384
+
+
+def load_translit_config():
+    mapping_multi = DEFAULT_MAPPING_MULTI
+    mapping_single = DEFAULT_MAPPING_SINGLE
+
+    cfg_path = TRANSLIT_CONFIG_PATH
+    if os.path.isfile(cfg_path):
+        try:
+            with open(cfg_path, "r", encoding="utf-8") as f:
+                cfg = json.load(f)
+            if "mapping_multi" in cfg:
+                mapping_multi = [(a, b) for a, b in cfg["mapping_multi"]]
+            if "mapping_single" in cfg:
+                m = dict(DEFAULT_MAPPING_SINGLE)
+                m.update(cfg["mapping_single"])
+                mapping_single = m
+        except Exception:
+            pass
+
+    return mapping_multi, mapping_single
+
+
+def _config_signature():
+    """(mtime, размер) файла конфигурации или None, если файла нет."""
+    try:
+        st = os.stat(TRANSLIT_CONFIG_PATH)
+    except OSError:
+        return None
+    return (st.st_mtime_ns, st.st_size)
+
+
+_config_sig = _config_signature()
+MAPPING_MULTI, MAPPING_SINGLE = load_translit_config()
+
+
+def apply_case(src: str, dst: str) -> str:
+    """Переносит регистр исходного фрагмента транслита на кириллицу."""
+    if src.isupper():
+        return dst.upper()
+    if src[0].isupper() and src[1:].islower():
+        return dst.capitalize()
+    return dst
+
+
+# символы, с которых начинается замена (как в посимвольном проходе)
+_TRANSLIT_CHARS = "abcdefghijklmnopqrstuvwxyz'"
+
+
+class TranslitEngine:
+    """
+    Транслитератор, один раз скомпилированный из MAPPING_MULTI/MAPPING_SINGLE.
+
+    Многобуквенные сочетания собраны в регулярное выражение-альтернативу
+    в порядке MAPPING_MULTI (первое подходящее сочетание выигрывает, как и в
+    посимвольном проходе), одиночные буквы заменяются через str.translate.
+    Результат побайтно совпадает с _translit_reference().
+    """
+
+    def __init__(self, mapping_multi, mapping_single):
+        self.mapping_multi = mapping_multi
+        self.mapping_single = mapping_single
+
+        # latin -> кириллица как есть / с уже применённым регистром latin
+        self._raw = {}
+        self._same_case = {}
+        alternatives = []
+        for latin, cyr in mapping_multi:
+            # пустые сочетания и сочетания с «чужой» первой буквой
+            # посимвольный проход никогда не применяет
+            if not latin or latin[0] not in _TRANSLIT_CHARS or latin in self._raw:
+                continue
+            self._raw[latin] = cyr
+            self._same_case[latin] = apply_case(latin, cyr)
+            alternatives.append(re.escape(latin))
+
+        self._multi_re = re.compile("(" + "|".join(alternatives) + ")") if alternatives else None
+
+        # таблица для одиночных ASCII-символов, включая заглавные
+        self._single_table = {}
+        for ch in _TRANSLIT_CHARS:
+            if ch not in mapping_single:
+                continue
+            cyr = mapping_single[ch]
+            self._single_table[ord(ch)] = apply_case(ch, cyr)
+            up = ch.upper()
+            if up != ch:
+                self._single_table[ord(up)] = apply_case(up, cyr)
+
+    def translit(self, text: str) -> str:
+        # не-ASCII имена (редкость для транслита) считаем эталонным проходом:
+        # там бывают символы, у которых lower() меняет длину строки
+        if not text.isascii():
+            return _translit_reference(text, self.mapping_multi, self.mapping_single)
+
+        table = self._single_table
+        if self._multi_re is None:
+            return text.translate(table)
+
+        lower = text.lower()
+        parts = self._multi_re.split(lower)
+
+        if lower == text:
+            same_case = self._same_case
+            for k in range(0, len(parts), 2):
+                parts[k] = parts[k].translate(table)
+            for k in range(1, len(parts), 2):
+                parts[k] = same_case[parts[k]]
+            return "".join(parts)
+
+        # смешанный регистр: берём исходные фрагменты по смещениям
+        result = []
+        pos = 0
+        for k, part in enumerate(parts):
+            end = pos + len(part)
+            src = text[pos:end]
+            if k % 2 == 0:
+                result.append(src.translate(table))
+            elif src == part:
+                result.append(self._same_case[part])
+            else:
+                result.append(apply_case(src, self._raw[part]))
+            pos = end
+        return "".join(result)
+
+
+_translit_engine = None
+_config_checked_at = time.monotonic()
+
+
+def reload_translit_config():
+    """Перечитывает translit_config.json и сбрасывает скомпилированный движок."""
+    global MAPPING_MULTI, MAPPING_SINGLE, _config_sig, _translit_engine
+    _config_sig = _config_signature()
+    MAPPING_MULTI, MAPPING_SINGLE = load_translit_config()
+    _translit_engine = None
+
+
+def get_translit_engine() -> TranslitEngine:
+    """
+    Текущий движок транслита.
+
+    Раз в CONFIG_CHECK_INTERVAL секунд проверяет mtime/размер
+    translit_config.json и при изменении перечитывает конфигурацию.
+    Движок также пересобирается, если MAPPING_MULTI/MAPPING_SINGLE
+    были заменены другими объектами.
+    """
+    global _translit_engine, _config_checked_at
+
+    now = time.monotonic()
+    if now - _config_checked_at >= CONFIG_CHECK_INTERVAL:
+        _config_checked_at = now
+        if _config_signature() != _config_sig:
+            reload_translit_config()
+
+    engine = _translit_engine
+    if (engine is None
+            or engine.mapping_multi is not MAPPING_MULTI
+            or engine.mapping_single is not MAPPING_SINGLE):
+        engine = _translit_engine = TranslitEngine(MAPPING_MULTI, MAPPING_SINGLE)
+    return engine
+
+
+def translit_to_cyrillic(text: str) -> str:
+    """
+    Перевод простого транслита → кириллицу,
+    с сохранением регистра и поддержкой апострофа.
+    """
+    return get_translit_engine().translit(text)
+
+
+class TranslitMemo:
+    """
+    Транслит с памятью поверх TranslitEngine.
+
+    Имена в реальных деревьях сильно повторяются (IMG_, scan_, одни и те же
+    папки по годам), поэтому результат запоминается в LRU по целому имени,
+    а при промахе ASCII-имя режется на слова (серии букв и апострофов —
+    через их границу не проходит ни одно сочетание) и каждое слово берётся
+    из второй LRU. Результат совпадает с engine.translit().
+
+    stats() — попадания в обе памяти и скорость translit_many(), чтобы
+    подбирать размеры.
+    """
+
+    def __init__(self, engine: TranslitEngine, maxsize: int = TRANSLIT_MEMO_SIZE,
+                 word_maxsize: int = TRANSLIT_WORD_MEMO_SIZE):
+        self.engine = engine
+        # символы, из которых состоят слова: буквы, апостроф и всё, что встречается в сочетаниях
+        word_chars = set(_TRANSLIT_CHARS) | set(_TRANSLIT_CHARS.upper())
+        for latin in engine._raw:
+            word_chars.update(latin)
+            word_chars.update(latin.upper())
+        self._word_re = re.compile("([" + "".join(re.escape(ch) for ch in sorted(word_chars)) + "]+)")
+        self._word = functools.lru_cache(maxsize=word_maxsize)(engine.translit)
+        self._name = functools.lru_cache(maxsize=maxsize)(self._translit_words)
+        self.names = 0
+        self.elapsed = 0.0
+
+    def _translit_words(self, name: str) -> str:
+        if not name.isascii():
+            return self.engine.translit(name)
+        parts = self._word_re.split(name)
+        word = self._word
+        for k in range(1, len(parts), 2):
+            parts[k] = word(parts[k])
+        return "".join(parts)
+
+    def translit(self, name: str) -> str:
+        return self._name(name)
+
+    def translit_many(self, names) -> list:
+        """Транслит для каждого имени из names (повторы считаются один раз)."""
+        t0 = time.perf_counter()
+        translit = self._name
+        result = [translit(name) for name in names]
+        self.elapsed += time.perf_counter() - t0
+        self.names += len(result)
+        return result
+
+    def stats(self) -> dict:
+        names = self._name.cache_info()
+        words = self._word.cache_info()
+        name_calls = names.hits + names.misses
+        word_calls = words.hits + words.misses
+        return {
+            "names": self.names,
+            "names_per_sec": self.names / self.elapsed if self.elapsed else 0.0,
+            "name_hits": names.hits,
+            "name_misses": names.misses,
+            "name_hit_rate": names.hits / name_calls if name_calls else 0.0,
+            "name_cache_size": names.currsize,
+            "name_cache_max": names.maxsize,
+            "word_hits": words.hits,
+            "word_misses": words.misses,
+            "word_hit_rate": words.hits / word_calls if word_calls else 0.0,
+            "word_cache_size": words.currsize,
+            "word_cache_max": words.maxsize,
+        }
+
+
+_translit_memo = None
+
+
+def get_translit_memo() -> TranslitMemo:
+    """Память транслита для текущего движка (сбрасывается вместе с ним)."""
+    global _translit_memo
+    engine = get_translit_engine()
+    memo = _translit_memo
+    if memo is None or memo.engine is not engine:
+        memo = _translit_memo = TranslitMemo(engine)
+    return memo
+
+
+def translit_many(names) -> list:
+    """Пакетный translit_to_cyrillic() с памятью повторяющихся имён и слов."""
+    return get_translit_memo().translit_many(names)
+
+
+def translit_stats() -> dict:
+    """Статистика памяти транслита (см. TranslitMemo.stats())."""
+    return get_translit_memo().stats()
+
+
+def _translit_reference(text: str, mapping_multi=None, mapping_single=None) -> str:
+    """
+    Исходный посимвольный проход (эталон для движка и бенчмарка).
+    """
+    if mapping_multi is None:
+        mapping_multi = MAPPING_MULTI
+    if mapping_single is None:
+        mapping_single = MAPPING_SINGLE
+
+    result = []
+    i = 0
+    lower = text.lower()
+
+    while i < len(text):
+        ch = text[i]
+        ch_lower = lower[i]
+
+        if not ("a" <= ch_lower <= "z" or ch_lower == "'"):
+            result.append(ch)
+            i += 1
+            continue
+
+        replaced = False
+
+        for latin, cyr in mapping_multi:
+            ln = len(latin)
+            segment = text[i:i+ln]
+            if lower[i:i+ln] == latin:
+                result.append(apply_case(segment, cyr))
+                i += ln
+                replaced = True
+                break
+        if replaced:
+            continue
+
+        if ch_lower in mapping_single:
+            result.append(apply_case(ch, mapping_single[ch_lower]))
+        else:
+            result.append(ch)
+
+        i += 1
+
+    return "".join(result)
+
+
+def has_cyrillic(s: str) -> bool:
+    return any("а" <= ch.lower() <= "я" or ch in ("ё", "Ё") for ch in s)
+
+
+# ==== МОДЕЛЬ ЭЛЕМЕНТОВ ======================================================
+#
+# Элемент — словарь (или ItemView из ItemStore с тем же набором ключей):
+# {
+#   "rel_dir": str,      # путь родительской папки относительно корня ("" — корень)
+#   "old_name": str,
+#   "new_name": str,
+#   "do_rename": bool,
+#   "is_dir": bool,
+#   "locked": bool,
+#   "modified": bool,    # [M] – кириллическое имя изменено вручную
+# }
+
+ITEM_FIELDS = ("rel_dir", "old_name", "new_name", "do_rename", "is_dir", "locked", "modified")
+
+
+def rel_path_of(info) -> str:
+    """Путь элемента относительно корня."""
+    return os.path.join(info["rel_dir"], info["old_name"]) if info["rel_dir"] else info["old_name"]
+
+
+def parent_dir_of(root: str, rel_dir: str) -> str:
+    return os.path.join(root, rel_dir) if rel_dir else root
+
+
+def plan_new_name(name: str, is_dir: bool) -> str:
+    """Новое имя по транслиту; у файлов расширение не трогаем."""
+    return plan_new_names((name,), is_dir)[0]
+
+
+def plan_new_names(names, is_dir: bool) -> list:
+    """plan_new_name() для пачки имён одного типа (через translit_many)."""
+    names = list(names)
+    if is_dir:
+        stems, exts = names, None
+    else:
+        split = [os.path.splitext(name) for name in names]
+        stems = [base for base, _ in split]
+        exts = [ext for _, ext in split]
+    # кириллические имена не трогаем; транслит — только для остальных
+    todo = [k for k, name in enumerate(names) if not has_cyrillic(name)]
+    converted = translit_many(stems[k] for k in todo)
+    result = list(names)
+    for k, new in zip(todo, converted):
+        result[k] = new if exts is None else new + exts[k]
+    return result
+
+
+def make_item(rel_dir: str, name: str, is_dir: bool, new_name=None) -> dict:
+    """Новый элемент; new_name — уже посчитанное plan_new_name() (при пакетной обработке)."""
+    if new_name is None:
+        new_name = plan_new_name(name, is_dir)
+    return {
+        "rel_dir": rel_dir,
+        "old_name": name,
+        "new_name": new_name,
+        "do_rename": new_name != name,
+        "is_dir": is_dir,
+        "locked": False,
+        "modified": False,
+    }
+
+
+def normalize_item(it: dict) -> dict:
+    """Приводит словарь из сессии/плана к полному набору полей."""
+    return {
+        "rel_dir": it.get("rel_dir", ""),
+        "old_name": it.get("old_name", ""),
+        "new_name": it.get("new_name", it.get("old_name", "")),
+        "do_rename": bool(it.get("do_rename", False)),
+        "is_dir": bool(it.get("is_dir", False)),
+        "locked": bool(it.get("locked", False)),
+        "modified": bool(it.get("modified", False)),
+    }
+
+
+def update_modified_flag(info):
+    """[M]: кириллическое исходное имя и новое имя, отличное от старого."""
+    info["modified"] = has_cyrillic(info["old_name"]) and info["new_name"] != info["old_name"]
+
+
+# битовые флаги элемента в ItemStore.flags
+FLAG_IS_DIR = 1
+FLAG_DO_RENAME = 2
+FLAG_LOCKED = 4
+FLAG_MODIFIED = 8
+# элемент исчез с диска (ItemStore.remove); в ITEM_FIELDS не входит,
+# читается как info.get("removed")
+FLAG_REMOVED = 16
+
+_FLAG_BITS = {
+    "is_dir": FLAG_IS_DIR,
+    "do_rename": FLAG_DO_RENAME,
+    "locked": FLAG_LOCKED,
+    "modified": FLAG_MODIFIED,
+    "removed": FLAG_REMOVED,
+}
+
+
+class ItemView:
+    """
+    Элемент ItemStore с интерфейсом словаря: info["new_name"],
+    info["locked"] = True, info.get("modified", False), dict(info).
+    """
+
+    __slots__ = ("_store", "_idx")
+
+    def __init__(self, store, idx: int):
+        self._store = store
+        self._idx = idx
+
+    def __getitem__(self, key):
+        store = self._store
+        if key == "old_name":
+            return store.old_names[self._idx]
+        if key == "new_name":
+            return store.new_names[self._idx]
+        if key == "rel_dir":
+            return store.dirs[store.dir_ids[self._idx]]
+        return bool(store.flags[self._idx] & _FLAG_BITS[key])
+
+    def __setitem__(self, key, value):
+        store = self._store
+        if key == "old_name":
+            store.old_names[self._idx] = value
+        elif key == "new_name":
+            store.new_names[self._idx] = value
+        elif key == "rel_dir":
+            store.dir_ids[self._idx] = store.intern_dir(value)
+        else:
+            bit = _FLAG_BITS[key]
+            if value:
+                store.flags[self._idx] |= bit
+            else:
+                store.flags[self._idx] &= ~bit
+
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def keys(self):
+        return ITEM_FIELDS
+
+    def __iter__(self):
+        return iter(ITEM_FIELDS)
+
+    def __contains__(self, key):
+        return key in ITEM_FIELDS
+
+    def __repr__(self):
+        return f"ItemView({dict(self)!r})"
+
+
+class ItemStore:
+    """
+    Компактное хранилище элементов по столбцам.
+
+    rel_dir хранится один раз в таблице папок (dirs), у элемента — только
+    номер папки в array("I"); is_dir/do_rename/locked/modified упакованы
+    в один байт bytearray. Для остального кода хранилище выглядит как
+    список словарей: len(), items[idx] (ItemView), итерация, append/extend.
+
+    dir_mtimes — rel_dir -> st_mtime_ns папки на момент чтения её содержимого
+    (заполняется сканированием и сессией, нужен для rescan).
+
+    Элементы не удаляются (индексы остальных не должны сдвигаться):
+    remove() только помечает элемент FLAG_REMOVED, removed — число таких.
+    Сессия, план и rescan их пропускают, таблица не показывает.
+    """
+
+    def __init__(self, items=None):
+        self.dirs = []
+        self.dir_mtimes = {}
+        self.removed = 0
+        self._dir_ids = {}
+        self.dir_ids = array("I")
+        self.old_names = []
+        self.new_names = []
+        self.flags = bytearray()
+        if items is not None:
+            self.extend(items)
+
+    def intern_dir(self, rel_dir: str) -> int:
+        dir_id = self._dir_ids.get(rel_dir)
+        if dir_id is None:
+            dir_id = len(self.dirs)
+            self.dirs.append(rel_dir)
+            self._dir_ids[rel_dir] = dir_id
+        return dir_id
+
+    def add(self, rel_dir: str, old_name: str, new_name: str, is_dir: bool, do_rename: bool,
+            locked: bool = False, modified: bool = False) -> int:
+        """Добавляет элемент без промежуточного словаря; возвращает его индекс."""
+        self.dir_ids.append(self.intern_dir(rel_dir))
+        self.old_names.append(old_name)
+        # одинаковые имена (кириллица, исключённые) хранятся одной строкой
+        self.new_names.append(old_name if new_name == old_name else new_name)
+        self.flags.append(
+            (FLAG_IS_DIR if is_dir else 0)
+            | (FLAG_DO_RENAME if do_rename else 0)
+            | (FLAG_LOCKED if locked else 0)
+            | (FLAG_MODIFIED if modified else 0)
+        )
+        return len(self.flags) - 1
+
+    def add_packed(self, rel_dir: str, old_name: str, new_name: str, flags: int) -> int:
+        """add() с уже упакованными флагами FLAG_* (чтение потоковой сессии)."""
+        self.dir_ids.append(self.intern_dir(rel_dir))
+        self.old_names.append(old_name)
+        self.new_names.append(new_name)
+        self.flags.append(flags)
+        return len(self.flags) - 1
+
+    def append(self, info):
+        self.add(info["rel_dir"], info["old_name"], info["new_name"], info["is_dir"],
+                 info["do_rename"], info["locked"], info["modified"])
+
+    def extend(self, items):
+        for info in items:
+            self.append(info)
+
+    def remove(self, idx: int):
+        """Помечает элемент исчезнувшим с диска; он перестаёт участвовать в переименовании."""
+        flags = self.flags[idx]
+        if not flags & FLAG_REMOVED:
+            self.flags[idx] = (flags | FLAG_REMOVED) & ~FLAG_DO_RENAME
+            self.removed += 1
+
+    def __len__(self):
+        return len(self.flags)
+
+    def __getitem__(self, idx: int) -> ItemView:
+        n = len(self.flags)
+        if idx < 0:
+            idx += n
+        if not 0 <= idx < n:
+            raise IndexError("ItemStore index out of range")
+        return ItemView(self, idx)
+
+    def __iter__(self):
+        for idx in range(len(self.flags)):
+            yield ItemView(self, idx)
+
+
+# ==== СНИМОК СОДЕРЖИМОГО ПАПОК ==============================================
+
+def _fold_name(name: str) -> str:
+    return unicodedata.normalize("NFC", name).casefold()
+
+
+def _is_case_insensitive(path: str) -> bool:
+    """Грубая проверка: различает ли файловая система под path регистр имён."""
+    if os.path.normcase("A") == "a":
+        return True
+    swapped = path.swapcase()
+    if swapped == path:
+        return False
+    try:
+        return os.path.samefile(path, swapped)
+    except OSError:
+        return False
+
+
+class DirListing:
+    """
+    Снимок содержимого папок дерева: rel_dir -> множество имён.
+
+    Заполняется при сканировании (os.walk и так читает каждую папку),
+    остальные папки читаются лениво одним os.listdir. Проверка «есть ли
+    на диске parent/name» сводится к поиску в множестве вместо stat на
+    каждый элемент — это важно на SMB/NFS.
+
+    Снимок сам за диском не следит: invalidate() сбрасывает его (целиком
+    или по папке), revalidate() перечитывает только папки, у которых
+    изменился mtime.
+    """
+
+    def __init__(self, root: str = ""):
+        self.root = root
+        self.case_insensitive = _is_case_insensitive(root) if root else False
+        self._names = {}
+        self._folded = {}
+        self._mtimes = {}
+
+    def record(self, rel_dir: str, names, mtime_ns=None):
+        names = set(names)
+        self._names[rel_dir] = names
+        if self.case_insensitive:
+            self._folded[rel_dir] = {_fold_name(n) for n in names}
+        self._mtimes[rel_dir] = mtime_ns
+
+    def _load(self, rel_dir: str):
+        path = parent_dir_of(self.root, rel_dir)
+        try:
+            mtime_ns = os.stat(path).st_mtime_ns
+            names = os.listdir(path)
+        except OSError:
+            mtime_ns, names = None, ()
+        self.record(rel_dir, names, mtime_ns)
+
+    def names(self, rel_dir: str) -> set:
+        if rel_dir not in self._names:
+            self._load(rel_dir)
+        return self._names[rel_dir]
+
+    def exists(self, rel_dir: str, name: str) -> bool:
+        # имена с разделителями пути, "." и ".." — не простые записи папки
+        if not name or name in (".", "..") or os.sep in name or (os.altsep and os.altsep in name):
+            return os.path.exists(os.path.join(parent_dir_of(self.root, rel_dir), name))
+
+        if name in self.names(rel_dir):
+            return True
+        if self.case_insensitive and _fold_name(name) in self._folded[rel_dir]:
+            # правила сравнения у ФС и casefold() немного различаются — уточняем
+            return os.path.exists(os.path.join(parent_dir_of(self.root, rel_dir), name))
+        return False
+
+    def mtimes(self) -> dict:
+        """rel_dir -> st_mtime_ns прочитанных папок (копия)."""
+        return {rel_dir: m for rel_dir, m in self._mtimes.items() if m is not None}
+
+    def invalidate(self, rel_dir=None):
+        """Забывает содержимое одной папки или (rel_dir=None) всех."""
+        if rel_dir is None:
+            self._names.clear()
+            self._folded.clear()
+            self._mtimes.clear()
+            return
+        self._names.pop(rel_dir, None)
+        self._folded.pop(rel_dir, None)
+        self._mtimes.pop(rel_dir, None)
+
+    def revalidate(self) -> list:
+        """
+        Перечитывает папки, у которых изменился mtime (один stat на папку).
+        Возвращает список изменившихся rel_dir.
+        """
+        changed = []
+        for rel_dir, mtime_ns in list(self._mtimes.items()):
+            try:
+                current = os.stat(parent_dir_of(self.root, rel_dir)).st_mtime_ns
+            except OSError:
+                current = None
+            if current != mtime_ns:
+                self._load(rel_dir)
+                changed.append(rel_dir)
+        return changed
+
+
+# ==== СКАНИРОВАНИЕ ==========================================================
+
+# планирование имён в пуле процессов: по умолчанию выключено (1 — в этом процессе)
+DEFAULT_PLAN_WORKERS = 1
+PLAN_CHUNK_SIZE = 10000
+
+
+def _init_plan_worker(mapping_multi, mapping_single):
+    # таблицы родителя, а не перечитанные из файла: они могли быть заменены в памяти
+    global MAPPING_MULTI, MAPPING_SINGLE
+    MAPPING_MULTI, MAPPING_SINGLE = mapping_multi, mapping_single
+
+
+def _plan_chunk(entries) -> list:
+    """Новые имена для пачки (name, is_dir); выполняется в процессе пула."""
+    result = [None] * len(entries)
+    for is_dir in (True, False):
+        positions = [k for k, entry in enumerate(entries) if entry[1] == is_dir]
+        new_names = plan_new_names([entries[k][0] for k in positions], is_dir)
+        for k, new_name in zip(positions, new_names):
+            result[k] = new_name
+    return result
+
+
+def iter_planned(entries, workers: int, chunk_size: int = PLAN_CHUNK_SIZE):
+    """
+    Элементы-словари для потока (rel_dir, name, is_dir) в том же порядке.
+
+    Новые имена считает пул из workers процессов пачками по chunk_size; в
+    работе не больше 2 * workers пачек, результаты забираются по порядку
+    отправки, так что итог не зависит от того, какой процесс успел первым.
+    В процессы уходят только (name, is_dir) — папка для транслита не нужна.
+    """
+    # spawn, а не fork: обход идёт в фоновом потоке, fork из многопоточного процесса небезопасен
+    pool = ProcessPoolExecutor(
+        max_workers=workers,
+        mp_context=multiprocessing.get_context("spawn"),
+        initializer=_init_plan_worker,
+        initargs=(MAPPING_MULTI, MAPPING_SINGLE),
+    )
+    pending = deque()
+
+    def finished(chunk, future):
+        for (rel_dir, name, is_dir), new_name in zip(chunk, future.result()):
+            yield make_item(rel_dir, name, is_dir, new_name)
+
+    try:
+        chunk = []
+        for entry in entries:
+            chunk.append(entry)
+            if len(chunk) >= chunk_size:
+                pending.append((chunk, pool.submit(_plan_chunk, [e[1:] for e in chunk])))
+                chunk = []
+                if len(pending) >= 2 * workers:
+                    yield from finished(*pending.popleft())
+        if chunk:
+            pending.append((chunk, pool.submit(_plan_chunk, [e[1:] for e in chunk])))
+        while pending:
+            yield from finished(*pending.popleft())
+    finally:
+        pool.shutdown(wait=True, cancel_futures=True)
+
+
+def _walk_dirs(root: str, should_stop=None, listing=None):
+    """os.walk с относительными путями, остановкой и записью в listing."""
+    for dirpath, dirnames, filenames in os.walk(root):
+        if should_stop is not None and should_stop():
+            return
+
+        rel_dir = os.path.relpath(dirpath, root)
+        if rel_dir == ".":
+            rel_dir = ""
+
+        if listing is not None:
+            try:
+                mtime_ns = os.stat(dirpath).st_mtime_ns
+            except OSError:
+                mtime_ns = None
+            listing.record(rel_dir, dirnames + filenames, mtime_ns)
+
+        yield rel_dir, dirnames, filenames
+
+
+def iter_scan(root: str, should_stop=None, listing=None, plan_workers: int = DEFAULT_PLAN_WORKERS):
+    """
+    Обходит дерево и выдаёт элементы: в каждой папке сначала подпапки, затем файлы.
+    should_stop — необязательная функция без аргументов; если она вернула True,
+    обход прекращается перед следующей папкой. Если передан listing
+    (DirListing), в него записывается содержимое каждой пройденной папки.
+    plan_workers > 1 — новые имена считаются в пуле процессов (iter_planned).
+    """
+    walk = _walk_dirs(root, should_stop, listing)
+
+    if plan_workers > 1:
+        entries = (
+            (rel_dir, name, is_dir)
+            for rel_dir, dirnames, filenames in walk
+            for names, is_dir in ((dirnames, True), (filenames, False))
+            for name in names
+        )
+        yield from iter_planned(entries, plan_workers)
+        return
+
+    for rel_dir, dirnames, filenames in walk:
+        # ПОДДИРЕКТОРИИ
+        for dname, new_name in zip(dirnames, plan_new_names(dirnames, True)):
+            yield make_item(rel_dir, dname, True, new_name)
+
+        # ФАЙЛЫ
+        for fname, new_name in zip(filenames, plan_new_names(filenames, False)):
+            yield make_item(rel_dir, fname, False, new_name)
+
+
+@perf.timed("scan")
+def scan_tree(root: str, listing=None, plan_workers: int = DEFAULT_PLAN_WORKERS) -> ItemStore:
+    if listing is None:
+        listing = DirListing(root)
+    store = ItemStore(iter_scan(root, listing=listing, plan_workers=plan_workers))
+    store.dir_mtimes = listing.mtimes()
+    return store
+
+
+def _items_by_dir(items) -> dict:
+    """rel_dir -> индексы элементов по возрастанию."""
+    by_dir = {}
+    if isinstance(items, ItemStore):
+        by_id = {}
+        flags = items.flags
+        for idx, dir_id in enumerate(items.dir_ids):
+            if flags[idx] & FLAG_REMOVED:
+                continue
+            bucket = by_id.get(dir_id)
+            if bucket is None:
+                by_id[dir_id] = [idx]
+            else:
+                bucket.append(idx)
+        for dir_id, bucket in by_id.items():
+            by_dir[items.dirs[dir_id]] = bucket
+    else:
+        for idx, info in enumerate(items):
+            by_dir.setdefault(info["rel_dir"], []).append(idx)
+    return by_dir
+
+
+def iter_rescan(root: str, items, should_stop=None, listing=None, stats=None):
+    """
+    Повторный обход дерева с учётом прежних элементов items.
+
+    На каждую папку — один stat. Если её mtime совпадает с сохранённым в
+    items.dir_mtimes, содержимое берётся из прежних элементов без чтения
+    папки (подпапки всё равно проверяются: mtime меняется только от
+    изменений непосредственного содержимого). Изменившиеся папки читаются
+    заново: новые записи добавляются, исчезнувшие (вместе с поддеревьями)
+    пропадают, у сохранившихся остаются правки пользователя.
+
+    Выдаёт элементы-словари в порядке обхода, как iter_scan. stats (dict)
+    заполняется счётчиками: dirs, changed_dirs, kept, added, removed.
+    """
+    old_mtimes = getattr(items, "dir_mtimes", {})
+    by_dir = _items_by_dir(items)
+    counters = {"dirs": 0, "changed_dirs": 0, "kept": 0, "added": 0, "removed": 0}
+
+    stack = [""]
+    while stack:
+        if should_stop is not None and should_stop():
+            return
+        rel_dir = stack.pop()
+        path = parent_dir_of(root, rel_dir)
+        try:
+            # корень может быть ссылкой, вложенные ссылки на папки os.walk не обходит
+            st = os.stat(path) if not rel_dir else os.lstat(path)
+        except OSError:
+            continue
+        if not stat.S_ISDIR(st.st_mode):
+            continue
+        mtime_ns = st.st_mtime_ns
+        counters["dirs"] += 1
+
+        old = by_dir.get(rel_dir, ())
+        if old_mtimes.get(rel_dir) == mtime_ns:
+            found = [dict(items[idx]) for idx in old]
+            counters["kept"] += len(found)
+        else:
+            counters["changed_dirs"] += 1
+            try:
+                with os.scandir(path) as it:
+                    entries = []
+                    for entry in it:
+                        try:
+                            is_dir = entry.is_dir()
+                        except OSError:
+                            is_dir = False
+                        entries.append((entry.name, is_dir))
+            except OSError:
+                entries = []
+            old_by_name = {items[idx]["old_name"]: idx for idx in old}
+            found = []
+            # как в os.walk: сначала подпапки, затем файлы
+            for name, is_dir in [e for e in entries if e[1]] + [e for e in entries if not e[1]]:
+                idx = old_by_name.get(name)
+                if idx is not None and items[idx]["is_dir"] == is_dir:
+                    found.append(dict(items[idx]))
+                    counters["kept"] += 1
+                else:
+                    found.append(make_item(rel_dir, name, is_dir))
+                    counters["added"] += 1
+
+        if listing is not None:
+            listing.record(rel_dir, [info["old_name"] for info in found], mtime_ns)
+        yield from found
+
+        subdirs = [info["old_name"] for info in found if info["is_dir"]]
+        stack.extend(os.path.join(rel_dir, name) if rel_dir else name for name in reversed(subdirs))
+
+    counters["removed"] = len(items) - getattr(items, "removed", 0) - counters["kept"]
+    if stats is not None:
+        stats.update(counters)
+
+
+@perf.timed("rescan")
+def rescan_tree(root: str, items, listing=None, stats=None) -> ItemStore:
+    """Новое хранилище по iter_rescan() с обновлёнными dir_mtimes."""
+    if listing is None:
+        listing = DirListing(root)
+    store = ItemStore(iter_rescan(root, items, listing=listing, stats=stats))
+    store.dir_mtimes = listing.mtimes()
+    return store
+
+
+class ScanJob:
+    """
+    Сканирование в фоновом потоке.
+
+    Элементы пачками (не больше batch_size штук и не реже, чем раз
+    в flush_interval секунд) кладутся в self.queue; в конце кладётся None.
+    Поток GUI забирает пачки через drain(), не блокируясь.
+
+    Содержимое пройденных папок попадает в self.listing (DirListing).
+    """
+
+    def __init__(self, root: str, batch_size: int = 2000, flush_interval: float = 0.25,
+                 plan_workers: int = DEFAULT_PLAN_WORKERS):
+        self.root = root
+        self.plan_workers = plan_workers
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.queue = queue.Queue()
+        self.listing = DirListing(root)
+        self.items_found = 0
+        self.dirs_found = 0
+        self.dir_mtimes = {}     # заполняется к концу успешного сканирования
+        self.error = None
+        self.finished = False
+        self._cancel = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="renamer-scan", daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def cancel(self):
+        self._cancel.set()
+
+    @property
+    def cancelled(self) -> bool:
+        return self._cancel.is_set()
+
+    def _iter_items(self):
+        yield from iter_scan(self.root, should_stop=self._cancel.is_set, listing=self.listing,
+                             plan_workers=self.plan_workers)
+        self.dir_mtimes = self.listing.mtimes()
+
+    @perf.timed("scan")
+    def _run(self):
+        batch = []
+        last_flush = time.monotonic()
+        try:
+            for item in self._iter_items():
+                batch.append(item)
+                self.items_found += 1
+                if item["is_dir"]:
+                    self.dirs_found += 1
+                if (len(batch) >= self.batch_size
+                        or time.monotonic() - last_flush >= self.flush_interval):
+                    self.queue.put(batch)
+                    batch = []
+                    last_flush = time.monotonic()
+        except Exception as e:
+            self.error = e
+        finally:
+            if batch:
+                self.queue.put(batch)
+            self.queue.put(None)
+            perf.count("scan.items", self.items_found)
+
+    def drain(self):
+        """
+        Забирает накопившиеся элементы без ожидания.
+        Возвращает (список элементов, сканирование завершено).
+        """
+        items = []
+        while not self.finished:
+            try:
+                batch = self.queue.get_nowait()
+            except queue.Empty:
+                break
+            if batch is None:
+                self.finished = True
+            else:
+                items.extend(batch)
+        return items, self.finished
+
+
+class RescanJob(ScanJob):
+    """
+    iter_rescan() в фоновом потоке с интерфейсом ScanJob. Прежние элементы
+    (items) поток только читает; счётчики — в self.stats после завершения.
+    """
+
+    def __init__(self, root: str, items, batch_size: int = 2000, flush_interval: float = 0.25):
+        super().__init__(root, batch_size, flush_interval)
+        self.old_items = items
+        self.stats = {}
+
+    def _iter_items(self):
+        yield from iter_rescan(self.root, self.old_items, should_stop=self._cancel.is_set,
+                               listing=self.listing, stats=self.stats)
+        self.dir_mtimes = self.listing.mtimes()
+
+
+# ==== КОНФЛИКТЫ =============================================================
+
+class ConflictIndex:
+    """
+    Постоянный индекс конфликтов по ключу (rel_dir, new_name).
+
+    Строится один раз за O(N). После правки одного элемента update(idx)
+    поддерживает conflict_indices за O(1). Внешние конфликты проверяются
+    по снимку папок (self.listing, DirListing), а не stat на каждый элемент.
+    Множество conflict_indices изменяется на месте, на него можно держать
+    ссылку.
+
+    Учитываются только «активные» элементы: do_rename и new_name != old_name.
+    Имя на диске, которое освобождает другой активный элемент той же
+    папки (цепочка a → b, b → c или обмен a → b, b → a), конфликтом не
+    считается — порядок и временные имена подберёт schedule_renames().
+    """
+
+    def __init__(self, root: str = "", items=None, listing=None):
+        self.conflict_indices = set()
+        self.listing = None
+        self.rebuild(root, items if items is not None else [], listing)
+
+    @perf.timed("conflicts.rebuild")
+    def rebuild(self, root: str, items, listing=None):
+        """
+        Полная пересборка. Без явного listing снимок папок сохраняется,
+        если корень не изменился (сбросить его можно listing.invalidate()).
+        """
+        if listing is None:
+            if self.listing is not None and self.listing.root == root:
+                listing = self.listing
+            else:
+                listing = DirListing(root)
+        self.listing = listing
+        self.root = root
+        self.items = items
+        self._check_disk = bool(root) and os.path.isdir(root)
+        # ключ -> индекс единственного владельца или set индексов при конфликте
+        self._by_key = {}
+        self._key_of = {}
+        # (rel_dir, old_name) активного элемента -> индекс: это имя освободится
+        self._by_old = {}
+        self._external = set()
+        self.conflict_indices.clear()
+        self.add_range(0, len(items))
+
+    @perf.timed("conflicts.add_range")
+    def add_range(self, start: int, stop: int):
+        """Регистрирует элементы items[start:stop] (например, новую пачку сканирования)."""
+        for idx in range(start, stop):
+            self._register(idx)
+
+    def update(self, idx: int):
+        """Вызывается после изменения new_name/do_rename элемента idx."""
+        self._unregister(idx)
+        self._register(idx)
+
+    def recheck_dirs(self, rel_dirs):
+        """Перепроверяет элементы из папок rel_dirs (например, после listing.revalidate())."""
+        rel_dirs = set(rel_dirs)
+        if not rel_dirs:
+            return
+        for idx, key in list(self._key_of.items()):
+            if key[0] in rel_dirs:
+                self.update(idx)
+
+    def _register(self, idx):
+        info = self.items[idx]
+        if not info["do_rename"] or info["old_name"] == info["new_name"]:
+            return
+
+        # внутренние конфликты
+        key = (info["rel_dir"], info["new_name"])
+        self._key_of[idx] = key
+        owner = self._by_key.get(key)
+        if owner is None:
+            self._by_key[key] = idx
+        elif isinstance(owner, set):
+            owner.add(idx)
+            self.conflict_indices.add(idx)
+        else:
+            self._by_key[key] = {owner, idx}
+            self.conflict_indices.add(owner)
+            self.conflict_indices.add(idx)
+
+        # внешние конфликты
+        if self._check_disk and self._exists_on_disk(info):
+            self._external.add(idx)
+            self.conflict_indices.add(idx)
+
+        # старое имя освобождается: ждущие его элементы больше не конфликтуют с диском
+        old_key = (info["rel_dir"], info["old_name"])
+        self._by_old[old_key] = idx
+        self._recheck_external(old_key)
+
+    def _unregister(self, idx):
+        key = self._key_of.pop(idx, None)
+        if key is None:
+            return
+        self._external.discard(idx)
+        self.conflict_indices.discard(idx)
+        info = self.items[idx]
+        old_key = (info["rel_dir"], info["old_name"])
+        if self._by_old.get(old_key) == idx:
+            del self._by_old[old_key]
+            self._recheck_external(old_key)
+
+        owner = self._by_key[key]
+        if not isinstance(owner, set):
+            del self._by_key[key]
+            return
+        owner.discard(idx)
+        if len(owner) == 1:
+            (last,) = owner
+            self._by_key[key] = last
+            if last not in self._external:
+                self.conflict_indices.discard(last)
+
+    def _recheck_external(self, key):
+        """Перепроверяет внешний конфликт элементов с новым именем key = (rel_dir, имя)."""
+        owner = self._by_key.get(key)
+        if owner is None or not self._check_disk:
+            return
+        for idx in (owner if isinstance(owner, set) else (owner,)):
+            if self._exists_on_disk(self.items[idx]):
+                self._external.add(idx)
+                self.conflict_indices.add(idx)
+            elif idx in self._external:
+                self._external.discard(idx)
+                if not isinstance(owner, set):
+                    self.conflict_indices.discard(idx)
+
+    def _exists_on_disk(self, info) -> bool:
+        if (info["rel_dir"], info["new_name"]) in self._by_old:
+            return False
+        if not self.listing.exists(info["rel_dir"], info["new_name"]):
+            return False
+        parent_dir = parent_dir_of(self.root, info["rel_dir"])
+        src = os.path.join(parent_dir, info["old_name"])
+        dst = os.path.join(parent_dir, info["new_name"])
+        return os.path.exists(dst) and os.path.abspath(dst) != os.path.abspath(src)
+
+
+def compute_conflicts(root: str, items) -> set:
+    """Индексы элементов, чьё новое имя конфликтует с другим элементом или с диском."""
+    return ConflictIndex(root, items).conflict_indices
+
+
+# ==== СОРТИРОВКА И ФИЛЬТРЫ ТАБЛИЦЫ ==========================================
+
+# колонки таблицы, по которым можно сортировать
+SORT_COLUMNS = ("type", "exc", "lock", "conf", "mod", "path", "new")
+
+
+def _name_sort_key(info) -> str:
+    # то же, что (rel_dir, old_name.lower()), но одной строкой: "\0" меньше любого символа имени
+    return info["rel_dir"] + "\0" + info["old_name"].lower()
+
+
+def _path_sort_key(info) -> str:
+    return rel_path_of(info).lower()
+
+
+def _new_sort_key(info) -> str:
+    return info["new_name"].lower()
+
+
+# базовые порядки: ключ элемента для каждого из них
+_BASE_SORT_KEYS = {
+    "name": _name_sort_key,
+    "path": _path_sort_key,
+    "new": _new_sort_key,
+}
+
+# колонка -> (базовый порядок, признак «идёт первым» или None).
+# Колонки-флаги — устойчивое разбиение базового порядка по признаку;
+# для "conf" признак берётся из множества конфликтов.
+_COLUMN_SORT = {
+    None: ("path", None),
+    "type": ("name", lambda info: info["is_dir"]),
+    "exc": ("name", lambda info: not info["do_rename"]),
+    "lock": ("name", lambda info: info["locked"]),
+    "conf": ("name", None),
+    "mod": ("name", lambda info: info.get("modified", False)),
+    "path": ("path", None),
+    "new": ("new", None),
+}
+
+
+class SortIndex:
+    """
+    Кэш порядков сортировки таблицы.
+
+    Ключи базовых порядков (имя в папке, путь, новое имя) считаются один
+    раз на элемент; update(idx) пересчитывает ключи одного элемента, а
+    устаревший порядок досортировывается на месте (почти упорядоченный
+    список timsort проходит за линейное время). Колонки-флаги — линейное
+    разбиение базового порядка, пересобираются только при смене признака.
+
+    order() возвращает список индексов по возрастанию; обратный порядок —
+    reversed() от него. Возвращённый список не изменять.
+    """
+
+    def __init__(self, items=None):
+        self.reset(items if items is not None else [])
+
+    def reset(self, items):
+        self.items = items
+        self._keys = {}         # база -> ключи по индексу элемента
+        self._orders = {}       # база -> отсортированные индексы
+        self._stale = set()     # базы, чей порядок надо досортировать
+        self._firsts = {}       # колонка-флаг -> bytearray признака
+        self._partitions = {}   # колонка-флаг -> готовый порядок
+
+    def add_range(self, start: int, stop: int):
+        """Добавляет в кэш элементы items[start:stop] (новую пачку сканирования)."""
+        items = self.items
+        for base, keys in self._keys.items():
+            func = _BASE_SORT_KEYS[base]
+            keys.extend(func(items[idx]) for idx in range(start, stop))
+            if base in self._orders:
+                self._orders[base].extend(range(start, stop))
+                self._stale.add(base)
+        for col, firsts in self._firsts.items():
+            func = _COLUMN_SORT[col][1]
+            firsts.extend(bool(func(items[idx])) for idx in range(start, stop))
+        self._partitions.clear()
+
+    def update(self, idx: int):
+        """Вызывается после изменения элемента idx."""
+        info = self.items[idx]
+        for base, keys in self._keys.items():
+            key = _BASE_SORT_KEYS[base](info)
+            if key != keys[idx]:
+                keys[idx] = key
+                self._stale.add(base)
+                for col in list(self._partitions):
+                    if _COLUMN_SORT[col][0] == base:
+                        del self._partitions[col]
+        for col, firsts in self._firsts.items():
+            first = bool(_COLUMN_SORT[col][1](info))
+            if first != firsts[idx]:
+                firsts[idx] = first
+                self._partitions.pop(col, None)
+
+    @perf.timed("sort")
+    def sort_subset(self, indices, column=None, conflict_indices=()):
+        """
+        Сортирует часть элементов (например, одну папку) так же, как order(),
+        не трогая полный порядок: O(k log k) по размеру части.
+        """
+        base, first_func = _COLUMN_SORT.get(column, _COLUMN_SORT[None])
+        keys = self._base_keys(base)
+        if column == "conf":
+            return sorted(indices, key=lambda idx: (idx not in conflict_indices, keys[idx], idx))
+        if first_func is None:
+            return sorted(indices, key=lambda idx: (keys[idx], idx))
+        firsts = self._first_flags(column)
+        return sorted(indices, key=lambda idx: (not firsts[idx], keys[idx], idx))
+
+    @perf.timed("sort")
+    def order(self, column=None, conflict_indices=()):
+        """Индексы элементов в порядке сортировки по column (None — по пути)."""
+        base, first_func = _COLUMN_SORT.get(column, _COLUMN_SORT[None])
+        base_order = self._base_order(base)
+
+        if column == "conf":
+            # конфликты меняются и у соседей правленого элемента — разбиваем каждый раз
+            return ([idx for idx in base_order if idx in conflict_indices]
+                    + [idx for idx in base_order if idx not in conflict_indices])
+        if first_func is None:
+            return base_order
+
+        part = self._partitions.get(column)
+        if part is None:
+            firsts = self._first_flags(column)
+            part = ([idx for idx in base_order if firsts[idx]]
+                    + [idx for idx in base_order if not firsts[idx]])
+            self._partitions[column] = part
+        return part
+
+    def _base_keys(self, base):
+        keys = self._keys.get(base)
+        if keys is None:
+            func = _BASE_SORT_KEYS[base]
+            keys = [func(info) for info in self.items]
+            self._keys[base] = keys
+        return keys
+
+    def _first_flags(self, column):
+        firsts = self._firsts.get(column)
+        if firsts is None:
+            func = _COLUMN_SORT[column][1]
+            firsts = bytearray(bool(func(info)) for info in self.items)
+            self._firsts[column] = firsts
+        return firsts
+
+    def _base_order(self, base):
+        keys = self._base_keys(base)
+        if base not in self._orders:
+            self._orders[base] = sorted(range(len(keys)), key=keys.__getitem__)
+        elif base in self._stale:
+            # равные ключи — по индексу, как при сортировке с нуля
+            self._orders[base].sort(key=lambda idx: (keys[idx], idx))
+        self._stale.discard(base)
+        return self._orders[base]
+
+
+def dir_in_subtree(rel_dir: str, top: str) -> bool:
+    """rel_dir совпадает с top или лежит внутри него ("" — корень, в нём всё)."""
+    return not top or rel_dir == top or rel_dir.startswith(top + os.sep)
+
+
+class DirIndex:
+    """
+    Индекс rel_dir -> индексы элементов (по возрастанию) для фильтра по папке.
+
+    Пополняется пачками сканирования (add_range). Фильтр «папка и всё
+    вложенное» берёт диапазон отсортированного списка папок по префиксу
+    "top" + os.sep, поэтому стоит O(log D + размер поддерева).
+    """
+
+    def __init__(self, items=None):
+        self.reset(items if items is not None else [])
+
+    def reset(self, items):
+        self.items = items
+        self.by_dir = {}
+        self._sorted_dirs = None
+        self.add_range(0, len(items))
+
+    def add_range(self, start: int, stop: int):
+        by_dir = self.by_dir
+        for idx in range(start, stop):
+            rel_dir = self.items[idx]["rel_dir"]
+            bucket = by_dir.get(rel_dir)
+            if bucket is None:
+                by_dir[rel_dir] = [idx]
+                self._sorted_dirs = None
+            else:
+                bucket.append(idx)
+
+    def indices(self, rel_dir: str):
+        """Элементы, лежащие непосредственно в rel_dir. Список не изменять."""
+        return self.by_dir.get(rel_dir, [])
+
+    def subtree_dirs(self, top: str):
+        """Папки с элементами в поддереве top (включая саму top)."""
+        if not top:
+            return list(self.by_dir)
+        if self._sorted_dirs is None:
+            self._sorted_dirs = sorted(self.by_dir)
+        dirs = self._sorted_dirs
+        # все "top/..." лежат между "top/" и следующей за разделителем строкой
+        lo = bisect_left(dirs, top + os.sep)
+        hi = bisect_left(dirs, top + chr(ord(os.sep) + 1), lo)
+        result = dirs[lo:hi]
+        if top in self.by_dir:
+            result.append(top)
+        return result
+
+    def subtree(self, top: str):
+        """Элементы поддерева top (в порядке папок, внутри папки — по индексу)."""
+        result = []
+        for rel_dir in self.subtree_dirs(top):
+            result.extend(self.by_dir[rel_dir])
+        return result
+
+
+# поиск: где искать и как понимать строку запроса
+SEARCH_FIELDS = ("both", "path", "new")
+SEARCH_MODES = ("substring", "glob", "regex")
+# если совпадений больше этой доли строк, поиск по склейке бросается
+# и строки перебираются подряд (так дешевле, чем шаг на каждое совпадение)
+SEARCH_LINEAR_FRACTION = 1 / 32
+
+_GLOB_CLASS = re.compile(r"\[[^\]]*\]")
+_GLOB_SPECIAL = re.compile(r"[*?]")
+
+
+def _glob_literals(pattern: str) -> list:
+    """Фрагменты маски, которые обязаны встретиться в строке буквально."""
+    return [part for part in _GLOB_SPECIAL.split(_GLOB_CLASS.sub("*", pattern)) if part]
+
+
+class _JoinedText:
+    """
+    Строки, склеенные через "\0" (в именах файлов его не бывает): одна
+    str.find по склейке проходит все строки на скорости C, номер строки
+    по позиции — bisect по началам строк.
+    """
+
+    __slots__ = ("texts", "blob", "starts")
+
+    def __init__(self, texts):
+        self.texts = texts
+        self.blob = "\0".join(texts)
+        # начала строк и ещё одно — за концом последней
+        self.starts = array("Q", accumulate((len(t) + 1 for t in texts), initial=0))
+
+    def find_all(self, q: str, limit: int):
+        """Номера строк, содержащих q; None — совпадений больше limit."""
+        blob, starts = self.blob, self.starts
+        hits = []
+        pos = blob.find(q)
+        while pos != -1:
+            if len(hits) >= limit:
+                return None
+            line = bisect_right(starts, pos) - 1
+            hits.append(line)
+            pos = blob.find(q, starts[line + 1])
+        return hits
+
+
+class SearchIndex:
+    """
+    Поиск по старому пути и новому имени для строки поиска таблицы.
+
+    Имена элементов, новые имена и пути папок хранятся в нижнем регистре
+    и склеиваются в три строки (_JoinedText), так что поиск подстроки —
+    несколько str.find по склейке, а не проверка каждого элемента в
+    Python. Совпадение в пути папки даёт сразу все её элементы. Маска
+    (glob) сначала ищет так же свой самый длинный буквальный фрагмент и
+    проверяет только найденное; регулярные выражения и запросы с
+    разделителем пути проверяются перебором по готовым строкам.
+
+    Склейки строятся при первом поиске и сбрасываются при изменениях:
+    add_range() — все, update(idx) (сменилось new_name) — только новых имён.
+    """
+
+    def __init__(self, items=None):
+        self.reset(items if items is not None else [])
+
+    def reset(self, items):
+        self.items = items
+        self._names = []          # old_name.lower() по индексу элемента
+        self._new = []            # new_name.lower() (та же строка, если имя не меняется)
+        self._item_dir = array("I")
+        self._dirs = []           # rel_dir.lower() по номеру папки
+        self._dir_ids = {}
+        self._dir_items = []      # номер папки -> array индексов
+        self._joined = {}         # "names" / "new" / "dirs" -> _JoinedText
+        self.add_range(0, len(items))
+
+    def add_range(self, start: int, stop: int):
+        for idx in range(start, stop):
+            info = self.items[idx]
+            rel_dir = info["rel_dir"]
+            dir_id = self._dir_ids.get(rel_dir)
+            if dir_id is None:
+                dir_id = self._dir_ids[rel_dir] = len(self._dirs)
+                self._dirs.append(rel_dir.lower())
+                self._dir_items.append(array("I"))
+            self._item_dir.append(dir_id)
+            self._dir_items[dir_id].append(idx)
+
+            old = info["old_name"].lower()
+            new = info["new_name"].lower()
+            self._names.append(old)
+            self._new.append(old if new == old else new)
+        if stop > start:
+            self._joined.clear()
+
+    def update(self, idx: int):
+        """Вызывается после изменения new_name элемента idx."""
+        new = self.items[idx]["new_name"].lower()
+        if new != self._new[idx]:
+            self._new[idx] = self._names[idx] if new == self._names[idx] else new
+            self._joined.pop("new", None)
+
+    def search(self, query: str, field: str = "both", mode: str = "substring") -> set:
+        """
+        Индексы элементов, у которых query найден в старом пути (field="path"),
+        новом имени ("new") или в любом из них ("both"). Без учёта регистра.
+        mode: "substring", "glob" (маска целиком: *.txt) или "regex" (re.search).
+        Ошибка в регулярном выражении — re.error.
+        """
+        if field not in SEARCH_FIELDS:
+            raise ValueError(f"Неизвестное поле поиска: {field}")
+        q = query.lower()
+        if mode == "substring":
+            return self._substring(q, field)
+        if mode == "glob":
+            test = re.compile(fnmatch.translate(q), re.DOTALL).match
+            literals = [part for part in _glob_literals(q) if field == "new" or os.sep not in part]
+            candidates = self._substring(max(literals, key=len), field) if literals else None
+        elif mode == "regex":
+            test = re.compile(query, re.IGNORECASE).search
+            candidates = None
+        else:
+            raise ValueError(f"Неизвестный режим поиска: {mode}")
+        return self._verify(candidates, test, field)
+
+    def _substring(self, q: str, field: str) -> set:
+        if not q:
+            return set(range(len(self._names)))
+        result = set()
+        if field != "path":
+            result.update(self._find("new", q))
+        if field != "new":
+            if os.sep in q:
+                # подстрока может пересекать границу папки и имени
+                result |= self._verify(None, lambda text: q in text, "path")
+            else:
+                result.update(self._find("names", q))
+                for dir_id in self._find("dirs", q):
+                    result.update(self._dir_items[dir_id])
+        return result
+
+    def _find(self, key: str, q: str):
+        texts = {"names": self._names, "new": self._new, "dirs": self._dirs}[key]
+        joined = self._joined.get(key)
+        if joined is None:
+            joined = self._joined[key] = _JoinedText(texts)
+        hits = joined.find_all(q, max(64, int(len(texts) * SEARCH_LINEAR_FRACTION)))
+        if hits is None:
+            hits = [line for line, text in enumerate(texts) if q in text]
+        return hits
+
+    def _verify(self, candidates, test, field: str) -> set:
+        """Проверка кандидатов (None — всех элементов) функцией test(строка)."""
+        if candidates is None:
+            candidates = range(len(self._names))
+        sep = os.sep
+        dirs, item_dir, names, new = self._dirs, self._item_dir, self._names, self._new
+        result = set()
+        for idx in candidates:
+            if field != "path" and test(new[idx]):
+                result.add(idx)
+            elif field != "new":
+                rel_dir = dirs[item_dir[idx]]
+                if test(rel_dir + sep + names[idx] if rel_dir else names[idx]):
+                    result.add(idx)
+        return result
+
+
+# ==== АВТО-РЕШЕНИЕ КОНФЛИКТОВ ===============================================
+#
+# Политика суффикса: функция (base, n, ext) -> новое имя.
+
+def suffix_underscore(base: str, n: int, ext: str) -> str:
+    return f"{base}_{n}{ext}"
+
+
+def suffix_parens(base: str, n: int, ext: str) -> str:
+    return f"{base} ({n}){ext}"
+
+
+def suffix_zero_padded(width: int = 3):
+    def policy(base: str, n: int, ext: str) -> str:
+        return f"{base}_{n:0{width}d}{ext}"
+    return policy
+
+
+SUFFIX_POLICIES = {
+    "underscore": suffix_underscore,     # имя_1.ext
+    "parens": suffix_parens,             # имя (1).ext
+    "padded": suffix_zero_padded(),      # имя_001.ext
+}
+
+
+@perf.timed("auto_resolve")
+def auto_resolve_conflicts(root: str, items, conflict_indices, log=None, on_change=None,
+                           listing=None, suffix=None) -> int:
+    """
+    Подбирает свободные имена для незафиксированных конфликтующих
+    элементов (по умолчанию base_N.ext, см. SUFFIX_POLICIES).
+
+    Занятые имена собираются одним проходом по items для каждой папки
+    с конфликтами, номер N для каждой пары (папка, base, ext) растёт
+    счётчиком, а диск проверяется по снимку listing (DirListing; если не
+    передан, папки читаются через os.listdir). on_change(idx) вызывается
+    после смены имени элемента (например, ConflictIndex.update).
+    Возвращает количество изменённых имён.
+    """
+    if suffix is None:
+        suffix = suffix_underscore
+    if listing is None:
+        listing = DirListing(root)
+
+    targets = [idx for idx in sorted(conflict_indices)
+               if items[idx]["do_rename"] and not items[idx]["locked"]]
+    if not targets:
+        return 0
+
+    # занятые новые имена (с кратностью) в папках, где есть конфликты
+    used = {items[idx]["rel_dir"]: Counter() for idx in targets}
+    for info in items:
+        names = used.get(info["rel_dir"])
+        if names is not None:
+            names[info["new_name"]] += 1
+
+    # (папка, base, ext) -> следующий номер для проверки; все меньшие заняты.
+    # Имена, отвергнутые из-за другого элемента, запоминаем: если такое имя
+    # потом освободится, счётчик откатывается к нему — как при переборе с 1.
+    next_n = {}
+    rejected = {}
+    changed = 0
+
+    for idx in targets:
+        info = items[idx]
+        rel_dir = info["rel_dir"]
+        names = used[rel_dir]
+        base, ext = os.path.splitext(info["new_name"])
+
+        key = (rel_dir, base, ext)
+        n = next_n.get(key, 1)
+        while True:
+            candidate = suffix(base, n, ext)
+            n += 1
+            if names[candidate]:
+                rejected[(rel_dir, candidate)] = (key, n - 1)
+            elif not listing.exists(rel_dir, candidate):
+                break
+        next_n[key] = n
+
+        if candidate != info["new_name"]:
+            if log:
+                log(f"Авто-правка: {info['new_name']} → {candidate}")
+            old_name = info["new_name"]
+            names[old_name] -= 1
+            if not names[old_name]:
+                freed = rejected.pop((rel_dir, old_name), None)
+                if freed is not None:
+                    freed_key, freed_n = freed
+                    next_n[freed_key] = min(next_n.get(freed_key, 1), freed_n)
+            names[candidate] += 1
+            info["new_name"] = candidate
+            # флаг modified не трогаем — [M] остаётся только за ручными изменениями
+            changed += 1
+            if on_change is not None:
+                on_change(idx)
+
+    return changed
+
+
+# ==== ГРУППОВАЯ ПРАВКА ======================================================
+
+# смена регистра: у файлов меняется только имя без расширения
+BULK_CASES = {
+    "lower": str.lower,
+    "upper": str.upper,
+    "capitalize": str.capitalize,
+    "title": str.title,
+}
+
+
+def _name_rule(func, keep_ext: bool = True):
+    """Правило rule(имя, is_dir) -> имя из функции над строкой."""
+    def rule(name: str, is_dir: bool) -> str:
+        if is_dir or not keep_ext:
+            return func(name)
+        base, ext = os.path.splitext(name)
+        return func(base) + ext
+    return rule
+
+
+def bulk_rule_regex(pattern: str, repl: str, ignore_case: bool = False):
+    """Правило «заменить по регулярному выражению» (re.sub по всему имени)."""
+    rx = re.compile(pattern, re.IGNORECASE if ignore_case else 0)
+    return _name_rule(lambda name: rx.sub(repl, name), keep_ext=False)
+
+
+def bulk_rule_prefix(prefix: str):
+    return _name_rule(lambda name: prefix + name, keep_ext=False)
+
+
+def bulk_rule_suffix(suffix: str):
+    """Суффикс; у файлов — перед расширением."""
+    return _name_rule(lambda name: name + suffix)
+
+
+def bulk_rule_case(case: str):
+    return _name_rule(BULK_CASES[case])
+
+
+class BulkEdit:
+    """
+    Групповая правка: прежние new_name и флаги изменённых элементов,
+    чтобы undo_bulk_edit() вернул их одним шагом. indices — изменённые
+    элементы (по ним вызывающий обновляет индексы), skipped — сколько
+    элементов правило оставило без изменений из-за недопустимого имени.
+    """
+
+    def __init__(self, title: str):
+        self.title = title
+        self.indices = array("I")
+        self.new_names = []
+        self.flags = bytearray()
+        self.skipped = 0
+
+    def __len__(self):
+        return len(self.indices)
+
+    def record(self, items, idx: int):
+        info = items[idx]
+        self.indices.append(idx)
+        self.new_names.append(info["new_name"])
+        self.flags.append(_item_flags(info))
+
+
+def bulk_rename(items, indices, rule, title: str = "") -> BulkEdit:
+    """
+    Применяет rule(new_name, is_dir) -> имя к новым именам элементов indices.
+    Зафиксированные элементы не трогаются; пустое имя или имя с
+    разделителем пути — пропуск. Индексы (конфликты, сортировка) не
+    обновляются: вызывающий делает это один раз по edit.indices.
+    """
+    edit = BulkEdit(title)
+    for idx in indices:
+        info = items[idx]
+        if info["locked"]:
+            continue
+        new_name = rule(info["new_name"], info["is_dir"])
+        if new_name == info["new_name"]:
+            continue
+        if not _is_valid_name(new_name):
+            edit.skipped += 1
+            continue
+        edit.record(items, idx)
+        info["new_name"] = new_name
+        update_modified_flag(info)
+    return edit
+
+
+def bulk_retranslit(items, indices, title: str = "") -> BulkEdit:
+    """Новые имена заново по транслиту старых (plan_new_names пачкой); кроме зафиксированных."""
+    targets = {False: [], True: []}
+    for idx in indices:
+        info = items[idx]
+        if not info["locked"]:
+            targets[bool(info["is_dir"])].append(idx)
+
+    edit = BulkEdit(title)
+    for is_dir, group in targets.items():
+        planned = plan_new_names((items[idx]["old_name"] for idx in group), is_dir)
+        for idx, new_name in zip(group, planned):
+            info = items[idx]
+            if new_name != info["new_name"]:
+                edit.record(items, idx)
+                info["new_name"] = new_name
+                update_modified_flag(info)
+    return edit
+
+
+def bulk_set_flags(items, indices, do_rename=None, locked=None, title: str = "") -> BulkEdit:
+    """Ставит do_rename и/или locked (None — не менять)."""
+    edit = BulkEdit(title)
+    for idx in indices:
+        info = items[idx]
+        if ((do_rename is None or info["do_rename"] == do_rename)
+                and (locked is None or info["locked"] == locked)):
+            continue
+        edit.record(items, idx)
+        if do_rename is not None:
+            info["do_rename"] = do_rename
+        if locked is not None:
+            info["locked"] = locked
+    return edit
+
+
+def undo_bulk_edit(items, edit: BulkEdit):
+    """Возвращает элементам edit прежние имена и флаги (в обратном порядке записи)."""
+    for k in range(len(edit.indices) - 1, -1, -1):
+        info = items[edit.indices[k]]
+        if info.get("removed"):
+            # файл исчез с диска после правки — возвращать нечего
+            continue
+        flags = edit.flags[k]
+        info["new_name"] = edit.new_names[k]
+        info["do_rename"] = bool(flags & FLAG_DO_RENAME)
+        info["locked"] = bool(flags & FLAG_LOCKED)
+        info["modified"] = bool(flags & FLAG_MODIFIED)
+
+
+# ==== ПЕРЕИМЕНОВАНИЕ ========================================================
+
+def depth_of_item(info) -> int:
+    return rel_path_of(info).count(os.sep)
+
+
+# потоков для переименования по умолчанию (на сетевых ресурсах задержка
+# каждого вызова велика, параллельность окупается)
+DEFAULT_RENAME_WORKERS = 8
+# по сколько элементов одной папки отдавать в одну задачу пула
+RENAME_CHUNK_SIZE = 256
+
+
+def _supports_dir_fd(func) -> bool:
+    # renamer_perf подменяет функции os обёртками — проверяем исходную
+    return getattr(func, "__wrapped__", func) in os.supports_dir_fd
+
+
+# переименование относительно дескриптора папки (renameat): папка
+# открывается один раз на пачку, и ядро не разбирает заново весь путь от
+# корня на каждый вызов. На Windows — прежний путь через полные пути.
+RENAME_DIR_FD = _supports_dir_fd(os.rename)
+
+
+def _open_dir(path: str):
+    """Дескриптор папки для *_dir_fd или None, если её не открыть."""
+    try:
+        return os.open(path, os.O_RDONLY | getattr(os, "O_DIRECTORY", 0))
+    except OSError:
+        return None
+
+
+# rename без замены через link + unlink: link атомарно отказывает, если цель
+# есть. На Windows os.rename и так не заменяет существующий путь. os.link
+# к этому моменту может быть обёрткой renamer_perf — проверяем исходную.
+RENAME_VIA_LINK = (os.name != "nt"
+                   and getattr(os.link, "__wrapped__", os.link) in os.supports_follow_symlinks)
+# link не годится (папка, ФС без жёстких ссылок) — проверка цели перед rename
+_LINK_FALLBACK_ERRNOS = {errno.EPERM, errno.EACCES, errno.EXDEV, errno.EMLINK,
+                         errno.EISDIR, errno.ENOSYS, errno.EOPNOTSUPP, errno.ENOTSUP}
+
+
+def _entry_at(parent_dir: str, dir_fd, name: str):
+    """lstat записи папки или None, если её нет."""
+    try:
+        if dir_fd is None:
+            return os.lstat(os.path.join(parent_dir, name))
+        return os.stat(name, dir_fd=dir_fd, follow_symlinks=False)
+    except FileNotFoundError:
+        return None
+
+
+def _check_target_free(parent_dir: str, dir_fd, src: str, dst: str):
+    """FileExistsError, если dst занят другим файлом (тот же файл — смена регистра)."""
+    dst_st = _entry_at(parent_dir, dir_fd, dst)
+    if dst_st is None:
+        return
+    src_st = _entry_at(parent_dir, dir_fd, src)
+    if src_st is not None and (src_st.st_dev, src_st.st_ino) == (dst_st.st_dev, dst_st.st_ino):
+        return
+    raise FileExistsError(errno.EEXIST, "целевой путь уже существует", os.path.join(parent_dir, dst))
+
+
+def _rename_at(parent_dir: str, dir_fd, src: str, dst: str):
+    """
+    Переименование без замены: снимок папки мог устареть, и цель, появившаяся
+    после его чтения, не должна быть перезаписана — FileExistsError вместо
+    rename. Файлы — link + unlink (проверка атомарна), папки и ФС без жёстких
+    ссылок — проверка цели непосредственно перед rename.
+    """
+    if dir_fd is None:
+        src_path, dst_path = os.path.join(parent_dir, src), os.path.join(parent_dir, dst)
+        fd_args = {}
+    else:
+        src_path, dst_path = src, dst
+        fd_args = {"src_dir_fd": dir_fd, "dst_dir_fd": dir_fd}
+
+    if RENAME_VIA_LINK:
+        try:
+            os.link(src_path, dst_path, follow_symlinks=False, **fd_args)
+        except FileExistsError:
+            # тот же файл под другим регистром (регистронезависимая ФС) — обычный rename
+            _check_target_free(parent_dir, dir_fd, src, dst)
+        except OSError as e:
+            if e.errno not in _LINK_FALLBACK_ERRNOS:
+                raise
+            _check_target_free(parent_dir, dir_fd, src, dst)
+        else:
+            try:
+                os.unlink(src_path, dir_fd=dir_fd)
+            except OSError:
+                # не оставляем файл под двумя именами
+                os.unlink(dst_path, dir_fd=dir_fd)
+                raise
+            return
+    else:
+        _check_target_free(parent_dir, dir_fd, src, dst)
+    os.rename(src_path, dst_path, **fd_args)
+
+
+# суффикс временного имени при разрыве циклов (a → b, b → a)
+RENAME_TMP_SUFFIX = ".renamer-tmp"
+
+
+@perf.timed("rename.schedule")
+def schedule_renames(root: str, items, conflict_indices, listing=None):
+    """
+    Порядок переименования без проверок диска на каждый элемент.
+
+    Для каждой папки с отмеченными элементами её содержимое читается один
+    раз (listing, DirListing), и итоговое пространство имён моделируется
+    в памяти. Новое имя может совпадать со старым именем другого элемента
+    той же папки: тогда элемент ждёт, пока тот освободит имя. Цепочки
+    (a → b, b → c) выполняются с конца, циклы (a → b, b → a) разрываются
+    временным именем. Элементы, цель которых занята неподвижным файлом или
+    не освобождается, отбрасываются вместе со всей цепочкой до них.
+    Всё за O(N).
+
+    Возвращает (phases, blocked). phases — этапы: файлы, затем папки от
+    самых глубоких (цепочка с папкой целиком идёт на этап папок своего
+    уровня). Этап — список независимых пачек (rel_dir, цепочки), цепочка —
+    список шагов (idx, src, dst, final), выполняемых строго по порядку;
+    final=False — шаг на временное имя. blocked — {idx: сообщение}.
+    """
+    if listing is None:
+        listing = DirListing(root)
+    fold = _fold_name if listing.case_insensitive else None
+
+    files = {}            # rel_dir -> цепочки
+    dirs_by_depth = {}    # глубина -> rel_dir -> цепочки
+    blocked = {}
+
+    for rel_dir, indices in _items_by_dir(items).items():
+        active = []
+        for idx in indices:
+            info = items[idx]
+            if not info["do_rename"] or info["old_name"] == info["new_name"]:
+                continue
+            if idx in conflict_indices:
+                blocked[idx] = f"Пропуск (конфликт): {info['old_name']} в {rel_dir}"
+            else:
+                active.append(idx)
+        if not active:
+            continue
+
+        parent_dir = parent_dir_of(root, rel_dir)
+        names = listing.names(rel_dir)
+        present = {fold(n) for n in names} if fold else names
+        key = fold or str
+
+        by_old = {}
+        for idx in active:
+            old_key = key(items[idx]["old_name"])
+            if old_key in present:
+                by_old[old_key] = idx
+            else:
+                blocked[idx] = f"Пропуск (не найден): {os.path.join(parent_dir, items[idx]['old_name'])}"
+
+        # nxt[i] = j: новое имя i сейчас занято старым именем j; None — свободно
+        claims = {}
+        nxt = {}
+        for idx in by_old.values():
+            new_name = items[idx]["new_name"]
+            new_key = key(new_name)
+            owner = by_old.get(new_key)
+            if new_key in claims or (owner is None and new_key in present):
+                blocked[idx] = f"Ошибка: целевой путь уже существует: {os.path.join(parent_dir, new_name)}"
+                continue
+            claims[new_key] = idx
+            # owner == idx: меняется только регистр на регистронезависимой ФС
+            nxt[idx] = None if owner in (None, idx) else owner
+
+        prev = {j: i for i, j in nxt.items() if j is not None}
+        chains = []
+
+        def walk_back(idx, chain):
+            while idx is not None:
+                info = items[idx]
+                chain.append((idx, info["old_name"], info["new_name"], True))
+                idx = prev.pop(idx, None)
+            return chain
+
+        for idx, j in nxt.items():
+            if j is None:
+                chains.append(walk_back(idx, []))
+            elif j not in nxt:
+                # цель не освобождается: сам элемент и всё, что ждёт его
+                prev.pop(j, None)
+                node = idx
+                while node is not None:
+                    info = items[node]
+                    blocked[node] = (f"Пропуск (цепочка): {os.path.join(parent_dir, info['old_name'])} — "
+                                     f"имя {info['new_name']} не освобождается")
+                    node = prev.pop(node, None)
+
+        # в prev остались только циклы
+        tmp_n = 0
+        while prev:
+            start = next(iter(prev))
+            info = items[start]
+            while True:
+                tmp_n += 1
+                tmp = f"{info['old_name']}{RENAME_TMP_SUFFIX}{tmp_n}"
+                if key(tmp) not in present and key(tmp) not in claims:
+                    break
+            chain = [(start, info["old_name"], tmp, False)]
+            node = prev.pop(start)
+            while node != start:
+                chain.append((node, items[node]["old_name"], items[node]["new_name"], True))
+                node = prev.pop(node)
+            chain.append((start, tmp, info["new_name"], True))
+            chains.append(chain)
+
+        depth = rel_dir.count(os.sep) + 1 if rel_dir else 0
+        for chain in chains:
+            if any(items[step[0]]["is_dir"] for step in chain):
+                dirs_by_depth.setdefault(depth, {}).setdefault(rel_dir, []).append(chain)
+            else:
+                files.setdefault(rel_dir, []).append(chain)
+
+    phases = [_chain_batches(files)]
+    for depth in sorted(dirs_by_depth, reverse=True):
+        phases.append(_chain_batches(dirs_by_depth[depth]))
+    return phases, blocked
+
+
+def _chain_batches(by_dir) -> list:
+    """Пачки по папкам, не больше RENAME_CHUNK_SIZE шагов; цепочки не режутся."""
+    batches = []
+    for rel_dir, chains in by_dir.items():
+        batch = []
+        size = 0
+        for chain in chains:
+            if batch and size + len(chain) > RENAME_CHUNK_SIZE:
+                batches.append((rel_dir, batch))
+                batch = []
+                size = 0
+            batch.append(chain)
+            size += len(chain)
+        if batch:
+            batches.append((rel_dir, batch))
+    return batches
+
+
+class RenameExecutor:
+    """
+    Переименование отмеченных элементов на пуле потоков.
+
+    Порядок строит schedule_renames(): сначала файлы, разбитые на пачки
+    по родительской папке, затем папки уровнями от самых глубоких; каждый
+    уровень стартует только после завершения предыдущего, так что папка
+    переименовывается после всего своего содержимого. Цепочки и циклы
+    внутри папки выполняются по порядку в одной пачке, независимые пачки —
+    параллельно. Порядок строится по снимку папок без stat на элемент, но
+    сам шаг — rename без замены (_rename_at): цель, появившаяся после
+    чтения снимка, даёт ошибку элемента, а не перезапись.
+
+    Все элементы пачки лежат в одной папке: при RENAME_DIR_FD она
+    открывается один раз, rename идёт относительно её дескриптора.
+
+    При workers <= 1 пачки обрабатываются последовательно в том же
+    порядке этапов. Сообщения передаются в log из вызывающего потока.
+
+    Если передан journal (renamer_journal.RenameJournal), до начала работы
+    в него записывается план, включая шаги циклов на временное имя, а по
+    ходу — результаты; журнал сбрасывается на диск после каждого этапа,
+    а также сразу после шага на временное имя и перед его откатом.
+    """
+
+    def __init__(self, root: str, items, conflict_indices, workers: int = DEFAULT_RENAME_WORKERS,
+                 log=None, dry_run=False, journal=None):
+        self.root = root
+        self.items = items
+        self.conflict_indices = conflict_indices
+        self.workers = workers
+        self.log = log
+        self.dry_run = dry_run
+        self.journal = None if dry_run else journal
+        self.renamed = 0
+        self.errors = 0
+        self.elapsed = 0.0
+
+    @property
+    def throughput(self) -> float:
+        """Переименовано элементов в секунду."""
+        return self.renamed / self.elapsed if self.elapsed > 0 else 0.0
+
+    @perf.timed("rename")
+    def run(self):
+        """Выполняет переименование. Возвращает (переименовано, ошибок/пропусков)."""
+        t0 = time.monotonic()
+        phases, blocked = schedule_renames(self.root, self.items, self.conflict_indices)
+
+        if self.journal is not None:
+            for phase in phases:
+                for _, chains in phase:
+                    for chain in chains:
+                        for idx, _, dst, final in chain:
+                            if not self.journal.is_planned(idx):
+                                self.journal.plan(idx, self.items[idx])
+                            if not final:
+                                self.journal.plan_tmp(idx, dst)
+            self.journal.sync()
+
+        for idx in sorted(blocked):
+            self._record(idx, ("error", blocked[idx]))
+
+        if self.workers <= 1:
+            for phase in phases:
+                for batch in phase:
+                    for idx, result in self._process_batch(batch):
+                        self._record(idx, result)
+                self._phase_done()
+        else:
+            with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="renamer-rename") as pool:
+                for phase in phases:
+                    futures = [pool.submit(self._process_batch, batch) for batch in phase]
+                    for future in as_completed(futures):
+                        for idx, result in future.result():
+                            self._record(idx, result)
+                    self._phase_done()
+        self.elapsed = time.monotonic() - t0
+        return self.renamed, self.errors
+
+    def _process_batch(self, batch):
+        """Пачка (rel_dir, цепочки) одной папки. Возвращает [(idx, результат)]."""
+        rel_dir, chains = batch
+        parent_dir = parent_dir_of(self.root, rel_dir)
+        dir_fd = None
+        if RENAME_DIR_FD and not self.dry_run:
+            dir_fd = _open_dir(parent_dir)
+        try:
+            results = []
+            for chain in chains:
+                self._run_chain(parent_dir, dir_fd, chain, results)
+            return results
+        finally:
+            if dir_fd is not None:
+                os.close(dir_fd)
+
+    def _run_chain(self, parent_dir, dir_fd, chain, results):
+        """
+        Шаги цепочки по порядку. После первой ошибки остальные шаги не
+        выполняются (их цели не освободились). Если цикл оборвался, когда
+        элемент уже ушёл на временное имя, выполненные шаги откатываются
+        в обратном порядке — иначе его прежнее имя занято.
+        """
+        done = []
+        failed = None
+        for step in chain:
+            if self.dry_run:
+                break
+            idx, src, dst, final = step
+            try:
+                _rename_at(parent_dir, dir_fd, src, dst)
+            except Exception as e:
+                failed = (idx, e)
+                break
+            done.append(step)
+            if not final and self.journal is not None:
+                self.journal.tmp_done(idx)
+
+        # откатывать есть что, только если до ошибки что-то выполнилось
+        rolled_back = failed is not None and not chain[0][3] and bool(done)
+        if rolled_back:
+            for idx, src, dst, final in reversed(done):
+                if not final and self.journal is not None:
+                    self.journal.tmp_rollback(idx)
+                try:
+                    _rename_at(parent_dir, dir_fd, dst, src)
+                except Exception as e:
+                    # только сообщение: элементы цепочки уже учтены как ошибки
+                    results.append((idx, (None, f"Ошибка отката: {os.path.join(parent_dir, dst)} "
+                                                f"не возвращён в {src}: {e}")))
+                    break
+            done = []
+
+        ok = {idx for idx, _, _, final in done if final}
+        for idx, _, _, final in chain:
+            if not final:
+                continue
+            info = self.items[idx]
+            full_src = os.path.join(parent_dir, info["old_name"])
+            full_dst = os.path.join(parent_dir, info["new_name"])
+            if self.dry_run:
+                results.append((idx, ("ok", f"План: {full_src} → {full_dst}")))
+            elif idx in ok:
+                results.append((idx, ("ok", f"OK: {full_src} → {full_dst}")))
+            elif idx == failed[0]:
+                results.append((idx, ("error", f"Ошибка при переименовании {full_src}: {failed[1]}")))
+            else:
+                failed_src = os.path.join(parent_dir, self.items[failed[0]]["old_name"])
+                verb = "откачен" if rolled_back else "не выполнен"
+                results.append((idx, ("error", f"Пропуск (цепочка): {full_src} — {verb}, "
+                                               f"не переименован {failed_src}")))
+
+    def _record(self, idx, result):
+        status, msg = result
+        if status == "ok":
+            self.renamed += 1
+        elif status == "error":
+            self.errors += 1
+        if self.journal is not None and self.journal.is_planned(idx):
+            if status == "ok":
+                self.journal.done(idx)
+            elif status == "error":
+                self.journal.failed(idx, msg)
+        if msg and self.log:
+            self.log(msg)
+
+    def _phase_done(self):
+        # следующий этап переименовывает папки-предки: результаты этого
+        # этапа должны быть на диске до того, как пути в журнале устареют
+        if self.journal is not None:
+            self.journal.sync()
+
+
+def rename_items(root: str, items, conflict_indices, log=None, dry_run=False, workers: int = 1):
+    """
+    Переименовывает отмеченные элементы на диске. Конфликтующие элементы
+    пропускаются. При dry_run только проверяет и пишет в лог, что было бы
+    сделано. workers > 1 включает параллельное выполнение (RenameExecutor).
+    Возвращает (переименовано, ошибок/пропусков).
+    """
+    return RenameExecutor(root, items, conflict_indices, workers=workers, log=log, dry_run=dry_run).run()
+
+
+# ==== СЕССИИ И ПЛАНЫ ========================================================
+
+class SessionFormatError(ValueError):
+    """Файл сессии прочитан, но его содержимое имеет неверную структуру."""
+
+
+# потоковый формат сессии (NDJSON): заголовок, затем по строке на запись
+#
+#   {"format": "renamer-session", "version": 1, "root": "..."}
+#   "a/b"                                  # папка; номера идут по порядку с 0
+#   {"dir": "a/b", "mtime_ns": 1700...}    # то же, с mtime папки (для rescan)
+#   [0, "old_name", "new_name", 3]         # элемент: номер папки, имена, флаги FLAG_*
+#   [0, "имя", null, 0]                    # null — новое имя совпадает со старым
+#
+# Папка записывается перед первым своим элементом, поэтому файл читается
+# и пишется одним проходом. Сессии *.json — прежний формат, читаются целиком.
+SESSION_FORMAT = "renamer-session"
+SESSION_VERSION = 1
+SESSION_EXT = ".rsession"
+# сколько байт строк разбирается одним json.loads при чтении
+SESSION_READ_CHUNK = 1 << 20
+
+
+def _item_flags(info) -> int:
+    return ((FLAG_IS_DIR if info["is_dir"] else 0)
+            | (FLAG_DO_RENAME if info["do_rename"] else 0)
+            | (FLAG_LOCKED if info["locked"] else 0)
+            | (FLAG_MODIFIED if info.get("modified", False) else 0))
+
+
+def _iter_session_lines(root: str, items):
+    encode = json.JSONEncoder(ensure_ascii=False).encode
+    yield encode({"format": SESSION_FORMAT, "version": SESSION_VERSION, "root": root}) + "\n"
+
+    if isinstance(items, ItemStore):
+        # столбцы напрямую, без ItemView на каждый элемент
+        dirs = items.dirs
+        rows = ((dirs[d], old, new, flags) for d, old, new, flags
+                in zip(items.dir_ids, items.old_names, items.new_names, items.flags))
+    else:
+        rows = ((info["rel_dir"], info["old_name"], info["new_name"], _item_flags(info))
+                for info in items)
+
+    dir_mtimes = getattr(items, "dir_mtimes", {})
+    dir_ids = {}
+    for rel_dir, old_name, new_name, flags in rows:
+        if flags & FLAG_REMOVED:
+            continue
+        dir_id = dir_ids.get(rel_dir)
+        if dir_id is None:
+            dir_id = dir_ids[rel_dir] = len(dir_ids)
+            mtime_ns = dir_mtimes.get(rel_dir)
+            if mtime_ns is None:
+                yield encode(rel_dir) + "\n"
+            else:
+                yield encode({"dir": rel_dir, "mtime_ns": mtime_ns}) + "\n"
+        yield encode([dir_id, old_name, None if new_name == old_name else new_name, flags]) + "\n"
+
+    # пустые папки: элементов нет, но mtime нужен rescan
+    for rel_dir, mtime_ns in dir_mtimes.items():
+        if rel_dir not in dir_ids:
+            yield encode({"dir": rel_dir, "mtime_ns": mtime_ns}) + "\n"
+
+
+@perf.timed("session.save")
+def save_session(path: str, root: str, items, fmt=None):
+    """
+    Сохраняет сессию. fmt: "json" (прежний формат) или "ndjson" (потоковый);
+    по умолчанию выбирается по расширению: *.json — json, иначе ndjson.
+    """
+    if fmt is None:
+        fmt = "json" if path.lower().endswith(".json") else "ndjson"
+    if fmt == "json":
+        data = {
+            "root": root,
+            "items": [{k: info[k] for k in ITEM_FIELDS} for info in items if not info.get("removed")],
+            "dir_mtimes": getattr(items, "dir_mtimes", {}),
+        }
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False, indent=2)
+    elif fmt == "ndjson":
+        with open(path, "w", encoding="utf-8", newline="\n") as f:
+            f.writelines(_iter_session_lines(root, items))
+    else:
+        raise ValueError(f"Неизвестный формат сессии: {fmt}")
+
+
+def _session_header(line: str):
+    """Заголовок потоковой сессии или None, если это не он."""
+    try:
+        header = json.loads(line)
+    except ValueError:
+        return None
+    if not isinstance(header, dict) or header.get("format") != SESSION_FORMAT:
+        return None
+    if not isinstance(header.get("version"), int) or header["version"] > SESSION_VERSION:
+        raise SessionFormatError(f"Неподдерживаемая версия файла сессии: {header.get('version')}")
+    return header
+
+
+def _iter_session_rows(f, dir_mtimes):
+    """
+    (rel_dir, old_name, new_name, flags) потоковой сессии; файл уже прочитан
+    до заголовка и закрывается в конце. Строки разбираются пачками: пачка
+    склеивается в один JSON-массив, это в разы быстрее json.loads на строку.
+    mtime папок складываются в dir_mtimes.
+    """
+    with f:
+        dirs = []
+        lineno = 1
+        while True:
+            lines = f.readlines(SESSION_READ_CHUNK)
+            if not lines:
+                return
+            try:
+                records = json.loads("[" + ",".join(line if line.strip() else "null" for line in lines) + "]")
+            except ValueError:
+                records = None
+            if records is None:
+                # ищем испорченную строку, чтобы назвать её номер
+                for offset, line in enumerate(lines, lineno + 1):
+                    if line.strip():
+                        try:
+                            json.loads(line)
+                        except ValueError as e:
+                            raise SessionFormatError(
+                                f"Файл сессии повреждён (строка {offset}): {e}") from None
+            for offset, rec in enumerate(records, lineno + 1):
+                if rec is None:
+                    continue
+                if isinstance(rec, str):
+                    dirs.append(rec)
+                    continue
+                try:
+                    if isinstance(rec, dict):
+                        dirs.append(rec["dir"])
+                        if rec.get("mtime_ns") is not None:
+                            dir_mtimes[rec["dir"]] = rec["mtime_ns"]
+                        continue
+                    dir_id, old_name, new_name, flags = rec
+                    yield dirs[dir_id], old_name, old_name if new_name is None else new_name, flags
+                except (ValueError, TypeError, IndexError, KeyError) as e:
+                    raise SessionFormatError(f"Файл сессии повреждён (строка {offset}): {e}") from None
+            lineno += len(lines)
+
+
+def _iter_session_records(f, dir_mtimes):
+    for rel_dir, old_name, new_name, flags in _iter_session_rows(f, dir_mtimes):
+        yield {
+            "rel_dir": rel_dir,
+            "old_name": old_name,
+            "new_name": new_name,
+            "do_rename": bool(flags & FLAG_DO_RENAME),
+            "is_dir": bool(flags & FLAG_IS_DIR),
+            "locked": bool(flags & FLAG_LOCKED),
+            "modified": bool(flags & FLAG_MODIFIED),
+        }
+
+
+def open_session(path: str, rows: bool = False, dir_mtimes=None):
+    """
+    Открывает сессию любого формата. Возвращает (root, итератор элементов).
+    Потоковая сессия читается по мере обхода итератора, JSON — сразу целиком.
+    rows=True — вместо словарей кортежи (rel_dir, old_name, new_name, flags).
+    Сохранённые mtime папок складываются в словарь dir_mtimes, если он передан.
+    """
+    if dir_mtimes is None:
+        dir_mtimes = {}
+    f = open(path, "r", encoding="utf-8")
+    header = None
+    try:
+        header = _session_header(f.readline())
+        if header is not None:
+            root = header.get("root", "")
+            if rows:
+                return root, _iter_session_rows(f, dir_mtimes)
+            return root, _iter_session_records(f, dir_mtimes)
+        f.seek(0)
+        data = json.load(f)
+    finally:
+        if header is None:
+            f.close()
+
+    if not isinstance(data, dict):
+        raise SessionFormatError("Формат файла сессии некорректен.")
+    root = data.get("root", "")
+    items = data.get("items", [])
+
+    if not isinstance(items, list):
+        raise SessionFormatError("Формат файла сессии некорректен.")
+    if isinstance(data.get("dir_mtimes"), dict):
+        dir_mtimes.update(data["dir_mtimes"])
+
+    # нормализация полей
+    items = (normalize_item(it) for it in items)
+    if rows:
+        items = ((it["rel_dir"], it["old_name"], it["new_name"], _item_flags(it)) for it in items)
+    return root, items
+
+
+@perf.timed("session.load")
+def load_session(path: str):
+    """Читает сессию (json или потоковую). Возвращает (root, items)."""
+    store = ItemStore()
+    root, rows = open_session(path, rows=True, dir_mtimes=store.dir_mtimes)
+    add = store.add_packed
+    for rel_dir, old_name, new_name, flags in rows:
+        add(rel_dir, old_name, new_name, flags)
+    return root, store
+
+
+class SessionLoadJob(ScanJob):
+    """
+    Загрузка сессии в фоновом потоке с тем же интерфейсом, что у ScanJob:
+    таблица наполняется пачками, пока файл ещё читается. Заголовок (root)
+    читается сразу, ошибки открытия бросаются из конструктора.
+    """
+
+    def __init__(self, path: str, batch_size: int = 2000, flush_interval: float = 0.25):
+        dir_mtimes = {}
+        root, self._source = open_session(path, dir_mtimes=dir_mtimes)
+        super().__init__(root, batch_size, flush_interval)
+        self.path = path
+        # наполняется по мере чтения; к концу загрузки — все mtime из сессии
+        self.dir_mtimes = dir_mtimes
+
+    def _iter_items(self):
+        try:
+            for item in self._source:
+                if self.cancelled:
+                    break
+                yield item
+        finally:
+            self._source.close()
+
+
+PLAN_FIELDS = ITEM_FIELDS + ("conflict",)
+
+# форматы плана: json — один массив; csv/tsv/ndjson — построчные, пишутся
+# и читаются потоком (таблицы, diff, ревью), по строке на элемент
+PLAN_FORMATS = ("json", "csv", "tsv", "ndjson")
+PLAN_EXTS = {
+    ".json": "json",
+    ".csv": "csv",
+    ".tsv": "tsv",
+    ".ndjson": "ndjson",
+    ".jsonl": "ndjson",
+}
+# без этих столбцов строка плана бессмысленна
+PLAN_REQUIRED_FIELDS = ("rel_dir", "old_name")
+
+_PLAN_TRUE = {"1", "true", "yes", "y", "да", "+"}
+_PLAN_FALSE = {"0", "false", "no", "n", "нет", "-", ""}
+
+
+class PlanError(ValueError):
+    """Файл плана прочитан, но строка в нём некорректна."""
+
+
+def plan_format_of(path: str, default: str = "json") -> str:
+    """Формат плана по расширению файла."""
+    return PLAN_EXTS.get(os.path.splitext(path)[1].lower(), default)
+
+
+def iter_plan_rows(items, conflict_indices):
+    for idx, info in enumerate(items):
+        if info.get("removed"):
+            continue
+        row = {k: info[k] for k in ITEM_FIELDS}
+        row["conflict"] = idx in conflict_indices
+        yield row
+
+
+def write_plan(fp, items, conflict_indices, fmt="json"):
+    """Выводит план переименования в формате json, csv, tsv или ndjson."""
+    rows = iter_plan_rows(items, conflict_indices)
+    if fmt == "json":
+        json.dump(list(rows), fp, ensure_ascii=False, indent=2)
+        fp.write("\n")
+    elif fmt in ("csv", "tsv"):
+        writer = csv.DictWriter(fp, fieldnames=PLAN_FIELDS, delimiter="\t" if fmt == "tsv" else ",")
+        writer.writeheader()
+        for row in rows:
+            writer.writerow({k: int(v) if isinstance(v, bool) else v for k, v in row.items()})
+    elif fmt == "ndjson":
+        encode = json.JSONEncoder(ensure_ascii=False).encode
+        for row in rows:
+            fp.write(encode(row) + "\n")
+    else:
+        raise ValueError(f"Неизвестный формат плана: {fmt}")
+
+
+def _plan_bool(value, field: str, line: int) -> bool:
+    if isinstance(value, bool):
+        return value
+    if isinstance(value, int):
+        return value != 0
+    text = str(value).strip().lower()
+    if text in _PLAN_TRUE:
+        return True
+    if text in _PLAN_FALSE:
+        return False
+    raise PlanError(f"Строка {line}: {field} = {value!r} — ожидается 0/1 или true/false.")
+
+
+def _plan_rel_dir(value: str, line: int) -> str:
+    """rel_dir из плана: разделители этой ОС, без выхода за пределы корня."""
+    rel_dir = str(value or "")
+    if os.path.isabs(rel_dir):
+        raise PlanError(f"Строка {line}: путь {value!r} выходит за пределы корня.")
+    if os.altsep:
+        # план, сохранённый на Linux/macOS, читается и на Windows
+        rel_dir = rel_dir.replace(os.altsep, os.sep)
+    rel_dir = rel_dir.strip(os.sep)
+    parts = [part for part in rel_dir.split(os.sep) if part not in ("", ".")]
+    if ".." in parts:
+        raise PlanError(f"Строка {line}: путь {value!r} выходит за пределы корня.")
+    return os.sep.join(parts)
+
+
+def _plan_item(row, line: int) -> dict:
+    if not isinstance(row, dict):
+        raise PlanError(f"Строка {line}: ожидается объект с полями {', '.join(PLAN_REQUIRED_FIELDS)}.")
+    missing = [field for field in PLAN_REQUIRED_FIELDS if row.get(field) is None]
+    if missing:
+        raise PlanError(f"Строка {line}: нет поля {', '.join(missing)}.")
+    old_name = str(row["old_name"])
+    new_name = row.get("new_name")
+    new_name = old_name if new_name in (None, "") else str(new_name)
+    do_rename = row.get("do_rename")
+    return {
+        "rel_dir": _plan_rel_dir(row["rel_dir"], line),
+        "old_name": old_name,
+        "new_name": new_name,
+        # без столбца do_rename переименовывается всё, что меняет имя
+        "do_rename": new_name != old_name if do_rename is None else _plan_bool(do_rename, "do_rename", line),
+        "is_dir": _plan_bool(row.get("is_dir", False), "is_dir", line),
+        "locked": _plan_bool(row.get("locked", False), "locked", line),
+        "modified": _plan_bool(row.get("modified", False), "modified", line),
+    }
+
+
+def iter_plan_file(fp, fmt="json"):
+    """
+    Читает план (write_plan() или отредактированный вручную) и выдаёт
+    элементы-словари. csv/tsv/ndjson читаются построчно. Обязательны
+    столбцы rel_dir и old_name; столбец conflict игнорируется.
+    """
+    if fmt == "json":
+        data = json.load(fp)
+        if not isinstance(data, list):
+            raise PlanError("План в формате json должен быть массивом элементов.")
+        for line, row in enumerate(data, 1):
+            yield _plan_item(row, line)
+    elif fmt in ("csv", "tsv"):
+        reader = csv.DictReader(fp, delimiter="\t" if fmt == "tsv" else ",")
+        missing = [field for field in PLAN_REQUIRED_FIELDS if field not in (reader.fieldnames or ())]
+        if missing:
+            raise PlanError(f"В заголовке плана нет столбцов: {', '.join(missing)}.")
+        for row in reader:
+            yield _plan_item(row, reader.line_num)
+    elif fmt == "ndjson":
+        for line, text in enumerate(fp, 1):
+            if not text.strip():
+                continue
+            try:
+                row = json.loads(text)
+            except ValueError as e:
+                raise PlanError(f"Строка {line}: {e}") from None
+            yield _plan_item(row, line)
+    else:
+        raise ValueError(f"Неизвестный формат плана: {fmt}")
+
+
+def open_plan(path: str, fmt=None):
+    """
+    Открывает план; формат по умолчанию — по расширению. Возвращает итератор
+    элементов. Файл открывается сразу: ошибка открытия или неизвестный формат
+    бросаются здесь, а не при первом чтении (в потоке PlanLoadJob).
+    """
+    fmt = fmt or plan_format_of(path)
+    if fmt not in PLAN_FORMATS:
+        raise ValueError(f"Неизвестный формат плана: {fmt}")
+    # utf-8-sig: таблицы, сохранённые из офисных программ, начинаются с BOM
+    f = open(path, "r", encoding="utf-8-sig", newline="")
+    return _iter_plan_and_close(f, fmt)
+
+
+def _iter_plan_and_close(f, fmt):
+    try:
+        yield from iter_plan_file(f, fmt)
+    finally:
+        f.close()
+
+
+@perf.timed("plan.read")
+def read_plan(path: str, fmt=None) -> ItemStore:
+    """Читает план целиком в ItemStore."""
+    store = ItemStore()
+    add = store.add
+    for it in open_plan(path, fmt):
+        add(it["rel_dir"], it["old_name"], it["new_name"], it["is_dir"], it["do_rename"],
+            it["locked"], it["modified"])
+    return store
+
+
+def _is_valid_name(name: str) -> bool:
+    return bool(name) and name not in (".", "..") and os.sep not in name and not (
+        os.altsep and os.altsep in name) and "\0" not in name
+
+
+@perf.timed("plan.validate")
+def validate_plan(root: str, items, listing=None) -> dict:
+    """
+    Проверяет план по диску перед переименованием: одно чтение каждой папки
+    (os.scandir), где есть что переименовывать, без stat на элемент.
+    Возвращает {индекс: причина} для элементов, которые выполнить нельзя:
+    папки или исходного имени нет, тип на диске другой, новое имя
+    недопустимо или конфликтует (ConflictIndex по тому же снимку папок).
+    """
+    if listing is None:
+        listing = DirListing(root)
+    problems = {}
+    for rel_dir, indices in _items_by_dir(items).items():
+        active = [idx for idx in indices
+                  if items[idx]["do_rename"] and items[idx]["old_name"] != items[idx]["new_name"]]
+        if not active:
+            continue
+        path = parent_dir_of(root, rel_dir)
+        try:
+            mtime_ns = os.stat(path).st_mtime_ns
+            with os.scandir(path) as entries:
+                kinds = {entry.name: entry.is_dir() for entry in entries}
+        except OSError as e:
+            for idx in active:
+                problems[idx] = f"папка недоступна ({e.strerror or e})"
+            continue
+        listing.record(rel_dir, kinds, mtime_ns)
+
+        for idx in active:
+            info = items[idx]
+            is_dir = kinds.get(info["old_name"])
+            if is_dir is None:
+                problems[idx] = "не найден на диске"
+            elif is_dir != bool(info["is_dir"]):
+                problems[idx] = "на диске это папка" if is_dir else "на диске это файл"
+            elif not _is_valid_name(info["new_name"]):
+                problems[idx] = f"недопустимое новое имя {info['new_name']!r}"
+
+    for idx in ConflictIndex(root, items, listing=listing).conflict_indices:
+        problems.setdefault(idx, "конфликт: новое имя занято")
+    return problems
+
+
+class PlanLoadJob(ScanJob):
+    """
+    Импорт плана в фоновом потоке с интерфейсом ScanJob (таблица GUI
+    наполняется по мере чтения). Корень задаётся явно: в плане только
+    относительные пути. Ошибки открытия файла бросаются из конструктора.
+    """
+
+    def __init__(self, root: str, path: str, fmt=None, batch_size: int = 2000,
+                 flush_interval: float = 0.25):
+        super().__init__(root, batch_size, flush_interval)
+        self.path = path
+        self._source = open_plan(path, fmt)
+
+    def _iter_items(self):
+        try:
+            for item in self._source:
+                if self.cancelled:
+                    break
+                yield item
+        finally:
+            self._source.close()
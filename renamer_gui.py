@@ -0,0 +1,1604 @@
+import logging
+import logging.handlers
+import os
+import queue
+import re
+import time
+from collections import deque
+import tkinter as tk
+from tkinter import ttk, filedialog, messagebox
+import tkinter.font as tkfont
+
+import renamer_core as core
+import renamer_journal
+import renamer_perf as perf
+import renamer_watch
+from renamer_core import rel_path_of
+
+
+# фоновое сканирование: как часто забирать пачки и перерисовывать таблицу
+SCAN_POLL_MS = 100
+SCAN_REFRESH_INTERVAL = 1.0
+
+# виртуальная таблица: сколько строк держать в Treeview сверх видимых
+VIEW_MARGIN = 5
+# на сколько строк прокручивает один щелчок колёсика мыши
+WHEEL_ROWS = 3
+
+# лог: как часто выводить накопленные строки в виджет и сколько строк в нём держать
+LOG_FLUSH_MS = 100
+LOG_MAX_LINES = 5000
+# полный лог — в ротируемый файл
+LOG_DIR = os.path.join(os.path.expanduser("~"), ".renamer", "logs")
+LOG_FILE_MAX_BYTES = 10 * 1024 * 1024
+LOG_FILE_BACKUPS = 5
+
+# слежение за диском (renamer_watch): события копятся и применяются
+# к списку одной пачкой не чаще, чем раз в столько миллисекунд
+WATCH_APPLY_MS = 500
+
+# панель замеров (renamer_perf): период обновления
+PERF_PANEL_MS = 1000
+
+# строка поиска: пауза после последнего нажатия перед пересчётом
+SEARCH_DELAY_MS = 200
+# где искать и как понимать запрос: подпись -> core.SEARCH_FIELDS / core.SEARCH_MODES
+SEARCH_FIELD_CHOICES = {
+    "путь и новое имя": "both",
+    "старый путь": "path",
+    "новое имя": "new",
+}
+SEARCH_MODE_CHOICES = {
+    "подстрока": "substring",
+    "маска (*.txt)": "glob",
+    "регулярное выражение": "regex",
+}
+
+# вид суффикса для авто-решения конфликтов: подпись -> ключ core.SUFFIX_POLICIES
+SUFFIX_CHOICES = {
+    "имя_1": "underscore",
+    "имя (1)": "parens",
+    "имя_001": "padded",
+}
+
+# групповая правка: сколько шагов отмены хранить
+BULK_UNDO_DEPTH = 20
+# операции панели групповой правки: подпись -> ключ
+BULK_OPERATIONS = {
+    "Замена (регулярное выражение)": "regex",
+    "Добавить префикс": "prefix",
+    "Добавить суффикс": "suffix",
+    "Сменить регистр": "case",
+    "Транслит заново": "translit",
+    "Исключить": "exclude",
+    "Включить": "include",
+    "Зафиксировать": "lock",
+    "Снять фиксацию": "unlock",
+}
+# регистр: подпись -> ключ core.BULK_CASES
+BULK_CASE_CHOICES = {
+    "строчные": "lower",
+    "ПРОПИСНЫЕ": "upper",
+    "С прописной": "capitalize",
+    "Каждое Слово": "title",
+}
+
+# типы файлов в диалогах сессии: потоковый формат и прежний JSON
+SESSION_FILETYPES = [
+    ("Сессии", "*" + core.SESSION_EXT),
+    ("JSON файлы", "*.json"),
+    ("Все файлы", "*.*"),
+]
+
+# типы файлов в диалогах плана (core.write_plan / core.open_plan)
+PLAN_FILETYPES = [
+    ("CSV", "*.csv"),
+    ("TSV", "*.tsv"),
+    ("NDJSON", "*.ndjson"),
+    ("JSON файлы", "*.json"),
+    ("Все файлы", "*.*"),
+]
+
+# столбцы, сортировка по которым зависит от редактируемых полей элемента
+_EDIT_SENSITIVE_SORT = ("exc", "lock", "conf", "mod", "new")
+
+
+class LogSink:
+    """
+    Лог окна: сообщения копятся в буфере и выводятся в tk.Text одной
+    вставкой не чаще раза в LOG_FLUSH_MS; в виджете остаются только
+    последние LOG_MAX_LINES строк. Полный лог пишется в ротируемый файл
+    в фоновом потоке (QueueHandler → QueueListener).
+    """
+
+    def __init__(self, widget: tk.Text, log_dir: str = LOG_DIR):
+        self.widget = widget
+        self.path = None
+        self._pending = deque(maxlen=LOG_MAX_LINES)
+        self._lines = 0
+        self._flush_scheduled = False
+
+        self._listener = None
+        self._logger = logging.getLogger("renamer.gui")
+        self._logger.propagate = False
+        self._logger.setLevel(logging.INFO)
+        try:
+            os.makedirs(log_dir, exist_ok=True)
+            self.path = os.path.join(log_dir, "renamer.log")
+            handler = logging.handlers.RotatingFileHandler(
+                self.path, maxBytes=LOG_FILE_MAX_BYTES, backupCount=LOG_FILE_BACKUPS, encoding="utf-8")
+        except OSError:
+            self.path = None
+        else:
+            handler.setFormatter(logging.Formatter("%(asctime)s %(message)s"))
+            log_queue = queue.Queue()
+            self._logger.addHandler(logging.handlers.QueueHandler(log_queue))
+            self._listener = logging.handlers.QueueListener(log_queue, handler)
+            self._listener.start()
+
+    def write(self, msg: str):
+        self._pending.append(msg)
+        if self._listener is not None:
+            self._logger.info(msg)
+        if not self._flush_scheduled:
+            self._flush_scheduled = True
+            self.widget.after(LOG_FLUSH_MS, self.flush)
+
+    def flush(self):
+        self._flush_scheduled = False
+        if not self._pending:
+            return
+        lines = list(self._pending)
+        self._pending.clear()
+
+        w = self.widget
+        w.config(state="normal")
+        w.insert(tk.END, "\n".join(lines) + "\n")
+        self._lines += len(lines)
+        if self._lines > LOG_MAX_LINES:
+            excess = self._lines - LOG_MAX_LINES
+            w.delete("1.0", f"{excess + 1}.0")
+            self._lines = LOG_MAX_LINES
+        w.see(tk.END)
+        w.config(state="disabled")
+
+    def close(self):
+        if self._listener is not None:
+            self._listener.stop()
+            self._listener = None
+
+
+class PerfPanel(tk.Toplevel):
+    """Окно с замерами renamer_perf: таймеры, счётчики, обращения к ФС."""
+
+    def __init__(self, master):
+        super().__init__(master)
+        self.title("Производительность")
+        self.geometry("640x360")
+
+        cols = ("count", "total", "avg", "max", "last")
+        self.tree = ttk.Treeview(self, columns=cols, show="tree headings", height=12)
+        self.tree.heading("#0", text="Замер")
+        self.tree.column("#0", width=180)
+        for col, text in zip(cols, ("Вызовов", "Всего, с", "Среднее, с", "Макс, с", "Последний, с")):
+            self.tree.heading(col, text=text)
+            self.tree.column(col, width=85, anchor="e")
+        self.tree.pack(fill=tk.BOTH, expand=True, padx=5, pady=5)
+
+        self.label_fs = ttk.Label(self, text="", wraplength=600, justify="left")
+        self.label_fs.pack(anchor="w", padx=5)
+
+        frame_buttons = ttk.Frame(self)
+        frame_buttons.pack(anchor="w", padx=5, pady=5)
+        ttk.Button(frame_buttons, text="Сохранить JSON...", command=self.save_json).pack(side=tk.LEFT)
+        self.button_profile = ttk.Button(frame_buttons, command=self.toggle_profile)
+        self.button_profile.pack(side=tk.LEFT, padx=(5, 0))
+        ttk.Button(frame_buttons, text="Сбросить", command=self.reset).pack(side=tk.LEFT, padx=(5, 0))
+
+        self._after_id = None
+        self._refresh()
+
+    def _refresh(self):
+        snap = perf.snapshot()
+        self.tree.delete(*self.tree.get_children())
+        for name, t in sorted(snap["timers"].items()):
+            self.tree.insert("", "end", text=name, values=(
+                t["count"], f"{t['total_sec']:.3f}", f"{t['avg_sec']:.4f}",
+                f"{t['max_sec']:.4f}", f"{t['last_sec']:.4f}",
+            ))
+        for name, value in sorted(snap["counters"].items()):
+            self.tree.insert("", "end", text=name, values=(value, "", "", "", ""))
+
+        calls = ", ".join(f"{name}: {n}" for name, n in sorted(snap["fs_calls"].items()))
+        self.label_fs.config(text=f"Обращения к ФС: {calls or 'нет'}")
+        self.button_profile.config(
+            text="Остановить профиль..." if perf.profiling() else "Начать профиль cProfile")
+        self._after_id = self.after(PERF_PANEL_MS, self._refresh)
+
+    def save_json(self):
+        path = filedialog.asksaveasfilename(
+            parent=self, title="Сохранить замеры", defaultextension=".json",
+            filetypes=[("JSON файлы", "*.json"), ("Все файлы", "*.*")])
+        if path:
+            perf.dump_json(path)
+
+    def toggle_profile(self):
+        if not perf.profiling():
+            perf.start_profile()
+            return
+        path = filedialog.asksaveasfilename(
+            parent=self, title="Сохранить профиль", defaultextension=".prof",
+            filetypes=[("Профиль cProfile", "*.prof"), ("Все файлы", "*.*")])
+        if path:
+            perf.stop_profile(path)
+
+    def reset(self):
+        perf.reset()
+
+    def destroy(self):
+        if self._after_id is not None:
+            self.after_cancel(self._after_id)
+        super().destroy()
+
+
+class BulkEditPanel(tk.Toplevel):
+    """
+    Окно групповой правки: одно правило на выделенные строки или на все
+    строки текущего фильтра. Правка применяется одной пачкой и отменяется
+    целиком (RenameToolApp.apply_bulk_edit / undo_bulk_edit).
+    """
+
+    def __init__(self, app):
+        super().__init__(app)
+        self.app = app
+        self.title("Групповая правка")
+        self.resizable(False, False)
+
+        self.op_var = tk.StringVar(value=next(iter(BULK_OPERATIONS)))
+        self.find_var = tk.StringVar()
+        self.repl_var = tk.StringVar()
+        self.ignore_case_var = tk.BooleanVar(value=False)
+        self.case_var = tk.StringVar(value=next(iter(BULK_CASE_CHOICES)))
+        self.target_var = tk.StringVar(value="selection")
+
+        frame = ttk.Frame(self, padding=10)
+        frame.pack(fill=tk.BOTH, expand=True)
+
+        ttk.Label(frame, text="Операция:").grid(row=0, column=0, sticky="w")
+        ttk.Combobox(frame, textvariable=self.op_var, values=list(BULK_OPERATIONS),
+                     state="readonly", width=30).grid(row=0, column=1, sticky="w", pady=2)
+
+        ttk.Label(frame, text="Найти / текст:").grid(row=1, column=0, sticky="w")
+        ttk.Entry(frame, textvariable=self.find_var, width=33).grid(row=1, column=1, sticky="w", pady=2)
+        ttk.Label(frame, text="Заменить на:").grid(row=2, column=0, sticky="w")
+        ttk.Entry(frame, textvariable=self.repl_var, width=33).grid(row=2, column=1, sticky="w", pady=2)
+        ttk.Checkbutton(frame, text="без учёта регистра",
+                        variable=self.ignore_case_var).grid(row=3, column=1, sticky="w")
+
+        ttk.Label(frame, text="Регистр:").grid(row=4, column=0, sticky="w")
+        ttk.Combobox(frame, textvariable=self.case_var, values=list(BULK_CASE_CHOICES),
+                     state="readonly", width=30).grid(row=4, column=1, sticky="w", pady=2)
+
+        ttk.Label(frame, text="Применить к:").grid(row=5, column=0, sticky="nw", pady=(8, 0))
+        frame_target = ttk.Frame(frame)
+        frame_target.grid(row=5, column=1, sticky="w", pady=(8, 0))
+        self.radio_selection = ttk.Radiobutton(frame_target, variable=self.target_var, value="selection")
+        self.radio_selection.pack(anchor="w")
+        self.radio_view = ttk.Radiobutton(frame_target, variable=self.target_var, value="view")
+        self.radio_view.pack(anchor="w")
+
+        frame_buttons = ttk.Frame(frame)
+        frame_buttons.grid(row=6, column=0, columnspan=2, sticky="w", pady=(10, 0))
+        ttk.Button(frame_buttons, text="Применить", command=self.apply).pack(side=tk.LEFT)
+        ttk.Button(frame_buttons, text="Отменить последнюю групповую правку",
+                   command=self.app.undo_bulk_edit).pack(side=tk.LEFT, padx=(5, 0))
+
+        self.update_counts()
+
+    def update_counts(self):
+        """Подписи целей с текущим числом строк (вызывается приложением)."""
+        self.radio_selection.config(text=f"выделенным строкам ({len(self.app.selected)})")
+        self.radio_view.config(text=f"всем строкам текущего фильтра ({len(self.app.view_indices)})")
+
+    def apply(self):
+        app = self.app
+        if app._scan_busy():
+            return
+        indices = app.bulk_targets(self.target_var.get())
+        if not indices:
+            messagebox.showinfo("Информация", "Нет строк для правки.", parent=self)
+            return
+
+        op_label = self.op_var.get()
+        op = BULK_OPERATIONS[op_label]
+        title = op_label
+        try:
+            if op == "regex":
+                if not self.find_var.get():
+                    messagebox.showwarning("Внимание", "Укажите, что искать.", parent=self)
+                    return
+                rule = core.bulk_rule_regex(self.find_var.get(), self.repl_var.get(),
+                                            self.ignore_case_var.get())
+                title = f"{op_label}: {self.find_var.get()} → {self.repl_var.get()}"
+                edit = core.bulk_rename(app.items, indices, rule, title)
+            elif op in ("prefix", "suffix"):
+                text = self.find_var.get()
+                if not text:
+                    messagebox.showwarning("Внимание", "Укажите текст.", parent=self)
+                    return
+                make_rule = core.bulk_rule_prefix if op == "prefix" else core.bulk_rule_suffix
+                title = f"{op_label}: {text}"
+                edit = core.bulk_rename(app.items, indices, make_rule(text), title)
+            elif op == "case":
+                title = f"{op_label}: {self.case_var.get()}"
+                rule = core.bulk_rule_case(BULK_CASE_CHOICES[self.case_var.get()])
+                edit = core.bulk_rename(app.items, indices, rule, title)
+            elif op == "translit":
+                edit = core.bulk_retranslit(app.items, indices, title)
+            elif op in ("exclude", "include"):
+                edit = core.bulk_set_flags(app.items, indices, do_rename=(op == "include"), title=title)
+            else:
+                edit = core.bulk_set_flags(app.items, indices, locked=(op == "lock"), title=title)
+        except (re.error, IndexError) as e:
+            # IndexError: ссылка на несуществующую группу в строке замены
+            messagebox.showerror("Ошибка", f"Ошибка в выражении: {e}", parent=self)
+            return
+
+        app.apply_bulk_edit(edit)
+
+
+class RenameToolApp(tk.Tk):
+    def __init__(self):
+        super().__init__()
+        self.title("Переименование файлов и папок (транслит → кириллица)")
+        self.geometry("1200x700")
+
+        self.directory = tk.StringVar()
+
+        # items: модель (все элементы), core.ItemStore; элемент выглядит как словарь
+        # {
+        #   "rel_dir": str,
+        #   "old_name": str,
+        #   "new_name": str,
+        #   "do_rename": bool,
+        #   "is_dir": bool,
+        #   "locked": bool,
+        #   "modified": bool,  # [M] – кириллическое имя изменено вручную
+        # }
+        self.items = core.ItemStore()
+
+        # индекс конфликтов по (rel_dir, new_name); пересобирается целиком только
+        # после сканирования/загрузки/переименования, правки обновляют его точечно
+        self.conflicts = core.ConflictIndex()
+
+        # текущий выбранный индекс в self.items
+        self.current_index = None
+        # выделенные строки (индексы self.items): Treeview держит только видимое
+        # окно, поэтому выделение за его пределами хранится здесь
+        self.selected = set()
+        self._select_extend = False
+
+        # групповая правка: стек отмены (core.BulkEdit) и окно панели
+        self.bulk_undo = []
+        self.bulk_panel = None
+
+        # фильтры
+        self.filter_conflicts_only = tk.BooleanVar(value=False)
+        self.filter_by_dir = tk.BooleanVar(value=False)
+        self.filter_dir_recursive = tk.BooleanVar(value=False)
+        self.current_filter_dir = ""   # rel_dir текущего фильтра по подкаталогу
+        # rel_dir -> индексы элементов; фильтр по папке не просматривает весь список
+        self.dir_index = core.DirIndex()
+        # строка поиска; найденные индексы считаются заново только после изменений
+        self.search_text = tk.StringVar(value="")
+        self.search_field = tk.StringVar(value=next(iter(SEARCH_FIELD_CHOICES)))
+        self.search_mode = tk.StringVar(value=next(iter(SEARCH_MODE_CHOICES)))
+        self.search_index = core.SearchIndex()
+        self._search_matches = None
+        self._search_after_id = None
+
+        # сортировка
+        self.sort_column = None  # одно из core.SORT_COLUMNS
+        self.sort_reverse = False
+        # кэш ключей и порядков сортировки; правки обновляют его точечно
+        self.sorter = core.SortIndex()
+
+        # фоновое сканирование (core.ScanJob) или None
+        self.scan_job = None
+        self._scan_last_refresh = 0.0
+        self._scan_started = 0.0
+
+        # переименование, resume или undo в фоне (renamer_journal.JournalJob) или None;
+        # _journal_finish — что сделать по его завершении
+        self.journal_job = None
+        self._journal_finish = None
+
+        # слежение за диском после сканирования (renamer_watch): наблюдатель,
+        # применение его событий к self.items и можно ли следить за текущим списком
+        # (импортированный план — не снимок дерева, за ним не следим)
+        self.watch_enabled = tk.BooleanVar(value=False)
+        self.watcher = None
+        self.watch_sync = None
+        self._watch_allowed = False
+
+        # окно замеров (только при включённом renamer_perf)
+        self.perf_panel = None
+
+        # виртуальная таблица: отфильтрованные и отсортированные индексы,
+        # позиция индекса в этом списке и первая видимая строка
+        self.view_indices = []
+        self.view_pos = {}
+        self.view_top = 0
+        self._row_height = 20
+        self._tree_header_height = 24
+
+        self.create_widgets()
+         # НАСТРОЙКА ШРИФТА И ВЫСОТЫ СТРОК ДЛЯ TREEVIEW
+        style = ttk.Style(self)
+
+        # базовый моноширинный шрифт
+        tree_font = tkfont.nametofont("TkFixedFont")
+        tree_font.configure(size=10)  # можно 9–11, на вкус
+
+        # высота строки = высота шрифта + небольшой запас
+        row_h = tree_font.metrics("linespace") + 4
+
+        style.configure(
+            "Treeview",
+            font=tree_font,
+            rowheight=row_h,
+        )
+        self._row_height = row_h
+        style.configure(
+            "Treeview.Heading",
+            font=("TkDefaultFont", 9, "bold"),
+        )
+
+    @property
+    def conflict_indices(self):
+        """Индексы с конфликтами (индексы в self.items)."""
+        return self.conflicts.conflict_indices
+
+    # ---------- UI ----------
+
+    def create_widgets(self):
+        frame_top = ttk.Frame(self)
+        frame_top.pack(fill=tk.X, padx=10, pady=10)
+
+        ttk.Label(frame_top, text="Директория:").pack(side=tk.LEFT)
+        entry_dir = ttk.Entry(frame_top, textvariable=self.directory, width=50)
+        entry_dir.pack(side=tk.LEFT, padx=(5, 5))
+
+        ttk.Button(frame_top, text="Обзор...", command=self.browse_directory).pack(side=tk.LEFT)
+        ttk.Button(frame_top, text="Сканировать", command=self.scan_directory).pack(side=tk.LEFT, padx=(10, 0))
+        ttk.Button(frame_top, text="Досканировать изменения", command=self.rescan_directory).pack(
+            side=tk.LEFT, padx=(5, 0))
+        self.button_cancel_scan = ttk.Button(frame_top, text="Отмена", command=self.cancel_scan, state="disabled")
+        self.button_cancel_scan.pack(side=tk.LEFT, padx=(5, 0))
+        ttk.Checkbutton(frame_top, text="Следить за диском", variable=self.watch_enabled,
+                        command=self.on_watch_toggle).pack(side=tk.LEFT, padx=(10, 0))
+
+        ttk.Button(frame_top, text="Сохранить сессию", command=self.save_session).pack(side=tk.LEFT, padx=(10, 0))
+        ttk.Button(frame_top, text="Загрузить сессию", command=self.load_session).pack(side=tk.LEFT, padx=(5, 0))
+        ttk.Button(frame_top, text="Экспорт плана...", command=self.export_plan).pack(side=tk.LEFT, padx=(10, 0))
+        ttk.Button(frame_top, text="Импорт плана...", command=self.import_plan).pack(side=tk.LEFT, padx=(5, 0))
+
+        self.label_progress = ttk.Label(frame_top, text="")
+        self.label_progress.pack(side=tk.LEFT, padx=(10, 0))
+
+        # Легенда и фильтры
+        frame_legend = ttk.Frame(self)
+        frame_legend.pack(fill=tk.X, padx=10, pady=(0, 5))
+
+        ttk.Label(
+            frame_legend,
+            text=(
+                "Тип: DIR/FILE, Исключен: X, Лок: L, Конфликт: !, Изменён: M"
+            ),
+            foreground="gray"
+        ).grid(row=0, column=0, columnspan=4, sticky="w", pady=(0, 3))
+
+        chk_conf = ttk.Checkbutton(
+            frame_legend,
+            text="Только конфликтующие",
+            variable=self.filter_conflicts_only,
+            command=self.on_filter_change
+        )
+        chk_conf.grid(row=1, column=0, sticky="w", padx=(0, 10))
+
+        chk_dir = ttk.Checkbutton(
+            frame_legend,
+            text="Только выбранная поддиректория",
+            variable=self.filter_by_dir,
+            command=self.on_filter_change
+        )
+        chk_dir.grid(row=1, column=1, sticky="w")
+
+        chk_recursive = ttk.Checkbutton(
+            frame_legend,
+            text="с вложенными",
+            variable=self.filter_dir_recursive,
+            command=self.on_filter_change
+        )
+        chk_recursive.grid(row=1, column=2, sticky="w", padx=(5, 0))
+
+        self.label_current_dir_filter = ttk.Label(frame_legend, text="Фильтр по поддиректории: (нет)")
+        self.label_current_dir_filter.grid(row=1, column=3, sticky="w", padx=(20, 0))
+
+        frame_search = ttk.Frame(frame_legend)
+        frame_search.grid(row=2, column=0, columnspan=4, sticky="w", pady=(3, 0))
+        ttk.Label(frame_search, text="Поиск:").pack(side=tk.LEFT)
+        ttk.Entry(frame_search, textvariable=self.search_text, width=40).pack(side=tk.LEFT, padx=(5, 0))
+        for var, choices, width in ((self.search_field, SEARCH_FIELD_CHOICES, 18),
+                                    (self.search_mode, SEARCH_MODE_CHOICES, 20)):
+            combo = ttk.Combobox(frame_search, textvariable=var, values=list(choices),
+                                 state="readonly", width=width)
+            combo.pack(side=tk.LEFT, padx=(5, 0))
+            combo.bind("<<ComboboxSelected>>", lambda e: self.on_search_change())
+        self.label_search = ttk.Label(frame_search, text="", foreground="gray")
+        self.label_search.pack(side=tk.LEFT, padx=(10, 0))
+        self.search_text.trace_add("write", lambda *args: self._schedule_search())
+
+        # Центральная часть
+        frame_center = ttk.Panedwindow(self, orient=tk.HORIZONTAL)
+        frame_center.pack(fill=tk.BOTH, expand=True, padx=10, pady=(5, 10))
+
+        # Таблица
+        frame_table = ttk.Frame(frame_center)
+        frame_center.add(frame_table, weight=3)
+
+        ttk.Label(frame_table, text="Элементы:").pack(anchor="w")
+
+        cols = ("type", "exc", "lock", "conf", "mod", "path", "new")
+        self.tree = ttk.Treeview(
+            frame_table,
+            columns=cols,
+            show="headings",
+            selectmode="extended"
+        )
+
+        headings = {
+            "type": "Тип",
+            "exc": "Исключен",
+            "lock": "Лок",
+            "conf": "Конфликт",
+            "mod": "Изменён",
+            "path": "Старый путь",
+            "new": "Новое имя",
+        }
+
+        for col in cols:
+            self.tree.heading(col, text=headings[col],
+                              command=lambda c=col: self.on_column_click(c))
+
+        # ширины по умолчанию
+        self.tree.column("type", width=70, anchor="center")
+        self.tree.column("exc", width=80, anchor="center")
+        self.tree.column("lock", width=60, anchor="center")
+        self.tree.column("conf", width=80, anchor="center")
+        self.tree.column("mod", width=80, anchor="center")
+        self.tree.column("path", width=400, anchor="w")
+        self.tree.column("new", width=250, anchor="w")
+
+        self.tree.tag_configure("conflict", foreground="red")
+
+        # Treeview содержит только видимое окно строк, поэтому полоса прокрутки
+        # управляет не самим виджетом, а позицией окна в self.view_indices
+        self.vsb = ttk.Scrollbar(frame_table, orient=tk.VERTICAL, command=self.on_vscroll)
+
+        self.tree.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+        self.vsb.pack(side=tk.RIGHT, fill=tk.Y)
+
+        self.tree.bind("<<TreeviewSelect>>", self.on_tree_select)
+        # Ctrl/Shift + щелчок дополняют выделение, а не заменяют его
+        self.tree.bind("<ButtonPress-1>", self._on_tree_press)
+        self.tree.bind("<Control-a>", self.select_all_in_view)
+        self.tree.bind("<Configure>", lambda e: self._render_window())
+        self.tree.bind("<MouseWheel>", self.on_mousewheel)
+        self.tree.bind("<Button-4>", lambda e: self.scroll_rows(-WHEEL_ROWS))
+        self.tree.bind("<Button-5>", lambda e: self.scroll_rows(WHEEL_ROWS))
+        self.tree.bind("<Up>", lambda e: self.move_selection(-1))
+        self.tree.bind("<Down>", lambda e: self.move_selection(1))
+        self.tree.bind("<Prior>", lambda e: self.move_selection(-self._visible_rows()))
+        self.tree.bind("<Next>", lambda e: self.move_selection(self._visible_rows()))
+        self.tree.bind("<Home>", lambda e: self.move_selection(-len(self.view_indices)))
+        self.tree.bind("<End>", lambda e: self.move_selection(len(self.view_indices)))
+
+        # Панель редактирования
+        frame_edit = ttk.Frame(frame_center)
+        frame_center.add(frame_edit, weight=2)
+
+        ttk.Label(frame_edit, text="Текущий элемент:").pack(anchor="w")
+        self.label_current = ttk.Label(frame_edit, text="(не выбран)")
+        self.label_current.pack(anchor="w", pady=(0, 10))
+
+        self.label_type = ttk.Label(frame_edit, text="Тип: -")
+        self.label_type.pack(anchor="w", pady=(0, 10))
+
+        ttk.Label(frame_edit, text="Новое имя (только имя, без пути):").pack(anchor="w")
+        self.new_name_var = tk.StringVar()
+        self.entry_new_name = ttk.Entry(frame_edit, textvariable=self.new_name_var, width=40)
+        self.entry_new_name.pack(anchor="w", pady=(0, 10))
+
+        self.do_rename_var = tk.BooleanVar(value=True)
+        chk_rename = ttk.Checkbutton(frame_edit, text="Переименовывать этот элемент", variable=self.do_rename_var)
+        chk_rename.pack(anchor="w")
+
+        self.locked_var = tk.BooleanVar(value=False)
+        chk_locked = ttk.Checkbutton(
+            frame_edit,
+            text="Зафиксировать имя (не менять автоматически)",
+            variable=self.locked_var,
+            command=self.toggle_lock_for_selected
+        )
+        chk_locked.pack(anchor="w", pady=(5, 5))
+
+        ttk.Button(frame_edit, text="Сохранить изменения для элемента",
+                   command=self.apply_changes_to_selected).pack(anchor="w", pady=(10, 5))
+
+        ttk.Button(
+            frame_edit,
+            text="Авто-решение конфликтов (для незафиксированных)",
+            command=self.auto_resolve_conflicts
+        ).pack(anchor="w", pady=(5, 5))
+
+        frame_suffix = ttk.Frame(frame_edit)
+        frame_suffix.pack(anchor="w", pady=(0, 5))
+        ttk.Label(frame_suffix, text="Суффикс:").pack(side=tk.LEFT)
+        self.suffix_var = tk.StringVar(value=next(iter(SUFFIX_CHOICES)))
+        ttk.Combobox(
+            frame_suffix,
+            textvariable=self.suffix_var,
+            values=list(SUFFIX_CHOICES),
+            state="readonly",
+            width=10
+        ).pack(side=tk.LEFT, padx=(5, 0))
+
+        ttk.Button(
+            frame_edit,
+            text="Перечитать изменившиеся папки",
+            command=self.revalidate_disk
+        ).pack(anchor="w", pady=(5, 5))
+
+        ttk.Button(
+            frame_edit,
+            text="Групповая правка...",
+            command=self.open_bulk_panel
+        ).pack(anchor="w", pady=(10, 5))
+        self.label_selected = ttk.Label(frame_edit, text="Выделено: 0", foreground="gray")
+        self.label_selected.pack(anchor="w")
+
+        # Нижняя часть: переименование + лог
+        frame_bottom = ttk.Frame(self)
+        frame_bottom.pack(fill=tk.BOTH, expand=False, padx=10, pady=(0, 10))
+
+        frame_actions = ttk.Frame(frame_bottom)
+        frame_actions.pack(anchor="w", pady=(0, 5))
+        ttk.Button(frame_actions, text="Переименовать все отмеченные элементы",
+                   command=self.rename_items).pack(side=tk.LEFT)
+        ttk.Button(frame_actions, text="Продолжить по журналу...",
+                   command=self.resume_from_journal).pack(side=tk.LEFT, padx=(10, 0))
+        ttk.Button(frame_actions, text="Откатить по журналу...",
+                   command=self.undo_from_journal).pack(side=tk.LEFT, padx=(5, 0))
+        if perf.enabled():
+            ttk.Button(frame_actions, text="Производительность",
+                       command=self.open_perf_panel).pack(side=tk.LEFT, padx=(10, 0))
+
+        ttk.Label(frame_bottom, text="Лог:").pack(anchor="w")
+        self.text_log = tk.Text(frame_bottom, height=8, state="disabled")
+        self.text_log.pack(fill=tk.BOTH, expand=True)
+        self.log_sink = LogSink(self.text_log)
+
+    # ---------- ЛОГИКА ----------
+
+    def browse_directory(self):
+        dirname = filedialog.askdirectory()
+        if dirname:
+            self.directory.set(dirname)
+
+    def _scan_busy(self) -> bool:
+        """True (с сообщением пользователю), если идёт фоновое сканирование или переименование."""
+        if self.journal_job is not None:
+            messagebox.showinfo("Информация", "Дождитесь окончания переименования.")
+            return True
+        if self.scan_job is None:
+            return False
+        messagebox.showinfo("Информация", "Дождитесь окончания сканирования или отмените его.")
+        return True
+
+    def scan_directory(self):
+        if self._scan_busy():
+            return
+
+        root = self.directory.get().strip()
+        if not root:
+            messagebox.showwarning("Внимание", "Сначала укажите директорию.")
+            return
+        if not os.path.isdir(root):
+            messagebox.showerror("Ошибка", f"'{root}' не является директорией.")
+            return
+
+        self._start_job(core.ScanJob(root))
+
+    def rescan_directory(self):
+        """
+        Повторное сканирование с сохранением правок: папки с прежним mtime
+        не перечитываются. Без прежнего списка того же корня — обычное сканирование.
+        """
+        if self._scan_busy():
+            return
+
+        root = self.directory.get().strip()
+        if not self.items or root != self.conflicts.root:
+            self.scan_directory()
+            return
+        if not os.path.isdir(root):
+            messagebox.showerror("Ошибка", f"'{root}' не является директорией.")
+            return
+
+        self._start_job(core.RescanJob(root, self.items))
+
+    def _start_job(self, job):
+        """Сбрасывает таблицу и запускает фоновое наполнение (ScanJob/SessionLoadJob)."""
+        self._stop_watch()
+        self._watch_allowed = False
+        self.current_index = None
+        self.selected = set()
+        self.bulk_undo.clear()
+        self.sort_column = None
+        self.sort_reverse = False
+        self.filter_conflicts_only.set(False)
+        self.filter_by_dir.set(False)
+        self.filter_dir_recursive.set(False)
+        self.current_filter_dir = ""
+        self.label_current_dir_filter.config(text="Фильтр по поддиректории: (нет)")
+
+        # снимок папок, который собирает сканирование, сразу отдаём индексу конфликтов
+        self.items = core.ItemStore()
+        self.conflicts.rebuild(job.root, self.items, listing=job.listing)
+        self.sorter.reset(self.items)
+        self.dir_index.reset(self.items)
+        self.search_index.reset(self.items)
+        self._search_matches = None
+        self.refresh_tree(keep_position=False)
+
+        self.scan_job = job.start()
+        self._scan_started = self._scan_last_refresh = time.monotonic()
+        self.button_cancel_scan.config(state="normal")
+        self.label_progress.config(text=f"{self._job_title(job)}: 0")
+        self.after(SCAN_POLL_MS, self._poll_scan)
+
+    @staticmethod
+    def _job_title(job):
+        if isinstance(job, core.SessionLoadJob):
+            return "Загрузка сессии"
+        if isinstance(job, core.RescanJob):
+            return "Досканирование"
+        if isinstance(job, core.PlanLoadJob):
+            return "Импорт плана"
+        return "Сканирование"
+
+    def _poll_scan(self):
+        """Забирает найденные фоновым потоком элементы; таблица доступна уже во время сканирования."""
+        job = self.scan_job
+        if job is None:
+            return
+
+        new_items, finished = job.drain()
+        if new_items:
+            start = len(self.items)
+            self.items.extend(new_items)
+            self.conflicts.add_range(start, len(self.items))
+            self.sorter.add_range(start, len(self.items))
+            self.dir_index.add_range(start, len(self.items))
+            self.search_index.add_range(start, len(self.items))
+            self._search_matches = None
+        self.label_progress.config(
+            text=f"{self._job_title(job)}: {job.items_found} (папок: {job.dirs_found})")
+
+        if finished:
+            self._finish_scan()
+            return
+
+        now = time.monotonic()
+        if new_items and now - self._scan_last_refresh >= SCAN_REFRESH_INTERVAL:
+            self._scan_last_refresh = now
+            self.refresh_tree(keep_position=True)
+
+        self.after(SCAN_POLL_MS, self._poll_scan)
+
+    def _finish_scan(self):
+        job = self.scan_job
+        self.scan_job = None
+        # полное время с точки зрения пользователя: обход + наполнение таблицы
+        if perf.enabled():
+            perf.record("gui.scan_job", time.monotonic() - self._scan_started)
+        self.button_cancel_scan.config(state="disabled")
+        if isinstance(job, core.RescanJob) and (job.error is not None or job.cancelled):
+            # недосканированный список неполон — возвращаем прежний вместе с правками
+            self.items = job.old_items
+            self._compute_conflicts()
+            self.sorter.reset(self.items)
+            self.dir_index.reset(self.items)
+            self.search_index.reset(self.items)
+            self._search_matches = None
+        self.label_progress.config(text=f"Элементов: {len(self.items)}")
+
+        self.refresh_tree(keep_position=True)
+        if job.error is None and not job.cancelled:
+            # mtime папок — для следующего «Досканировать изменения»
+            self.items.dir_mtimes = job.dir_mtimes
+            self._watch_allowed = not isinstance(job, core.PlanLoadJob)
+            if self.watch_enabled.get():
+                self._start_watch()
+
+        if isinstance(job, core.SessionLoadJob):
+            if job.error is not None:
+                self.log(f"Ошибка загрузки сессии: {job.error}. Загружено элементов: {len(self.items)}")
+                messagebox.showerror("Ошибка", f"Не удалось загрузить сессию: {job.error}")
+            elif job.cancelled:
+                self.log(f"Загрузка сессии отменена. Загружено элементов: {len(self.items)}")
+            else:
+                self.log(f"Сессия загружена из {job.path}. Элементов: {len(self.items)}")
+        elif isinstance(job, core.PlanLoadJob):
+            if job.error is not None:
+                self.log(f"Ошибка импорта плана: {job.error}. Загружено элементов: {len(self.items)}")
+                messagebox.showerror("Ошибка", f"Не удалось импортировать план: {job.error}")
+            elif job.cancelled:
+                self.log(f"Импорт плана отменён. Загружено элементов: {len(self.items)}")
+            else:
+                self.log(f"План импортирован из {job.path}. Элементов: {len(self.items)}, "
+                         f"конфликтов: {len(self.conflict_indices)}")
+        elif isinstance(job, core.RescanJob):
+            if job.error is not None or job.cancelled:
+                reason = f"ошибка: {job.error}" if job.error is not None else "отменено"
+                self.log(f"Досканирование прервано ({reason}); восстановлен прежний список.")
+                return
+            st = job.stats
+            self.log(
+                f"Досканирование завершено. Элементов: {len(self.items)}; "
+                f"папок проверено: {st['dirs']}, перечитано: {st['changed_dirs']}; "
+                f"добавлено: {st['added']}, удалено: {st['removed']}"
+            )
+        elif job.error is not None:
+            self.log(f"Ошибка сканирования: {job.error}. Найдено элементов: {len(self.items)}")
+        elif job.cancelled:
+            self.log(f"Сканирование отменено. Найдено элементов: {len(self.items)}")
+        else:
+            self.log(f"Сканирование завершено. Найдено элементов: {len(self.items)}")
+
+    def cancel_scan(self):
+        if self.scan_job is not None:
+            self.scan_job.cancel()
+
+    def on_filter_change(self):
+        if self.filter_by_dir.get() and not self.current_filter_dir:
+            if self.current_index is not None and 0 <= self.current_index < len(self.items):
+                self.current_filter_dir = self.items[self.current_index]["rel_dir"]
+        self._update_dir_filter_label()
+        self.refresh_tree(keep_position=True)
+
+    def _schedule_search(self):
+        # пересчёт — после паузы в наборе, а не на каждое нажатие
+        if self._search_after_id is not None:
+            self.after_cancel(self._search_after_id)
+        self._search_after_id = self.after(SEARCH_DELAY_MS, self.on_search_change)
+
+    def on_search_change(self):
+        self._search_after_id = None
+        self._search_matches = None
+        self.refresh_tree(keep_position=False)
+
+    def _search_subset(self):
+        """Найденные индексы (set) или None, если строка поиска пуста."""
+        query = self.search_text.get()
+        if not query:
+            self.label_search.config(text="")
+            return None
+        if self._search_matches is None:
+            try:
+                self._search_matches = self.search_index.search(
+                    query, SEARCH_FIELD_CHOICES[self.search_field.get()],
+                    SEARCH_MODE_CHOICES[self.search_mode.get()])
+            except re.error as e:
+                self.label_search.config(text=f"Ошибка в выражении: {e}")
+                return set()
+            self.label_search.config(text=f"Найдено: {len(self._search_matches)}")
+        return self._search_matches
+
+    def _update_dir_filter_label(self):
+        if self.filter_by_dir.get():
+            text = self.current_filter_dir if self.current_filter_dir else "(корень)"
+            if self.filter_dir_recursive.get():
+                text += " и вложенные"
+        else:
+            text = "(нет)"
+        self.label_current_dir_filter.config(text=f"Фильтр по поддиректории: {text}")
+
+    def on_column_click(self, col):
+        if self.sort_column == col:
+            self.sort_reverse = not self.sort_reverse
+        else:
+            self.sort_column = col
+            self.sort_reverse = False
+        self.refresh_tree(keep_position=True)
+
+    def _compute_conflicts(self):
+        """Полностью пересобирает индекс конфликтов по self.items."""
+        self.conflicts.rebuild(self.directory.get().strip(), self.items)
+
+    def _on_items_changed(self, indices):
+        """Обновление индексов после групповой правки — один проход в конце."""
+        if len(indices) * 4 > len(self.items):
+            # правка большей части списка: пересобрать дешевле, чем обновлять по одному
+            self._compute_conflicts()
+            self.sorter.reset(self.items)
+            self.search_index.reset(self.items)
+            self._search_matches = None
+        else:
+            for idx in indices:
+                self._on_item_changed(idx)
+
+    def _on_item_changed(self, idx):
+        """Точечное обновление индексов после правки элемента idx."""
+        self.conflicts.update(idx)
+        self.sorter.update(idx)
+        self.search_index.update(idx)
+        self._search_matches = None
+
+    @perf.timed("gui.refresh_tree")
+    def refresh_tree(self, keep_position=True):
+        """Пересчитывает список строк с учётом фильтров, конфликтов и сортировки."""
+        # фильтр по папке берёт её элементы из индекса и сортирует только их;
+        # иначе порядок берётся из кэша целиком
+        subset = None
+        if self.filter_by_dir.get():
+            if not self.filter_dir_recursive.get():
+                subset = self.dir_index.indices(self.current_filter_dir)
+            elif self.current_filter_dir:
+                subset = self.dir_index.subtree(self.current_filter_dir)
+        matches = self._search_subset()
+        if matches is not None:
+            subset = matches if subset is None else [idx for idx in subset if idx in matches]
+
+        # большую часть списка дешевле отфильтровать из готового порядка, чем сортировать
+        if subset is None or (subset is matches and len(matches) * 8 > len(self.items)):
+            order = self.sorter.order(self.sort_column, self.conflict_indices)
+            if subset is not None:
+                order = [idx for idx in order if idx in matches]
+        else:
+            order = self.sorter.sort_subset(subset, self.sort_column, self.conflict_indices)
+        if self.sort_reverse:
+            order = reversed(order)
+
+        if self.filter_conflicts_only.get():
+            filtered = [idx for idx in order if idx in self.conflict_indices]
+        else:
+            filtered = list(order)
+        if self.items.removed:
+            # исчезнувшие с диска (слежение) в индексах остаются, но не показываются
+            flags = self.items.flags
+            filtered = [idx for idx in filtered if not flags[idx] & core.FLAG_REMOVED]
+
+        self.view_indices = filtered
+        self.view_pos = {idx: pos for pos, idx in enumerate(filtered)}
+        if not keep_position:
+            self.view_top = 0
+        self._render_window()
+
+    def refresh_item(self, idx):
+        """
+        Обновление после правки одного элемента. Индекс конфликтов
+        обновляется только для idx; если набор и порядок строк от правки
+        не зависят, перерисовываются только видимые строки (у соседей мог
+        измениться признак конфликта), без перестройки списка.
+        """
+        self._on_item_changed(idx)
+        if (self.filter_conflicts_only.get() or self.sort_column in _EDIT_SENSITIVE_SORT
+                or self.search_text.get()):
+            self.refresh_tree(keep_position=True)
+            return
+        for iid in self.tree.get_children():
+            self._update_row(int(iid))
+
+    def _row(self, idx):
+        """Значения и теги строки Treeview для элемента idx."""
+        info = self.items[idx]
+        is_conf = idx in self.conflict_indices and info["do_rename"]
+
+        type_str = "DIR" if info["is_dir"] else "FILE"
+        exc_str = "X" if not info["do_rename"] else ""
+        lock_str = "L" if info["locked"] else ""
+        conf_str = "!" if is_conf else ""
+        mod_str = "M" if info.get("modified", False) else ""
+
+        rel_path = rel_path_of(info)
+
+        values = (type_str, exc_str, lock_str, conf_str, mod_str, rel_path, info["new_name"])
+        tags = ("conflict",) if is_conf else ()
+        return values, tags
+
+    def _update_row(self, idx):
+        iid = str(idx)
+        if self.tree.exists(iid):
+            values, tags = self._row(idx)
+            self.tree.item(iid, values=values, tags=tags)
+
+    def _visible_rows(self) -> int:
+        height = self.tree.winfo_height()
+        return max(1, (height - self._tree_header_height) // self._row_height)
+
+    def _render_window(self):
+        """Вставляет в Treeview только видимое окно self.view_indices (плюс запас)."""
+        total = len(self.view_indices)
+        visible = self._visible_rows()
+        self.view_top = max(0, min(self.view_top, total - visible))
+
+        children = self.tree.get_children()
+        if children:
+            self.tree.delete(*children)
+
+        window = self.view_indices[self.view_top:self.view_top + visible + VIEW_MARGIN]
+        with perf.timer("gui.tree_insert"):
+            for idx in window:
+                values, tags = self._row(idx)
+                self.tree.insert("", "end", iid=str(idx), values=values, tags=tags)
+        perf.count("gui.rows_inserted", len(window))
+
+        if window:
+            bbox = self.tree.bbox(str(window[0]))
+            if bbox:
+                self._tree_header_height = bbox[1]
+
+        # выделение восстанавливаем для строк, попавших в окно
+        shown = [str(idx) for idx in window if idx in self.selected]
+        if shown:
+            self.tree.selection_set(shown)
+        if self.current_index is not None and self.tree.exists(str(self.current_index)):
+            self.tree.focus(str(self.current_index))
+        self.tree.yview_moveto(0)
+
+        if total:
+            self.vsb.set(self.view_top / total, min(1.0, (self.view_top + visible) / total))
+        else:
+            self.vsb.set(0.0, 1.0)
+
+    def scroll_rows(self, delta):
+        self.view_top += delta
+        self._render_window()
+        return "break"
+
+    def on_vscroll(self, *args):
+        total = len(self.view_indices)
+        if args[0] == "moveto":
+            self.view_top = int(float(args[1]) * total)
+        elif args[0] == "scroll":
+            step = int(args[1])
+            if args[2] == "pages":
+                step *= self._visible_rows()
+            self.view_top += step
+        self._render_window()
+
+    def on_mousewheel(self, event):
+        # Windows: кратно 120 на щелчок, macOS: маленькие значения
+        if abs(event.delta) >= 120:
+            steps = -event.delta // 120
+        else:
+            steps = -event.delta
+        return self.scroll_rows(steps * WHEEL_ROWS)
+
+    def move_selection(self, step):
+        """Перемещение выбора с клавиатуры с прокруткой окна за его границы."""
+        if not self.view_indices:
+            return "break"
+        pos = self.view_pos.get(self.current_index)
+        if pos is None:
+            pos = self.view_top if step > 0 else self.view_top + self._visible_rows() - 1
+            step = 0
+        pos = max(0, min(len(self.view_indices) - 1, pos + step))
+
+        visible = self._visible_rows()
+        if pos < self.view_top:
+            self.view_top = pos
+        elif pos >= self.view_top + visible:
+            self.view_top = pos - visible + 1
+        self._render_window()
+
+        iid = str(self.view_indices[pos])
+        if self.tree.exists(iid):
+            self._select_extend = False
+            self.tree.selection_set(iid)
+            self.tree.focus(iid)
+        return "break"
+
+    def _on_tree_press(self, event):
+        # state: 0x1 — Shift, 0x4 — Control
+        self._select_extend = bool(event.state & 0x5)
+
+    def select_all_in_view(self, event=None):
+        """Ctrl+A: выделить все строки текущего фильтра, включая невидимые."""
+        self.selected = set(self.view_indices)
+        self._render_window()
+        self._update_selection_label()
+        return "break"
+
+    def _update_selection_label(self):
+        self.label_selected.config(text=f"Выделено: {len(self.selected)}")
+        if self.bulk_panel is not None and self.bulk_panel.winfo_exists():
+            self.bulk_panel.update_counts()
+
+    def bulk_targets(self, target: str) -> list:
+        """Индексы для групповой правки: выделенные ("selection") или все строки фильтра ("view")."""
+        if target == "view":
+            return list(self.view_indices)
+        flags = self.items.flags
+        return sorted(idx for idx in self.selected if not flags[idx] & core.FLAG_REMOVED)
+
+    def on_tree_select(self, event):
+        sel = self.tree.selection()
+        window = {int(iid) for iid in self.tree.get_children()}
+        picked = {int(iid) for iid in sel}
+        # восстановление выделения после перерисовки окна — не выбор пользователя
+        if picked != window & self.selected:
+            if self._select_extend:
+                self.selected = (self.selected - window) | picked
+            else:
+                self.selected = picked
+            self._select_extend = False
+            self._update_selection_label()
+        if not sel:
+            return
+        focus = self.tree.focus()
+        iid = focus if focus in sel else sel[0]
+        try:
+            idx = int(iid)
+        except ValueError:
+            return
+
+        if not (0 <= idx < len(self.items)):
+            return
+        # повторный выбор того же элемента (например, при перерисовке окна)
+        # не должен затирать несохранённые правки в полях редактирования
+        if idx == self.current_index:
+            return
+
+        self.current_index = idx
+        info = self.items[idx]
+
+        rel_path = rel_path_of(info)
+        self.label_current.config(text=rel_path)
+        self.new_name_var.set(info["new_name"])
+        self.do_rename_var.set(info["do_rename"])
+        self.locked_var.set(info["locked"])
+        self.label_type.config(text=f"Тип: {'папка' if info['is_dir'] else 'файл'}")
+
+        if self.filter_by_dir.get():
+            # в режиме «с вложенными» выбор внутри поддерева фильтр не сужает
+            if self.filter_dir_recursive.get():
+                changed = not core.dir_in_subtree(info["rel_dir"], self.current_filter_dir)
+            else:
+                changed = info["rel_dir"] != self.current_filter_dir
+            if changed:
+                self.current_filter_dir = info["rel_dir"]
+                self._update_dir_filter_label()
+                self.refresh_tree(keep_position=True)
+
+    def apply_changes_to_selected(self):
+        idx = self.current_index
+        if idx is None or not (0 <= idx < len(self.items)):
+            messagebox.showinfo("Информация", "Сначала выберите элемент в списке.")
+            return
+
+        info = self.items[idx]
+        new_name = self.new_name_var.get().strip()
+        if not new_name:
+            messagebox.showwarning("Внимание", "Новое имя не может быть пустым.")
+            return
+
+        info["new_name"] = new_name
+        info["do_rename"] = self.do_rename_var.get()
+        info["locked"] = self.locked_var.get()
+
+        # пометка [M]: кириллическое исходное имя и новое имя отличное от старого
+        core.update_modified_flag(info)
+
+        self.refresh_item(idx)
+
+        rel_path = rel_path_of(info)
+        self.log(
+            f"Обновлено: {rel_path} → {info['new_name']} "
+            f"(переименовывать: {info['do_rename']}, зафиксировано: {info['locked']}, изменён: {info['modified']})"
+        )
+
+    def toggle_lock_for_selected(self):
+        idx = self.current_index
+        if idx is None or not (0 <= idx < len(self.items)):
+            return
+        info = self.items[idx]
+        info["locked"] = self.locked_var.get()
+        self.refresh_item(idx)
+
+    def auto_resolve_conflicts(self):
+        if self._scan_busy():
+            return
+
+        if not self.conflict_indices:
+            messagebox.showinfo("Информация", "Конфликтов не обнаружено.")
+            return
+
+        root = self.directory.get().strip()
+        if not root or not os.path.isdir(root):
+            messagebox.showwarning("Внимание", "Нет корректной корневой директории.")
+            return
+
+        suffix = core.SUFFIX_POLICIES[SUFFIX_CHOICES[self.suffix_var.get()]]
+        changed = core.auto_resolve_conflicts(root, self.items, self.conflict_indices, log=self.log,
+                                              on_change=self._on_item_changed,
+                                              listing=self.conflicts.listing, suffix=suffix)
+
+        self.refresh_tree(keep_position=True)
+        messagebox.showinfo("Готово", f"Автоматически скорректировано имён: {changed}")
+
+    def rename_items(self):
+        if self._scan_busy():
+            return
+
+        root = self.directory.get().strip()
+        if not root:
+            messagebox.showwarning("Внимание", "Сначала укажите директорию и выполните сканирование.")
+            return
+
+        if not self.items:
+            messagebox.showinfo("Информация", "Список пуст. Сначала выполните сканирование.")
+            return
+
+        if self.conflict_indices:
+            if not messagebox.askyesno(
+                "Предупреждение",
+                "Некоторые элементы всё ещё в конфликте ([!]). Продолжить переименование?\n"
+                "Конфликтующие элементы будут пропущены."
+            ):
+                return
+
+        if not messagebox.askyesno("Подтверждение", "Переименовать все отмеченные элементы?"):
+            return
+
+        job = renamer_journal.JournalJob(renamer_journal.rename_with_journal,
+                                         root, self.items, self.conflict_indices)
+        self._start_journal_job(job, "Переименование", self._finish_rename)
+
+    def _finish_rename(self, job):
+        if job.error is not None:
+            messagebox.showerror("Ошибка", f"Не удалось вести журнал переименования: {job.error}")
+            return
+        executor, journal_path = job.result
+        self.log(f"Переименование: {executor.elapsed:.1f} с, {executor.throughput:.0f} элементов/с")
+        self.log(f"Журнал: {journal_path}")
+
+        # диск изменился — снимок папок устарел, внешние конфликты проверяем заново
+        self.conflicts.listing.invalidate()
+        self._compute_conflicts()
+        self.refresh_tree(keep_position=True)
+        messagebox.showinfo("Готово", f"Переименовано: {executor.renamed}\nОшибок/пропусков: {executor.errors}")
+
+    def _start_journal_job(self, job, title, on_finish):
+        """
+        Запускает JournalJob; лог забирается из его очереди в _poll_journal_job,
+        по завершении вызывается on_finish(job). События наблюдателя тем
+        временем не применяются — список не меняется под исполнителем.
+        """
+        self.journal_job = job.start()
+        self._journal_finish = on_finish
+        self.label_progress.config(text=f"{title}...")
+        self.after(SCAN_POLL_MS, self._poll_journal_job)
+
+    def _poll_journal_job(self):
+        job = self.journal_job
+        if job is None:
+            return
+        messages, finished = job.drain()
+        for msg in messages:
+            self.log(msg)
+        if not finished:
+            self.after(SCAN_POLL_MS, self._poll_journal_job)
+            return
+
+        self.journal_job = None
+        on_finish, self._journal_finish = self._journal_finish, None
+        self.label_progress.config(text=f"Элементов: {len(self.items) - self.items.removed}")
+        on_finish(job)
+
+    def _run_journal(self, func, title, verb):
+        """Общая часть resume/undo: выбор журнала, выполнение, пересчёт конфликтов."""
+        if self._scan_busy():
+            return
+
+        path = filedialog.askopenfilename(
+            title=title,
+            initialdir=renamer_journal.JOURNAL_DIR if os.path.isdir(renamer_journal.JOURNAL_DIR) else None,
+            filetypes=[("Журналы", "*.ndjson"), ("Все файлы", "*.*")]
+        )
+        if not path:
+            return
+
+        self._start_journal_job(renamer_journal.JournalJob(func, path), title,
+                                lambda job: self._finish_journal(job, title, verb))
+
+    def _finish_journal(self, job, title, verb):
+        if isinstance(job.error, (OSError, renamer_journal.JournalError)):
+            messagebox.showerror("Ошибка", f"Не удалось прочитать журнал: {job.error}")
+            return
+        if job.error is not None:
+            messagebox.showerror("Ошибка", f"{title}: {job.error}")
+            return
+        done, errors = job.result
+
+        self.conflicts.listing.invalidate()
+        self._compute_conflicts()
+        self.refresh_tree(keep_position=True)
+        messagebox.showinfo(
+            "Готово",
+            f"{verb}: {done}\nОшибок/пропусков: {errors}\n"
+            "Список элементов мог устареть — при необходимости пересканируйте директорию."
+        )
+
+    def resume_from_journal(self):
+        self._run_journal(renamer_journal.resume, "Продолжить по журналу", "Переименовано")
+
+    def undo_from_journal(self):
+        self._run_journal(renamer_journal.undo, "Откатить по журналу", "Откачено")
+
+    def revalidate_disk(self):
+        """Перечитывает папки с изменившимся mtime и перепроверяет их элементы."""
+        if self._scan_busy():
+            return
+
+        changed = self.conflicts.listing.revalidate()
+        self.conflicts.recheck_dirs(changed)
+        self.refresh_tree(keep_position=True)
+        self.log(f"Проверка диска: изменившихся папок: {len(changed)}")
+
+    def save_session(self):
+        if self._scan_busy():
+            return
+
+        if not self.items:
+            messagebox.showinfo("Информация", "Нечего сохранять — список элементов пуст.")
+            return
+
+        path = filedialog.asksaveasfilename(
+            title="Сохранить сессию",
+            defaultextension=core.SESSION_EXT,
+            filetypes=SESSION_FILETYPES
+        )
+        if not path:
+            return
+
+        try:
+            core.save_session(path, self.directory.get(), self.items)
+            self.log(f"Сессия сохранена в {path}")
+        except Exception as e:
+            messagebox.showerror("Ошибка", f"Не удалось сохранить сессию: {e}")
+
+    def load_session(self):
+        if self._scan_busy():
+            return
+
+        path = filedialog.askopenfilename(
+            title="Загрузить сессию",
+            filetypes=SESSION_FILETYPES
+        )
+        if not path:
+            return
+
+        # потоковая сессия наполняет таблицу по мере чтения, как сканирование
+        try:
+            job = core.SessionLoadJob(path)
+        except core.SessionFormatError as e:
+            messagebox.showerror("Ошибка", str(e))
+            return
+        except Exception as e:
+            messagebox.showerror("Ошибка", f"Не удалось загрузить сессию: {e}")
+            return
+
+        self.directory.set(job.root)
+        self._start_job(job)
+
+    def export_plan(self):
+        if self._scan_busy():
+            return
+
+        if not self.items:
+            messagebox.showinfo("Информация", "Нечего экспортировать — список элементов пуст.")
+            return
+
+        path = filedialog.asksaveasfilename(
+            title="Экспорт плана",
+            defaultextension=".csv",
+            filetypes=PLAN_FILETYPES
+        )
+        if not path:
+            return
+
+        try:
+            with open(path, "w", encoding="utf-8", newline="") as f:
+                core.write_plan(f, self.items, self.conflict_indices, core.plan_format_of(path, "csv"))
+            self.log(f"План ({len(self.items)} элементов) сохранён в {path}")
+        except Exception as e:
+            messagebox.showerror("Ошибка", f"Не удалось сохранить план: {e}")
+
+    def import_plan(self):
+        """План с относительными путями загружается для текущей корневой папки."""
+        if self._scan_busy():
+            return
+
+        root = self.directory.get().strip()
+        if not root or not os.path.isdir(root):
+            messagebox.showerror("Ошибка", "Сначала выберите корневую папку, к которой относится план.")
+            return
+
+        path = filedialog.askopenfilename(
+            title="Импорт плана",
+            filetypes=PLAN_FILETYPES
+        )
+        if not path:
+            return
+
+        try:
+            job = core.PlanLoadJob(root, path)
+        except (OSError, ValueError) as e:
+            messagebox.showerror("Ошибка", f"Не удалось импортировать план: {e}")
+            return
+        self._start_job(job)
+
+    def open_bulk_panel(self):
+        if self.bulk_panel is not None and self.bulk_panel.winfo_exists():
+            self.bulk_panel.update_counts()
+            self.bulk_panel.lift()
+            return
+        self.bulk_panel = BulkEditPanel(self)
+
+    def apply_bulk_edit(self, edit):
+        """Учитывает готовую групповую правку: индексы, таблица, стек отмены."""
+        if not len(edit):
+            msg = "Групповая правка: изменений нет"
+            if edit.skipped:
+                msg += f" (пропущено недопустимых имён: {edit.skipped})"
+            self.log(msg)
+            return
+        self.bulk_undo.append(edit)
+        del self.bulk_undo[:-BULK_UNDO_DEPTH]
+        self._on_items_changed(edit.indices)
+        self._refresh_current_fields()
+        self.refresh_tree(keep_position=True)
+        msg = f"Групповая правка «{edit.title}»: изменено {len(edit)}"
+        if edit.skipped:
+            msg += f", пропущено недопустимых имён: {edit.skipped}"
+        self.log(msg)
+
+    def undo_bulk_edit(self):
+        if self._scan_busy():
+            return
+        if not self.bulk_undo:
+            messagebox.showinfo("Информация", "Нет групповых правок для отмены.")
+            return
+        edit = self.bulk_undo.pop()
+        core.undo_bulk_edit(self.items, edit)
+        self._on_items_changed(edit.indices)
+        self._refresh_current_fields()
+        self.refresh_tree(keep_position=True)
+        self.log(f"Отменена групповая правка «{edit.title}»: элементов {len(edit)}")
+
+    def _refresh_current_fields(self):
+        """Поля редактирования — по текущему элементу (после групповой правки)."""
+        idx = self.current_index
+        if idx is None or not (0 <= idx < len(self.items)):
+            return
+        info = self.items[idx]
+        self.new_name_var.set(info["new_name"])
+        self.do_rename_var.set(info["do_rename"])
+        self.locked_var.set(info["locked"])
+
+    def on_watch_toggle(self):
+        if not self.watch_enabled.get():
+            if self.watcher is not None:
+                self._stop_watch()
+                self.log("Слежение за диском выключено")
+            return
+        if self.scan_job is None and not self._watch_allowed:
+            self.log("Слежение за диском включится после сканирования")
+        self._start_watch()
+
+    def _start_watch(self):
+        """Запускает наблюдатель за корнем текущего списка (только снимок дерева, не план)."""
+        if self.watcher is not None or self.scan_job is not None or not self._watch_allowed:
+            return
+        root = self.conflicts.root
+        try:
+            self.watcher = renamer_watch.start_watcher(root, self.items, log=self.log)
+        except OSError as e:
+            self.watch_enabled.set(False)
+            self.log(f"Не удалось включить слежение за диском: {e}")
+            return
+        self.watch_sync = renamer_watch.WatchSync(root, self.items, self.dir_index)
+        kind = "inotify" if self.watcher.kind == "inotify" else "опрос папок"
+        self.log(f"Слежение за диском ({kind}): {root}")
+        self.after(WATCH_APPLY_MS, self._poll_watch)
+
+    def _stop_watch(self):
+        if self.watcher is not None:
+            self.watcher.stop()
+        self.watcher = None
+        self.watch_sync = None
+
+    def _poll_watch(self):
+        """Забирает накопившиеся события наблюдателя и применяет их одной пачкой."""
+        watcher = self.watcher
+        if watcher is None:
+            return
+        if self.journal_job is not None:
+            # события копятся в наблюдателе до конца переименования
+            self.after(WATCH_APPLY_MS, self._poll_watch)
+            return
+        events = watcher.drain()
+        if events:
+            self._apply_watch_events(events)
+        if watcher.error is not None or not watcher.running:
+            self._stop_watch()
+            self.watch_enabled.set(False)
+            reason = f"ошибка: {watcher.error}" if watcher.error is not None else "корень недоступен"
+            self.log(f"Слежение за диском остановлено ({reason})")
+            return
+        self.after(WATCH_APPLY_MS, self._poll_watch)
+
+    def _apply_watch_events(self, events):
+        """
+        События наблюдателя -> self.items и индексы. Конфликты, сортировка и
+        поиск обновляются один раз на пачку, таблица перерисовывается один раз.
+        """
+        changes = self.watch_sync.apply(events)
+        if changes.overflow:
+            self.log("Слежение: часть событий потеряна — список мог устареть, "
+                     "выполните «Досканировать изменения»")
+        start, stop = changes.start, len(self.items)
+        if not changes.removed and stop == start:
+            return
+
+        # содержимое этих папок на диске изменилось — снимок для внешних конфликтов устарел
+        listing = self.conflicts.listing
+        for rel_dir in changes.dirs:
+            listing.invalidate(rel_dir)
+        if stop > start:
+            self.conflicts.add_range(start, stop)
+            self.sorter.add_range(start, stop)
+            self.search_index.add_range(start, stop)
+        self._on_items_changed(changes.removed)
+        self.conflicts.recheck_dirs(changes.dirs)
+        self._search_matches = None
+
+        removed = set(changes.removed)
+        if self.current_index in removed:
+            self.current_index = None
+            self.label_current.config(text="(не выбран)")
+        if self.selected & removed:
+            self.selected -= removed
+            self._update_selection_label()
+
+        self.label_progress.config(text=f"Элементов: {len(self.items) - self.items.removed}")
+        self.refresh_tree(keep_position=True)
+        self.log(f"Слежение: появилось {changes.created}, исчезло {changes.deleted}, "
+                 f"перемещено {changes.moved}")
+
+    def open_perf_panel(self):
+        if self.perf_panel is not None and self.perf_panel.winfo_exists():
+            self.perf_panel.lift()
+            return
+        self.perf_panel = PerfPanel(self)
+
+    def log(self, msg: str):
+        self.log_sink.write(msg)
+
+    def destroy(self):
+        self._stop_watch()
+        self.log_sink.close()
+        super().destroy()
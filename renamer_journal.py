@@ -0,0 +1,626 @@
+"""
+Журнал переименований: дозапись, возобновление прерванного запуска и откат.
+
+Формат — NDJSON, одна запись на строку:
+
+    {"op": "begin", "mode": "rename" | "resume" | "undo", "root": ..., "time": ...}
+    {"op": "plan", "id": N, "src": "a/b", "dst": "a/в", "is_dir": false}
+    {"op": "plan", "id": T, "tmp": N, "name": "b.renamer-tmp1"}   # шаг цикла на временное имя
+    {"op": "done", "id": N}            # переименование выполнено
+    {"op": "undone", "id": N}          # переименование откачено
+    {"op": "error", "id": N, "msg": ...}
+    {"op": "located"}                  # положение всех записей выше закреплено отметками
+    {"op": "end", "mode": ..., "renamed": K, "errors": E}
+
+Пути src/dst — относительно root и такие, какими они были в момент
+переименования: папки идут после своего содержимого, поэтому предки
+элемента в этот момент ещё со старыми именами.
+
+Записи буферизуются и сбрасываются на диск (flush + fsync) пачками и
+после каждого этапа RenameExecutor. Если процесс оборвался, хвост
+последнего этапа мог не попасть в журнал — resume() и undo() для таких
+элементов смотрят на диск (_locate). Записи без отметки, делящие имена
+(цепочки, циклы, обмены), разбираются группой: шаги группы выполняются
+строго по порядку, и по диску видно, сколько их успело пройти. Цикл этого
+не позволяет — после полного круга имена те же, что до начала, — поэтому
+шаг на временное имя отмечается done сразу со сбросом на диск, а перед
+его откатом так же пишется undone. Если состояние диска не сходится ни с
+одним шагом, записи не выполняются, а пропускаются с ошибкой.
+
+Откат перемещает элементы в обратную сторону, и после него шаги прямого
+запуска по диску уже не восстановить. Поэтому undo() до первого rename
+отмечает всё, что вывел по диску, и пишет located; дальше прямые шаги
+берутся только из отметок, а по диску разбираются лишь шаги отката.
+"""
+
+import json
+import os
+import queue
+import threading
+import time
+
+from renamer_core import (
+    DEFAULT_RENAME_WORKERS,
+    RenameExecutor,
+    rel_path_of,
+)
+
+
+# куда складываются журналы, если путь не указан явно
+JOURNAL_DIR = os.path.join(os.path.expanduser("~"), ".renamer", "journals")
+
+# fsync не реже, чем раз в столько записей / секунд
+JOURNAL_SYNC_RECORDS = 1000
+JOURNAL_SYNC_INTERVAL = 1.0
+
+
+class JournalError(Exception):
+    """Журнал не найден, пуст или не содержит корня."""
+
+
+def default_journal_path() -> str:
+    """Новый путь журнала в JOURNAL_DIR (каталог создаётся при необходимости)."""
+    os.makedirs(JOURNAL_DIR, exist_ok=True)
+    stamp = time.strftime("%Y%m%d-%H%M%S")
+    return os.path.join(JOURNAL_DIR, f"rename-{stamp}-{os.getpid()}.ndjson")
+
+
+class JournalState:
+    """Содержимое журнала, прочитанное read_journal()."""
+
+    def __init__(self):
+        self.root = ""
+        self.plans = []       # записи plan в порядке выполнения
+        self.done = set()
+        self.undone = set()
+        self.failed = {}      # id -> сообщение
+        self.tmps = {}        # id -> запись шага на временное имя (+ "mode" запуска)
+        self.tmp_marks = {}   # id шага на временное имя -> последняя отметка done/undone
+        self.located = False  # был откат, закрепивший положение записей
+        self.max_id = -1
+
+
+def read_journal(path: str) -> JournalState:
+    state = JournalState()
+    mode = "rename"
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                rec = json.loads(line)
+            except ValueError:
+                # оборванная последняя строка после сбоя
+                continue
+            op = rec.get("op")
+            if op == "begin":
+                if not state.root:
+                    state.root = rec.get("root", "")
+                mode = rec.get("mode", "rename")
+            elif op == "plan":
+                if "tmp" in rec:
+                    rec["mode"] = mode
+                    state.tmps[rec["id"]] = rec
+                else:
+                    state.plans.append(rec)
+                state.max_id = max(state.max_id, rec["id"])
+            elif op in ("done", "undone") and rec["id"] in state.tmps:
+                state.tmp_marks[rec["id"]] = op
+            elif op == "done":
+                state.done.add(rec["id"])
+                state.failed.pop(rec["id"], None)
+            elif op == "undone":
+                state.undone.add(rec["id"])
+            elif op == "located":
+                state.located = True
+            elif op == "error":
+                state.failed[rec["id"]] = rec.get("msg", "")
+
+    if not state.root:
+        raise JournalError(f"В журнале {path} нет записи о корневой директории.")
+    return state
+
+
+class RenameJournal:
+    """
+    Запись журнала для RenameExecutor.
+
+    Исполнитель обращается к записям по индексу элемента: plan(idx, info)
+    выдаёт элементу новый id, adopt(idx, id) привязывает его к уже
+    существующей записи плана (resume/undo). В режиме "undo" успешное
+    выполнение пишется как "undone".
+
+    Шаги циклов на временное имя (plan_tmp, tmp_done, tmp_rollback) пишутся
+    из потоков исполнителя, поэтому запись идёт под блокировкой.
+    """
+
+    def __init__(self, path: str, root: str, mode: str = "rename", next_id: int = 0):
+        self.path = path
+        self.root = root
+        self.mode = mode
+        self._ids = {}
+        self._tmp_ids = {}
+        self._next_id = next_id
+        self._lock = threading.RLock()
+        self._unsynced = 0
+        self._last_sync = time.monotonic()
+        self._f = open(path, "a", encoding="utf-8")
+        self._write({"op": "begin", "mode": mode, "root": root, "time": time.time()})
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def is_planned(self, idx: int) -> bool:
+        return idx in self._ids
+
+    def adopt(self, idx: int, record_id: int):
+        self._ids[idx] = record_id
+
+    def _new_id(self) -> int:
+        record_id = self._next_id
+        self._next_id += 1
+        return record_id
+
+    def plan(self, idx: int, info):
+        record_id = self._ids[idx] = self._new_id()
+        dst = os.path.join(info["rel_dir"], info["new_name"]) if info["rel_dir"] else info["new_name"]
+        self._write({
+            "op": "plan",
+            "id": record_id,
+            "src": rel_path_of(info),
+            "dst": dst,
+            "is_dir": bool(info["is_dir"]),
+        })
+
+    def plan_tmp(self, idx: int, tmp_name: str):
+        """Шаг цикла: элемент idx уходит на временное имя tmp_name в своей папке."""
+        record_id = self._tmp_ids[idx] = self._new_id()
+        self._write({"op": "plan", "id": record_id, "tmp": self._ids[idx], "name": tmp_name})
+
+    def tmp_done(self, idx: int):
+        # после полного круга имена на диске те же, что до начала:
+        # без этой отметки на диске их не различить
+        with self._lock:
+            self.mark(self._tmp_ids[idx], "done")
+            self.sync()
+
+    def tmp_rollback(self, idx: int):
+        # пишется до возврата с временного имени — по той же причине
+        with self._lock:
+            self.mark(self._tmp_ids[idx], "undone")
+            self.sync()
+
+    def done(self, idx: int):
+        self.mark(self._ids[idx], "undone" if self.mode == "undo" else "done")
+
+    def failed(self, idx: int, msg: str):
+        self._write({"op": "error", "id": self._ids[idx], "msg": msg})
+
+    def mark(self, record_id: int, op: str):
+        self._write({"op": op, "id": record_id})
+
+    def located(self):
+        self._write({"op": "located"})
+
+    def end(self, renamed: int, errors: int):
+        self._write({"op": "end", "mode": self.mode, "renamed": renamed, "errors": errors})
+        self.sync()
+
+    def sync(self):
+        with self._lock:
+            self._f.flush()
+            os.fsync(self._f.fileno())
+            self._unsynced = 0
+            self._last_sync = time.monotonic()
+
+    def close(self):
+        if not self._f.closed:
+            self.sync()
+            self._f.close()
+
+    def _write(self, record):
+        line = json.dumps(record, ensure_ascii=False) + "\n"
+        with self._lock:
+            self._f.write(line)
+            self._unsynced += 1
+            if (self._unsynced >= JOURNAL_SYNC_RECORDS
+                    or time.monotonic() - self._last_sync >= JOURNAL_SYNC_INTERVAL):
+                self.sync()
+
+
+def _item(rel_dir: str, old_name: str, new_name: str, is_dir: bool) -> dict:
+    return {
+        "rel_dir": rel_dir,
+        "old_name": old_name,
+        "new_name": new_name,
+        "do_rename": True,
+        "is_dir": is_dir,
+        "locked": False,
+        "modified": False,
+    }
+
+
+def _report_ambiguous(root: str, paths, log):
+    if log:
+        for rel_path in paths:
+            log(f"Пропуск (неоднозначно): {os.path.join(root, rel_path)} — по журналу и диску "
+                f"не определить, где сейчас элемент")
+
+
+def _path_mapper(renamed_dirs: dict):
+    """
+    Функция: путь из журнала (старые имена всех предков) -> текущий путь.
+    renamed_dirs — старый относительный путь папки -> её новое имя; словарь
+    можно пополнять и после создания функции.
+    """
+    def current_path(rel_path):
+        if not rel_path:
+            return ""
+        old_prefix = ""
+        parts = []
+        for part in rel_path.split(os.sep):
+            old_prefix = os.path.join(old_prefix, part) if old_prefix else part
+            parts.append(renamed_dirs.get(old_prefix, part))
+        return os.path.join(*parts)
+    return current_path
+
+
+def _name_groups(steps) -> list:
+    """Шаги (запись, откуда, куда, пройден), связанные общими путями, — по группам."""
+    parent = list(range(len(steps)))
+
+    def find(i):
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    owner = {}
+    for i, step in enumerate(steps):
+        for path in (step[0]["src"], step[0]["dst"]):
+            j = owner.setdefault(path, i)
+            if j != i:
+                parent[find(i)] = find(j)
+    groups = {}
+    for i, step in enumerate(steps):
+        groups.setdefault(find(i), []).append(step)
+    return list(groups.values())
+
+
+class _Location:
+    """Результат _locate(): где сейчас каждая запись плана."""
+
+    def __init__(self):
+        self.names = {}         # id записи -> текущее имя в её папке
+        self.ambiguous = set()  # id записей, положение которых не определить
+        self.tmp_done = []      # id шагов на временное имя, выполненных без отметки
+        self.renamed_dirs = {}  # старый относительный путь папки -> текущее имя
+        self.current_path = _path_mapper(self.renamed_dirs)
+
+    def set_name(self, entry, name):
+        self.names[entry["id"]] = name
+        if entry["is_dir"]:
+            if name == os.path.basename(entry["src"]):
+                self.renamed_dirs.pop(entry["src"], None)
+            else:
+                self.renamed_dirs[entry["src"]] = name
+
+
+def _locate(state: JournalState, root: str, backward: bool) -> _Location:
+    """
+    Текущее имя каждой записи плана (кроме откаченных) по отметкам журнала
+    и по диску.
+
+    Шаги — src → dst всех записей (отмеченные done уже пройдены). Если
+    откат уже закрепил положение записей (backward и state.located), оно
+    берётся из отметок — dst, временное имя или src, — а шаги — из него в
+    src. Шаги, связанные общими путями, — одна цепочка одной папки: она
+    выполняется по порядку, так что на диске видно, сколько её шагов прошло
+    (_locate_group). Группы разбираются от корня вглубь, чтобы пути
+    папок-предков были уже известны.
+    """
+    loc = _Location()
+
+    # последний шаг на временное имя каждого элемента, отдельно для отката
+    forward_tmps, reverse_tmps = {}, {}
+    for record_id in sorted(state.tmps):
+        tmp = state.tmps[record_id]
+        (reverse_tmps if tmp["mode"] == "undo" else forward_tmps)[tmp["tmp"]] = tmp
+    reverse = backward and state.located
+
+    steps = []
+    for entry in state.plans:
+        if entry["id"] in state.undone:
+            continue
+        src_name, dst_name = os.path.basename(entry["src"]), os.path.basename(entry["dst"])
+        done = entry["id"] in state.done
+        if not reverse:
+            loc.set_name(entry, dst_name if done else src_name)
+            steps.append((entry, src_name, dst_name, done))
+            continue
+        name = src_name
+        tmp = forward_tmps.get(entry["id"])
+        if done:
+            name = dst_name
+        elif tmp is not None and state.tmp_marks.get(tmp["id"]) == "done":
+            name = tmp["name"]
+        loc.set_name(entry, name)
+        if name != src_name:
+            steps.append((entry, name, src_name, False))
+
+    tmps = reverse_tmps if reverse else forward_tmps
+    groups = _name_groups(steps)
+    groups.sort(key=lambda group: group[0][0]["src"].count(os.sep))
+    for group in groups:
+        _locate_group(loc, state, root, group, tmps)
+
+    # временное имя на диске, которое журнал не объясняет: элемент не трогаем.
+    # Разные запуски могут выбрать одно и то же временное имя.
+    if state.tmps:
+        by_id = {entry["id"]: entry for entry in state.plans}
+        leftovers = []
+        explained = set()
+        for tmp in state.tmps.values():
+            name = loc.names.get(tmp["tmp"])
+            if name is None:
+                continue
+            path = os.path.join(loc.current_path(os.path.dirname(by_id[tmp["tmp"]]["src"])), tmp["name"])
+            if name == tmp["name"]:
+                explained.add(path)
+            else:
+                leftovers.append((tmp["tmp"], path))
+        for entry_id, path in leftovers:
+            if path not in explained and os.path.lexists(os.path.join(root, path)):
+                loc.ambiguous.add(entry_id)
+    return loc
+
+
+def _locate_group(loc: _Location, state: JournalState, root: str, group, tmps):
+    """
+    Группа шагов (запись, откуда, куда, пройден) одной папки.
+
+    Элемент, чей шаг на временное имя выполнен (отметка done или временное
+    имя на диске), идёт с временного имени — цикл становится цепочкой.
+    Цепочка выполняется с конца: первым — шаг, цель которого свободна.
+    Пройдены шаги до самого позднего, отмеченного в журнале или такого, у
+    которого «откуда» уже нет, а «куда» есть. Если остальное не сходится с
+    диском, вся группа неоднозначна.
+    """
+    if all(known for *_, known in group):
+        for entry, _, to, _ in group:
+            loc.set_name(entry, to)
+        return
+
+    rel_dir = loc.current_path(os.path.dirname(group[0][0]["src"]))
+    parent_dir = os.path.join(root, rel_dir) if rel_dir else root
+
+    def exists(name):
+        return os.path.lexists(os.path.join(parent_dir, name))
+
+    steps = []
+    via_tmp = False
+    for entry, frm, to, known in group:
+        tmp = tmps.get(entry["id"])
+        if tmp is not None and (state.tmp_marks.get(tmp["id"]) == "done" or exists(tmp["name"])):
+            if state.tmp_marks.get(tmp["id"]) != "done":
+                loc.tmp_done.append(tmp["id"])
+            frm = tmp["name"]
+            via_tmp = True
+        steps.append((entry, frm, to, known))
+
+    def give_up():
+        loc.ambiguous.update(step[0]["id"] for step in group)
+
+    by_frm = {step[1]: step for step in steps}
+    by_to = {step[2]: step for step in steps}
+    heads = [step for step in steps if step[2] not in by_frm]
+    if len(by_frm) != len(steps) or len(by_to) != len(steps) or len(heads) > 1:
+        return give_up()
+    if not heads:
+        # цикл без шага на временное имя: ни один запуск его не начинал
+        if any(known for *_, known in steps) or not all(exists(frm) for _, frm, _, _ in steps):
+            return give_up()
+        for entry, frm, _, _ in steps:
+            loc.set_name(entry, frm)
+        return
+
+    order = [heads[0]]
+    while order[-1][1] in by_to:
+        order.append(by_to[order[-1][1]])
+    if len(order) != len(steps):
+        return give_up()
+
+    passed = 0
+    for i in range(len(order), 0, -1):
+        _, frm, to, known = order[i - 1]
+        if known or not exists(frm) and exists(to):
+            passed = i
+            break
+    if len(steps) > 1 or via_tmp:
+        if (not all(exists(to) for _, _, to, _ in order[:passed])
+                or not all(exists(frm) for _, frm, _, _ in order[passed:])):
+            return give_up()
+    for i, (entry, frm, to, _) in enumerate(order):
+        loc.set_name(entry, to if i < passed else frm)
+
+
+def rename_with_journal(root: str, items, conflict_indices, journal_path=None,
+                        workers: int = DEFAULT_RENAME_WORKERS, log=None):
+    """
+    Переименование с журналом. Возвращает (исполнитель, путь журнала);
+    счётчики и скорость — в атрибутах исполнителя.
+    """
+    if journal_path is None:
+        journal_path = default_journal_path()
+    with RenameJournal(journal_path, root) as journal:
+        executor = RenameExecutor(root, items, conflict_indices, workers=workers, log=log, journal=journal)
+        executor.run()
+        journal.end(executor.renamed, executor.errors)
+    return executor, journal_path
+
+
+class JournalJob:
+    """
+    rename_with_journal(), resume() или undo() в фоновом потоке, чтобы окно
+    не замирало на больших деревьях.
+
+    Сообщения лога кладутся в self.queue, в конце — None; поток GUI забирает
+    их через drain(), не блокируясь. Результат функции — в self.result,
+    исключение — в self.error. Поток не фоновый (daemon=False): закрытие
+    окна не обрывает переименование посреди этапа.
+    """
+
+    def __init__(self, func, *args, **kwargs):
+        self.queue = queue.Queue()
+        self.result = None
+        self.error = None
+        self.finished = False
+        self._thread = threading.Thread(target=self._run, args=(func, args, kwargs),
+                                        name="renamer-journal")
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def _run(self, func, args, kwargs):
+        try:
+            self.result = func(*args, log=self.queue.put, **kwargs)
+        except Exception as e:
+            self.error = e
+        finally:
+            self.queue.put(None)
+
+    def drain(self):
+        """Забирает накопившиеся сообщения без ожидания. Возвращает (сообщения, завершено)."""
+        messages = []
+        while not self.finished:
+            try:
+                msg = self.queue.get_nowait()
+            except queue.Empty:
+                break
+            if msg is None:
+                self.finished = True
+            else:
+                messages.append(msg)
+        return messages, self.finished
+
+
+def resume(journal_path: str, workers: int = DEFAULT_RENAME_WORKERS, log=None, dry_run=False):
+    """
+    Продолжает прерванный запуск: выполняет записи плана без отметки
+    done/undone (в том числе с ошибкой) с того места, где они сейчас
+    (_locate) — в том числе с временного имени прерванного цикла. Элементы,
+    переименованные до сбоя, но не успевшие попасть в журнал, только
+    отмечаются; неоднозначные не выполняются и считаются ошибками.
+    Возвращает (переименовано, ошибок/пропусков).
+    """
+    state = read_journal(journal_path)
+    root = state.root
+    loc = _locate(state, root, backward=False)
+
+    ids = []
+    items = []
+    finished_before = []
+    ambiguous = []
+    for entry in state.plans:
+        record_id = entry["id"]
+        if record_id in state.undone:
+            continue
+        rel_dir = loc.current_path(os.path.dirname(entry["src"]))
+        name = loc.names[record_id]
+        new_name = os.path.basename(entry["dst"])
+        if record_id in loc.ambiguous:
+            ambiguous.append(os.path.join(rel_dir, name))
+        elif name == new_name:
+            if record_id not in state.done:
+                finished_before.append(record_id)
+        else:
+            ids.append(record_id)
+            items.append(_item(rel_dir, name, new_name, entry["is_dir"]))
+
+    if log and finished_before:
+        log(f"Уже выполнено до сбоя: {len(finished_before)}")
+    _report_ambiguous(root, ambiguous, log)
+
+    if dry_run:
+        executor = RenameExecutor(root, items, set(), workers=workers, log=log, dry_run=True)
+        renamed, errors = executor.run()
+        return renamed, errors + len(ambiguous)
+
+    with RenameJournal(journal_path, root, mode="resume", next_id=state.max_id + 1) as journal:
+        for record_id in loc.tmp_done:
+            journal.mark(record_id, "done")
+        for record_id in finished_before:
+            journal.mark(record_id, "done")
+        for idx, record_id in enumerate(ids):
+            journal.adopt(idx, record_id)
+        executor = RenameExecutor(root, items, set(), workers=workers, log=log, journal=journal)
+        renamed, errors = executor.run()
+        errors += len(ambiguous)
+        journal.end(renamed, errors)
+    return renamed, errors
+
+
+def undo(journal_path: str, workers: int = DEFAULT_RENAME_WORKERS, log=None, dry_run=False):
+    """
+    Откатывает выполненные переименования журнала (dst → src).
+
+    Текущее место каждого элемента — с учётом переименований папок-предков,
+    прерванного запуска и прерванного отката (_locate); откат идёт тем же
+    порядком, что и переименование: файлы, затем папки от самых глубоких.
+    Повторный запуск продолжает прерванный откат.
+    Возвращает (откачено, ошибок/пропусков).
+    """
+    state = read_journal(journal_path)
+    root = state.root
+    loc = _locate(state, root, backward=True)
+
+    ids = []
+    items = []
+    finished_before = []
+    undone_before = []
+    ambiguous = []
+    for entry in state.plans:
+        record_id = entry["id"]
+        if record_id in state.undone:
+            continue
+        rel_dir = loc.current_path(os.path.dirname(entry["src"]))
+        name = loc.names[record_id]
+        old_name = os.path.basename(entry["src"])
+        if record_id in loc.ambiguous:
+            ambiguous.append(os.path.join(rel_dir, name))
+            continue
+        if name == old_name:
+            if record_id in state.done:
+                undone_before.append(record_id)
+            continue
+        if name == os.path.basename(entry["dst"]) and record_id not in state.done:
+            finished_before.append(record_id)
+        ids.append(record_id)
+        items.append(_item(rel_dir, name, old_name, entry["is_dir"]))
+
+    if log and undone_before:
+        log(f"Уже откачено до сбоя: {len(undone_before)}")
+    _report_ambiguous(root, ambiguous, log)
+
+    if dry_run:
+        executor = RenameExecutor(root, items, set(), workers=workers, log=log, dry_run=True)
+        restored, errors = executor.run()
+        return restored, errors + len(ambiguous)
+
+    with RenameJournal(journal_path, root, mode="undo", next_id=state.max_id + 1) as journal:
+        for record_id in loc.tmp_done:
+            journal.mark(record_id, "done")
+        for record_id in finished_before:
+            journal.mark(record_id, "done")
+        for record_id in undone_before:
+            journal.mark(record_id, "undone")
+        journal.located()
+        for idx, record_id in enumerate(ids):
+            journal.adopt(idx, record_id)
+        executor = RenameExecutor(root, items, set(), workers=workers, log=log, journal=journal)
+        restored, errors = executor.run()
+        errors += len(ambiguous)
+        journal.end(restored, errors)
+    return restored, errors
@@ -0,0 +1,202 @@
+"""
+Замеры горячих мест: таймеры, счётчики и число обращений к файловой системе.
+
+Включается переменной окружения RENAMER_PERF=1 или флагом --perf (enable()).
+Выключенные замеры почти ничего не стоят: timer() возвращает общий пустой
+контекст, timed() сразу вызывает функцию.
+
+При включении функции os из FS_CALLS подменяются обёртками со счётчиком
+(os.walk и os.path.exists ходят через них же), при выключении — возвращаются.
+Профиль cProfile снимается только в потоке, вызвавшем start_profile().
+"""
+
+import contextlib
+import cProfile
+import functools
+import json
+import os
+import threading
+import time
+
+
+ENV_VAR = "RENAMER_PERF"
+
+# функции os, вызовы которых считаются обращениями к ФС (link, unlink и
+# open — переименование без замены и дескрипторы папок)
+FS_CALLS = ("stat", "lstat", "listdir", "scandir", "rename", "replace", "fsync",
+            "link", "unlink", "open")
+
+_enabled = False
+_lock = threading.Lock()
+_timers = {}        # имя -> [вызовов, всего, максимум, последний] (секунды)
+_counters = {}
+_fs_calls = {}
+_fs_originals = {}
+_profiler = None
+
+_NULL = contextlib.nullcontext()
+
+
+def enabled() -> bool:
+    return _enabled
+
+
+def enable():
+    global _enabled
+    if _enabled:
+        return
+    _enabled = True
+    for name in FS_CALLS:
+        func = getattr(os, name, None)
+        if func is not None:
+            _fs_originals[name] = func
+            setattr(os, name, _counted(name, func))
+
+
+def disable():
+    global _enabled
+    _enabled = False
+    for name, func in _fs_originals.items():
+        setattr(os, name, func)
+    _fs_originals.clear()
+
+
+def reset():
+    with _lock:
+        _timers.clear()
+        _counters.clear()
+        _fs_calls.clear()
+
+
+def _counted(name, func):
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        with _lock:
+            _fs_calls[name] = _fs_calls.get(name, 0) + 1
+        return func(*args, **kwargs)
+    return wrapper
+
+
+def record(name: str, elapsed: float):
+    with _lock:
+        entry = _timers.get(name)
+        if entry is None:
+            _timers[name] = [1, elapsed, elapsed, elapsed]
+        else:
+            entry[0] += 1
+            entry[1] += elapsed
+            if elapsed > entry[2]:
+                entry[2] = elapsed
+            entry[3] = elapsed
+
+
+class _Timer:
+    __slots__ = ("name", "_t0")
+
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        self._t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        record(self.name, time.perf_counter() - self._t0)
+
+
+def timer(name: str):
+    """with timer("имя"): ... — время блока, если замеры включены."""
+    return _Timer(name) if _enabled else _NULL
+
+
+def timed(name: str):
+    """Декоратор: время каждого вызова функции под именем name."""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not _enabled:
+                return func(*args, **kwargs)
+            t0 = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                record(name, time.perf_counter() - t0)
+        return wrapper
+    return decorator
+
+
+def count(name: str, n: int = 1):
+    if not _enabled:
+        return
+    with _lock:
+        _counters[name] = _counters.get(name, 0) + n
+
+
+def snapshot() -> dict:
+    """Текущие значения: таймеры, счётчики, обращения к ФС."""
+    with _lock:
+        timers = {
+            name: {
+                "count": n,
+                "total_sec": total,
+                "avg_sec": total / n if n else 0.0,
+                "max_sec": worst,
+                "last_sec": last,
+            }
+            for name, (n, total, worst, last) in _timers.items()
+        }
+        return {
+            "enabled": _enabled,
+            "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "timers": timers,
+            "counters": dict(_counters),
+            "fs_calls": dict(_fs_calls),
+        }
+
+
+def dump_json(path: str):
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(snapshot(), f, ensure_ascii=False, indent=2)
+
+
+def format_summary() -> str:
+    """Короткая текстовая сводка для stderr."""
+    snap = snapshot()
+    lines = []
+    for name, t in sorted(snap["timers"].items(), key=lambda kv: -kv[1]["total_sec"]):
+        lines.append(f"{name:<24} x{t['count']:<6} всего {t['total_sec']:8.3f} с, "
+                     f"макс {t['max_sec']:7.3f} с")
+    for name, value in sorted(snap["counters"].items()):
+        lines.append(f"{name:<24} {value}")
+    if snap["fs_calls"]:
+        calls = ", ".join(f"{name} {n}" for name, n in sorted(snap["fs_calls"].items()))
+        lines.append(f"обращения к ФС: {calls}")
+    return "\n".join(lines)
+
+
+def profiling() -> bool:
+    return _profiler is not None
+
+
+def start_profile():
+    """Начинает профиль cProfile (в текущем потоке) и включает замеры."""
+    global _profiler
+    if _profiler is not None:
+        return
+    enable()
+    _profiler = cProfile.Profile()
+    _profiler.enable()
+
+
+def stop_profile(path: str):
+    """Останавливает профиль и сохраняет его (pstats / snakeviz)."""
+    global _profiler
+    if _profiler is None:
+        return
+    profiler, _profiler = _profiler, None
+    profiler.disable()
+    profiler.dump_stats(path)
+
+
+if os.environ.get(ENV_VAR, "") not in ("", "0"):
+    enable()
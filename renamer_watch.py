@@ -0,0 +1,681 @@
+"""
+Слежение за деревом после сканирования: созданные, удалённые и
+перемещённые файлы и папки попадают в список элементов без
+пересканирования.
+
+На Linux используется inotify (через ctypes, одно наблюдение на папку),
+иначе — или если inotify недоступен либо не хватает лимита наблюдений —
+периодический обход: один stat на папку, папки с изменившимся mtime
+перечитываются.
+
+Наблюдатель работает в фоновом потоке и кладёт в self.queue списки
+событий; поток GUI забирает их через drain() и применяет пачкой через
+WatchSync.apply(). Событие — кортеж (вид, путь, is_dir, новый путь),
+пути относительно корня:
+
+    ("create", "a/b.txt", False, None)
+    ("delete", "a/b.txt", False, None)
+    ("move", "a/b", True, "c/b")
+    ("overflow", "", False, None)     # события потеряны, список мог устареть
+
+Перед началом наблюдатель сверяет папки с items.dir_mtimes: изменения,
+сделанные между сканированием и запуском, тоже приходят событиями.
+"""
+
+import ctypes
+import ctypes.util
+import errno
+import os
+import queue
+import select
+import stat
+import struct
+import sys
+import threading
+import time
+
+import renamer_perf as perf
+from renamer_core import (
+    FLAG_DO_RENAME,
+    FLAG_IS_DIR,
+    FLAG_LOCKED,
+    FLAG_REMOVED,
+    iter_scan,
+    parent_dir_of,
+    plan_new_name,
+)
+
+
+WATCH_MODES = ("auto", "inotify", "poll")
+
+# опрос: пауза между проходами не меньше стольких секунд
+# и не меньше WATCH_POLL_BACKOFF длительностей прохода (SMB/NFS)
+WATCH_POLL_INTERVAL = 2.0
+WATCH_POLL_BACKOFF = 4
+
+# inotify: ожидание событий за один select и размер буфера чтения
+WATCH_READ_TIMEOUT = 0.2
+WATCH_READ_SIZE = 1 << 16
+
+# маски inotify (linux/inotify.h)
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+IN_DONT_FOLLOW = 0x02000000
+IN_ISDIR = 0x40000000
+IN_NONBLOCK = os.O_NONBLOCK
+IN_CLOEXEC = getattr(os, "O_CLOEXEC", 0o2000000)
+
+_WATCH_MASK = (IN_CREATE | IN_DELETE | IN_MOVED_FROM | IN_MOVED_TO
+               | IN_DELETE_SELF | IN_MOVE_SELF | IN_ONLYDIR | IN_DONT_FOLLOW)
+_EVENT = struct.Struct("iIII")
+
+
+def _load_inotify():
+    if not sys.platform.startswith("linux"):
+        return None
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        libc.inotify_init1.argtypes = [ctypes.c_int]
+        libc.inotify_add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+        libc.inotify_rm_watch.argtypes = [ctypes.c_int, ctypes.c_int]
+    except (OSError, AttributeError):
+        return None
+    return libc
+
+
+_libc = _load_inotify()
+INOTIFY_AVAILABLE = _libc is not None
+
+
+def _join(rel_dir: str, name: str) -> str:
+    return os.path.join(rel_dir, name) if rel_dir else name
+
+
+def _in_subtree(rel_path: str, top: str) -> bool:
+    return rel_path == top or rel_path.startswith(top + os.sep)
+
+
+def _list_dir(path: str):
+    """{имя: is_dir} содержимого папки (как у сканирования); None — прочитать не удалось."""
+    try:
+        with os.scandir(path) as it:
+            result = {}
+            for entry in it:
+                try:
+                    result[entry.name] = entry.is_dir()
+                except OSError:
+                    result[entry.name] = False
+            return result
+    except OSError:
+        return None
+
+
+def _real_dir_mtime(root: str, rel_dir: str):
+    """mtime папки или None, если её нет или это ссылка (os.walk в ссылки не заходит)."""
+    path = parent_dir_of(root, rel_dir)
+    try:
+        st = os.stat(path) if not rel_dir else os.lstat(path)
+    except OSError:
+        return None
+    return st.st_mtime_ns if stat.S_ISDIR(st.st_mode) else None
+
+
+def _known_tree(items) -> dict:
+    """rel_dir -> {имя: is_dir} живых элементов ItemStore (снимок для наблюдателя)."""
+    tree = {"": {}}
+    dirs, names, flags = items.dirs, items.old_names, items.flags
+    for idx, dir_id in enumerate(items.dir_ids):
+        f = flags[idx]
+        if f & FLAG_REMOVED:
+            continue
+        rel_dir = dirs[dir_id]
+        bucket = tree.get(rel_dir)
+        if bucket is None:
+            bucket = tree[rel_dir] = {}
+        is_dir = bool(f & FLAG_IS_DIR)
+        bucket[names[idx]] = is_dir
+        if is_dir:
+            tree.setdefault(_join(rel_dir, names[idx]), {})
+    return tree
+
+
+def _pair_moves(deleted, created) -> list:
+    """
+    Исчезнувшее и появившееся с тем же именем и типом (и единственные
+    такие) считаются перемещением. Возвращает события: move, delete, create.
+    """
+    def by_key(entries):
+        keys = {}
+        for rel_path, is_dir in entries:
+            keys.setdefault((os.path.basename(rel_path), is_dir), []).append(rel_path)
+        return keys
+
+    gone, new = by_key(deleted), by_key(created)
+    moves = {}
+    for key, paths in gone.items():
+        if len(paths) == 1 and len(new.get(key, ())) == 1:
+            moves[paths[0]] = new[key][0]
+    moved_to = set(moves.values())
+
+    events = [("move", src, is_dir, moves[src]) for src, is_dir in deleted if src in moves]
+    events += [("delete", p, is_dir, None) for p, is_dir in deleted if p not in moves]
+    events += [("create", p, is_dir, None) for p, is_dir in created if p not in moved_to]
+    return events
+
+
+class _Watcher:
+    """
+    Общая часть наблюдателей: фоновый поток, очередь событий, остановка.
+    items (ItemStore) читается только в конструкторе, в потоке GUI.
+    """
+
+    kind = ""
+
+    def __init__(self, root: str, items):
+        self.root = root
+        self.queue = queue.Queue()
+        self.error = None
+        self._tree = _known_tree(items)
+        self._mtimes = dict(items.dir_mtimes)
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name=f"renamer-watch-{self.kind}", daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+
+    @property
+    def running(self) -> bool:
+        return self._thread.is_alive()
+
+    def drain(self) -> list:
+        """Все накопившиеся события без ожидания."""
+        events = []
+        while True:
+            try:
+                events.extend(self.queue.get_nowait())
+            except queue.Empty:
+                return events
+
+    def _run(self):
+        try:
+            self._loop()
+        except Exception as e:
+            self.error = e
+
+    def _loop(self):
+        raise NotImplementedError
+
+    def _watch_dir(self, rel_dir: str):
+        """Перед чтением новой папки (inotify ставит наблюдение до чтения, чтобы не пропустить)."""
+
+    def _on_dir(self, rel_dir: str, mtime_ns, names):
+        """Папка прочитана (новая или изменившаяся); names — {имя: is_dir}."""
+
+    def _walk_new(self, rel_path: str, events: list):
+        """Появившаяся папка: её содержимое событиями create (рекурсивно)."""
+        stack = [rel_path]
+        while stack:
+            rel_dir = stack.pop()
+            mtime_ns = _real_dir_mtime(self.root, rel_dir)
+            if mtime_ns is None:
+                continue
+            self._watch_dir(rel_dir)
+            names = _list_dir(parent_dir_of(self.root, rel_dir))
+            if names is None:
+                continue
+            self._on_dir(rel_dir, mtime_ns, names)
+            for name, is_dir in names.items():
+                events.append(("create", _join(rel_dir, name), is_dir, None))
+                if is_dir:
+                    stack.append(_join(rel_dir, name))
+
+    def _check_dir(self, rel_dir: str, deleted: list, created: list) -> bool:
+        """
+        Сверяет папку со снимком по mtime; расхождения дописывает в
+        deleted/created как (путь, is_dir). False — папки больше нет.
+        """
+        mtime_ns = _real_dir_mtime(self.root, rel_dir)
+        if mtime_ns is None:
+            return False
+        if mtime_ns == self._mtimes.get(rel_dir):
+            return True
+        names = _list_dir(parent_dir_of(self.root, rel_dir))
+        if names is None:
+            return True
+        known = self._tree.get(rel_dir, {})
+        deleted.extend((_join(rel_dir, n), d) for n, d in known.items() if names.get(n) != d)
+        created.extend((_join(rel_dir, n), d) for n, d in names.items() if known.get(n) != d)
+        self._tree[rel_dir] = names
+        self._mtimes[rel_dir] = mtime_ns
+        return True
+
+    def _forget_tree(self, top: str):
+        for rel_dir in [d for d in self._tree if _in_subtree(d, top)]:
+            del self._tree[rel_dir]
+            self._mtimes.pop(rel_dir, None)
+
+    def _move_tree(self, src: str, dst: str):
+        for rel_dir in [d for d in self._tree if _in_subtree(d, src)]:
+            new_dir = dst + rel_dir[len(src):]
+            self._tree[new_dir] = self._tree.pop(rel_dir)
+            if rel_dir in self._mtimes:
+                self._mtimes[new_dir] = self._mtimes.pop(rel_dir)
+
+    def _expand(self, events: list) -> list:
+        """Снимок по событиям move/delete, содержимое новых папок — событиями create."""
+        result = []
+        for event in events:
+            kind, rel_path, is_dir, dst = event
+            result.append(event)
+            if not is_dir:
+                continue
+            if kind == "move":
+                self._move_tree(rel_path, dst)
+            elif kind == "delete":
+                self._forget_tree(rel_path)
+            elif kind == "create":
+                self._walk_new(rel_path, result)
+        return result
+
+
+class PollingWatcher(_Watcher):
+    """Периодический обход: stat каждой известной папки, изменившиеся перечитываются."""
+
+    kind = "poll"
+
+    def __init__(self, root: str, items, interval: float = WATCH_POLL_INTERVAL):
+        super().__init__(root, items)
+        self.interval = interval
+
+    def _on_dir(self, rel_dir, mtime_ns, names):
+        self._tree[rel_dir] = names
+        self._mtimes[rel_dir] = mtime_ns
+
+    @perf.timed("watch.poll")
+    def poll_once(self) -> list:
+        """Один проход по всем папкам; возвращает события."""
+        deleted, created = [], []
+        for rel_dir in list(self._tree):
+            if self._stop.is_set():
+                return []
+            if not self._check_dir(rel_dir, deleted, created) and not rel_dir:
+                # корень исчез — следить больше не за чем
+                self._stop.set()
+                return [("overflow", "", False, None)]
+        return self._expand(_pair_moves(deleted, created))
+
+    def _loop(self):
+        while not self._stop.is_set():
+            t0 = time.monotonic()
+            events = self.poll_once()
+            if events:
+                self.queue.put(events)
+            pause = max(self.interval, WATCH_POLL_BACKOFF * (time.monotonic() - t0))
+            self._stop.wait(pause)
+
+
+class InotifyWatcher(_Watcher):
+    """
+    inotify: наблюдение на каждую папку дерева. Перемещение внутри корня
+    приходит парой MOVED_FROM/MOVED_TO с общим cookie; непарный
+    MOVED_FROM — элемент унесли за пределы корня (удаление).
+    Конструктор бросает OSError, если inotify недоступен.
+    """
+
+    kind = "inotify"
+
+    def __init__(self, root: str, items):
+        if _libc is None:
+            raise OSError(errno.ENOSYS, "inotify недоступен")
+        super().__init__(root, items)
+        fd = _libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if fd < 0:
+            err = ctypes.get_errno()
+            raise OSError(err, os.strerror(err))
+        self._fd = fd
+        self._wd_dir = {}
+        self._dir_wd = {}
+        # корень ставим сразу: ошибки видны вызывающему
+        try:
+            if not self._add_watch(""):
+                err = ctypes.get_errno()
+                raise OSError(err, os.strerror(err), root)
+        except OSError:
+            os.close(fd)
+            raise
+
+    def _add_watch(self, rel_dir: str) -> bool:
+        path = os.fsencode(parent_dir_of(self.root, rel_dir))
+        wd = _libc.inotify_add_watch(self._fd, path, _WATCH_MASK)
+        if wd < 0:
+            err = ctypes.get_errno()
+            if err == errno.ENOSPC:
+                raise OSError(err, "исчерпан лимит наблюдений inotify (fs.inotify.max_user_watches)")
+            return False
+        # та же папка под другим путём (перенесли до события): старый путь забываем
+        old = self._wd_dir.get(wd)
+        if old is not None and old != rel_dir and self._dir_wd.get(old) == wd:
+            del self._dir_wd[old]
+        self._wd_dir[wd] = rel_dir
+        self._dir_wd[rel_dir] = wd
+        perf.count("watch.inotify_watches")
+        return True
+
+    def _watch_dir(self, rel_dir):
+        self._add_watch(rel_dir)
+
+    def _drop_watches(self, top: str):
+        for rel_dir in [d for d in self._dir_wd if _in_subtree(d, top)]:
+            wd = self._dir_wd.pop(rel_dir)
+            if self._wd_dir.get(wd) == rel_dir:
+                del self._wd_dir[wd]
+                _libc.inotify_rm_watch(self._fd, wd)
+
+    def _move_watches(self, src: str, dst: str):
+        # наблюдение привязано к папке, а не к пути — меняется только путь
+        for rel_dir in [d for d in self._dir_wd if _in_subtree(d, src)]:
+            wd = self._dir_wd.pop(rel_dir)
+            if self._wd_dir.get(wd) == rel_dir:
+                new_dir = dst + rel_dir[len(src):]
+                self._dir_wd[new_dir] = wd
+                self._wd_dir[wd] = new_dir
+
+    def _catch_up(self):
+        """Наблюдения на все известные папки и сверка с mtime на момент сканирования."""
+        deleted, created = [], []
+        for rel_dir in list(self._tree):
+            if self._stop.is_set():
+                return
+            if rel_dir and not self._add_watch(rel_dir):
+                continue
+            self._check_dir(rel_dir, deleted, created)
+        events = _pair_moves(deleted, created)
+        moved = [dst for kind, _, is_dir, dst in events if kind == "move" and is_dir]
+        events = self._expand(events)
+        # перенесённые папки: наблюдения и сверка уже по новому пути
+        deleted, created = [], []
+        for top in moved:
+            for rel_dir in [d for d in self._tree if _in_subtree(d, top)]:
+                if self._add_watch(rel_dir):
+                    self._check_dir(rel_dir, deleted, created)
+        events += self._expand([("delete", p, d, None) for p, d in deleted]
+                               + [("create", p, d, None) for p, d in created])
+        # снимок дальше не нужен: изменения приходят от inotify
+        self._tree = {}
+        self._mtimes = {}
+        if events:
+            self.queue.put(events)
+
+    def _loop(self):
+        try:
+            self._catch_up()
+            # MOVED_FROM занимает место в events сразу, а событием (move или
+            # delete) становится, когда выяснится, пришёл ли парный MOVED_TO;
+            # до этого события в очередь не отдаются, чтобы не нарушить порядок
+            events = []
+            pending = {}    # cookie -> [позиция в events, путь, is_dir, wd, пережил чтение]
+            while not self._stop.is_set():
+                ready, _, _ = select.select([self._fd], [], [], WATCH_READ_TIMEOUT)
+                if ready:
+                    try:
+                        data = os.read(self._fd, WATCH_READ_SIZE)
+                    except BlockingIOError:
+                        data = b""
+                    self._parse(data, pending, events)
+                # MOVED_TO не пришёл ни в этом чтении, ни в следующем — унесли за корень
+                for cookie, entry in list(pending.items()):
+                    if entry[4] or not ready:
+                        del pending[cookie]
+                        pos, rel_path, is_dir, wd = entry[:4]
+                        if wd is not None and wd in self._wd_dir:
+                            self._drop_watches(self._wd_dir[wd])
+                        events[pos] = ("delete", rel_path, is_dir, None)
+                    else:
+                        entry[4] = True
+                if events and not pending:
+                    self.queue.put(events)
+                    events = []
+        finally:
+            os.close(self._fd)
+
+    def _parse(self, data: bytes, pending: dict, events: list):
+        pos = 0
+        while pos + _EVENT.size <= len(data):
+            wd, mask, cookie, length = _EVENT.unpack_from(data, pos)
+            pos += _EVENT.size
+            name = os.fsdecode(data[pos:pos + length].rstrip(b"\0"))
+            pos += length
+
+            if mask & IN_Q_OVERFLOW:
+                events.append(("overflow", "", False, None))
+                continue
+            if mask & IN_IGNORED:
+                rel_dir = self._wd_dir.pop(wd, None)
+                if rel_dir is not None and self._dir_wd.get(rel_dir) == wd:
+                    del self._dir_wd[rel_dir]
+                continue
+            rel_dir = self._wd_dir.get(wd)
+            if rel_dir is None:
+                continue
+            if mask & (IN_DELETE_SELF | IN_MOVE_SELF):
+                # исчезновение вложенной папки придёт событием её родителя
+                if not rel_dir:
+                    events.append(("overflow", "", False, None))
+                    self._stop.set()
+                continue
+            if not name:
+                continue
+
+            rel_path = _join(rel_dir, name)
+            is_dir = bool(mask & IN_ISDIR)
+            if not is_dir and mask & (IN_CREATE | IN_MOVED_TO):
+                # ссылка на папку: сканирование тоже считает её папкой
+                is_dir = os.path.isdir(os.path.join(self.root, rel_path))
+            if mask & IN_CREATE:
+                events.append(("create", rel_path, is_dir, None))
+                if is_dir:
+                    self._walk_new(rel_path, events)
+            elif mask & IN_DELETE:
+                events.append(("delete", rel_path, is_dir, None))
+            elif mask & IN_MOVED_FROM:
+                wd_moved = self._dir_wd.get(rel_path) if is_dir else None
+                pending[cookie] = [len(events), rel_path, is_dir, wd_moved, False]
+                events.append(None)
+            elif mask & IN_MOVED_TO:
+                src = pending.pop(cookie, None)
+                if src is not None:
+                    events[src[0]] = ("move", src[1], is_dir, rel_path)
+                    if is_dir:
+                        if src[1] in self._dir_wd:
+                            self._move_watches(src[1], rel_path)
+                        else:
+                            # перенесли до того, как на папку встало наблюдение
+                            self._walk_new(rel_path, events)
+                else:
+                    events.append(("create", rel_path, is_dir, None))
+                    if is_dir:
+                        self._walk_new(rel_path, events)
+
+
+def start_watcher(root: str, items, mode: str = "auto", log=None):
+    """
+    Запускает наблюдатель за root. mode: "inotify", "poll" или "auto" —
+    inotify, а если он недоступен (не Linux, исчерпан лимит) — опрос.
+    """
+    if mode not in WATCH_MODES:
+        raise ValueError(f"Неизвестный режим слежения: {mode}")
+    if mode != "poll":
+        try:
+            return InotifyWatcher(root, items).start()
+        except OSError as e:
+            if mode == "inotify":
+                raise
+            if log:
+                log(f"inotify недоступен ({e}), слежение опросом")
+    return PollingWatcher(root, items).start()
+
+
+class WatchChanges:
+    """
+    Итог WatchSync.apply(): removed — помеченные удалёнными элементы,
+    items[start:] — добавленные, dirs — папки, содержимое которых
+    изменилось (снимок DirListing для них устарел), overflow — события
+    были потеряны.
+    """
+
+    def __init__(self, start: int):
+        self.start = start
+        self.removed = []
+        self.dirs = set()
+        self.created = 0
+        self.deleted = 0
+        self.moved = 0
+        self.overflow = False
+
+    def __bool__(self):
+        return bool(self.removed or self.dirs or self.overflow)
+
+
+class WatchSync:
+    """
+    Применяет события наблюдателя к items (ItemStore) и dir_index
+    (DirIndex) — его пополняет сам, остальные индексы обновляет вызывающий
+    по WatchChanges.
+
+    Удалённое помечается ItemStore.remove(), новое дописывается в конец.
+    Перемещённый элемент дописывается заново с прежними новым именем и
+    флагами (папка — вместе со всем содержимым); если при перемещении
+    сменилось имя, новое имя считается заново, кроме зафиксированных.
+    Повторное create для существующего элемента ничего не делает.
+    """
+
+    def __init__(self, root: str, items, dir_index):
+        self.root = root
+        self.items = items
+        self.dir_index = dir_index
+        self._live = {}   # rel_dir -> {old_name: индекс живого элемента}, по требованию
+
+    def _names(self, rel_dir: str) -> dict:
+        names = self._live.get(rel_dir)
+        if names is None:
+            store = self.items
+            flags, old = store.flags, store.old_names
+            names = {old[idx]: idx for idx in self.dir_index.indices(rel_dir)
+                     if not flags[idx] & FLAG_REMOVED}
+            self._live[rel_dir] = names
+        return names
+
+    @perf.timed("watch.apply")
+    def apply(self, events) -> WatchChanges:
+        changes = WatchChanges(len(self.items))
+        for kind, rel_path, is_dir, dst in events:
+            if kind == "overflow":
+                changes.overflow = True
+            elif kind == "create":
+                if self._create(rel_path, is_dir, changes):
+                    changes.created += 1
+            elif kind == "delete":
+                if self._remove(rel_path, changes):
+                    changes.deleted += 1
+            elif kind == "move":
+                self._move(rel_path, dst, is_dir, changes)
+                changes.moved += 1
+        self.dir_index.add_range(changes.start, len(self.items))
+        return changes
+
+    def _add(self, rel_dir: str, name: str, new_name: str, flags: int, changes) -> int:
+        idx = self.items.add_packed(rel_dir, name, new_name, flags)
+        self._names(rel_dir)[name] = idx
+        changes.dirs.add(rel_dir)
+        return idx
+
+    def _create(self, rel_path: str, is_dir: bool, changes) -> bool:
+        rel_dir, name = os.path.split(rel_path)
+        idx = self._names(rel_dir).get(name)
+        if idx is not None:
+            if bool(self.items.flags[idx] & FLAG_IS_DIR) == is_dir:
+                return False
+            self._remove(rel_path, changes)
+        new_name = plan_new_name(name, is_dir)
+        flags = (FLAG_IS_DIR if is_dir else 0) | (FLAG_DO_RENAME if new_name != name else 0)
+        self._add(rel_dir, name, new_name, flags, changes)
+        return True
+
+    def _remove(self, rel_path: str, changes) -> bool:
+        rel_dir, name = os.path.split(rel_path)
+        idx = self._names(rel_dir).pop(name, None)
+        if idx is None:
+            return False
+        store = self.items
+        store.remove(idx)
+        changes.removed.append(idx)
+        changes.dirs.add(rel_dir)
+        if store.flags[idx] & FLAG_IS_DIR:
+            # элементы в dir_index ещё не дописаны (add_range в конце apply) — поддерево и из кэша
+            for sub in self._subtree_dirs(rel_path):
+                for i in self._names(sub).values():
+                    store.remove(i)
+                    changes.removed.append(i)
+                self._live.pop(sub, None)
+                changes.dirs.add(sub)
+        return True
+
+    def _subtree_dirs(self, top: str) -> list:
+        dirs = set(self.dir_index.subtree_dirs(top))
+        dirs.update(d for d in self._live if _in_subtree(d, top))
+        return sorted(dirs)
+
+    def _move(self, src: str, dst: str, is_dir: bool, changes):
+        if src == dst:
+            return
+        src_dir, src_name = os.path.split(src)
+        idx = self._names(src_dir).get(src_name)
+        if idx is None:
+            # источник неизвестен (событие потеряно) — как появление нового
+            self._create(dst, is_dir, changes)
+            if is_dir:
+                self._add_tree(dst, changes)
+            return
+
+        store = self.items
+        flags = store.flags[idx]
+        is_dir = bool(flags & FLAG_IS_DIR)
+        dst_dir, dst_name = os.path.split(dst)
+        new_name = store.new_names[idx]
+        if dst_name != src_name and not flags & FLAG_LOCKED:
+            new_name = plan_new_name(dst_name, is_dir)
+            flags = (FLAG_IS_DIR if is_dir else 0) | (FLAG_DO_RENAME if new_name != dst_name else 0)
+        # перемещение поверх существующего элемента его заменяет
+        self._remove(dst, changes)
+
+        subtree = []
+        if is_dir:
+            old, new, fl = store.old_names, store.new_names, store.flags
+            for sub in self._subtree_dirs(src):
+                rows = [(old[i], new[i], fl[i]) for i in self._names(sub).values()]
+                subtree.append((dst + sub[len(src):], rows))
+        self._add(dst_dir, dst_name, new_name, flags, changes)
+        for rel_dir, rows in subtree:
+            for name, sub_new, sub_flags in rows:
+                self._add(rel_dir, name, sub_new, sub_flags, changes)
+        self._remove(src, changes)
+
+    def _add_tree(self, rel_path: str, changes):
+        """Содержимое папки с диска (когда о папке ничего не известно)."""
+        for info in iter_scan(os.path.join(self.root, rel_path)):
+            rel_dir = _join(rel_path, info["rel_dir"]) if info["rel_dir"] else rel_path
+            if info["old_name"] in self._names(rel_dir):
+                continue
+            flags = (FLAG_IS_DIR if info["is_dir"] else 0) | (FLAG_DO_RENAME if info["do_rename"] else 0)
+            self._add(rel_dir, info["old_name"], info["new_name"], flags, changes)
@@ -0,0 +1,175 @@
+import os
+
+import pytest
+
+import renamer_core as core
+import renamer_journal
+
+
+def _scan(root):
+    items = core.scan_tree(str(root))
+    return items, core.ConflictIndex(str(root), items).conflict_indices
+
+
+def test_resume_failed_file_under_renamed_parent(tmp_path, monkeypatch):
+    os.mkdir(tmp_path / "privet")
+    (tmp_path / "privet" / "mir.txt").write_text("data", encoding="utf-8")
+    items, conflicts = _scan(tmp_path)
+
+    rename_at = core._rename_at
+
+    def fail_files(parent_dir, dir_fd, src, dst):
+        if src == "mir.txt":
+            raise OSError("busy")
+        rename_at(parent_dir, dir_fd, src, dst)
+
+    monkeypatch.setattr(core, "_rename_at", fail_files)
+    journal = str(tmp_path / "journal.ndjson")
+    executor, _ = renamer_journal.rename_with_journal(
+        str(tmp_path), items, conflicts,
+        journal_path=journal, workers=1)
+    assert (executor.renamed, executor.errors) == (1, 1)
+    assert (tmp_path / "привет" / "mir.txt").exists()
+
+    monkeypatch.setattr(core, "_rename_at", rename_at)
+    assert renamer_journal.resume(journal, workers=1) == (1, 0)
+    assert (tmp_path / "привет" / "мир.txt").read_text(encoding="utf-8") == "data"
+
+    # и откат возвращает всё на место
+    assert renamer_journal.undo(journal, workers=1) == (2, 0)
+    assert (tmp_path / "privet" / "mir.txt").exists()
+
+
+
+def _files(path):
+    return {p.name: p.read_text(encoding="utf-8") for p in path.iterdir() if p.name != "journal.ndjson"}
+
+
+class Crash(BaseException):
+    """Обрыв процесса: не перехватывается исполнителем, как и настоящий сбой."""
+
+
+def _crash_on(monkeypatch, call):
+    rename_at = core._rename_at
+    calls = []
+
+    def crashing(*args):
+        calls.append(args)
+        if len(calls) == call:
+            raise Crash()
+        rename_at(*args)
+
+    monkeypatch.setattr(core, "_rename_at", crashing)
+    return rename_at
+
+
+def _swap(tmp_path):
+    (tmp_path / "a").write_text("A", encoding="utf-8")
+    (tmp_path / "b").write_text("B", encoding="utf-8")
+    return core.ItemStore([core.make_item("", "a", False, "b"), core.make_item("", "b", False, "a")])
+
+
+def test_resume_finishes_cycle_interrupted_midway(tmp_path, monkeypatch):
+    items = _swap(tmp_path)
+    journal = str(tmp_path / "journal.ndjson")
+    rename_at = _crash_on(monkeypatch, 3)
+    with pytest.raises(Crash):
+        renamer_journal.rename_with_journal(str(tmp_path), items, set(), journal_path=journal, workers=1)
+    assert sorted(_files(tmp_path).values()) == ["A", "B"]
+    assert len(_files(tmp_path)) == 2 and "a" not in _files(tmp_path)
+
+    monkeypatch.setattr(core, "_rename_at", rename_at)
+    messages = []
+    assert renamer_journal.resume(journal, workers=1, log=messages.append) == (1, 0)
+    assert "Уже выполнено до сбоя: 1" in messages
+    assert _files(tmp_path) == {"a": "B", "b": "A"}
+
+    assert renamer_journal.undo(journal, workers=1) == (2, 0)
+    assert _files(tmp_path) == {"a": "A", "b": "B"}
+
+
+def test_undo_rolls_back_cycle_interrupted_midway(tmp_path, monkeypatch):
+    items = _swap(tmp_path)
+    journal = str(tmp_path / "journal.ndjson")
+    rename_at = _crash_on(monkeypatch, 2)
+    with pytest.raises(Crash):
+        renamer_journal.rename_with_journal(str(tmp_path), items, set(), journal_path=journal, workers=1)
+
+    monkeypatch.setattr(core, "_rename_at", rename_at)
+    assert renamer_journal.undo(journal, workers=1) == (1, 0)
+    assert _files(tmp_path) == {"a": "A", "b": "B"}
+
+
+def test_undo_resumes_its_own_interrupted_cycle(tmp_path, monkeypatch):
+    items = _swap(tmp_path)
+    journal = str(tmp_path / "journal.ndjson")
+    renamer_journal.rename_with_journal(str(tmp_path), items, set(), journal_path=journal, workers=1)
+    assert _files(tmp_path) == {"a": "B", "b": "A"}
+
+    rename_at = _crash_on(monkeypatch, 3)
+    with pytest.raises(Crash):
+        renamer_journal.undo(journal, workers=1)
+
+    monkeypatch.setattr(core, "_rename_at", rename_at)
+    messages = []
+    assert renamer_journal.undo(journal, workers=1, log=messages.append) == (1, 0)
+    assert "Уже откачено до сбоя: 1" in messages
+    assert _files(tmp_path) == {"a": "A", "b": "B"}
+
+
+def test_finished_swap_without_done_marks_is_recognised(tmp_path):
+    items = _swap(tmp_path)
+    journal = str(tmp_path / "journal.ndjson")
+    renamer_journal.rename_with_journal(str(tmp_path), items, set(), journal_path=journal, workers=1)
+
+    # сбой до записи итоговых отметок: остались план и отметка временного шага
+    state = renamer_journal.read_journal(journal)
+    finals = {'{"op": "done", "id": %d}' % e["id"] for e in state.plans}
+    with open(journal, encoding="utf-8") as f:
+        lines = [line for line in f if line.strip() not in finals]
+    with open(journal, "w", encoding="utf-8") as f:
+        f.writelines(lines)
+
+    messages = []
+    assert renamer_journal.resume(journal, workers=1, log=messages.append) == (0, 0)
+    assert "Уже выполнено до сбоя: 2" in messages
+    assert _files(tmp_path) == {"a": "B", "b": "A"}
+
+
+def test_unexplained_leftover_is_refused(tmp_path, monkeypatch):
+    items = _swap(tmp_path)
+    journal = str(tmp_path / "journal.ndjson")
+    rename_at = _crash_on(monkeypatch, 2)
+    with pytest.raises(Crash):
+        renamer_journal.rename_with_journal(str(tmp_path), items, set(), journal_path=journal, workers=1)
+    # после сбоя кто-то убрал второй файл: шаг цикла по диску не восстановить
+    (_, name), = [(n, n) for n in _files(tmp_path) if core.RENAME_TMP_SUFFIX not in n]
+    os.remove(tmp_path / name)
+    before = _files(tmp_path)
+
+    monkeypatch.setattr(core, "_rename_at", rename_at)
+    messages = []
+    assert renamer_journal.resume(journal, workers=1, log=messages.append) == (0, 2)
+    assert sum(m.startswith("Пропуск (неоднозначно)") for m in messages) == 2
+    assert _files(tmp_path) == before
+
+
+def test_journal_job_runs_in_background_and_collects_log(tmp_path):
+    (tmp_path / "privet.txt").write_text("data", encoding="utf-8")
+    items, conflicts = _scan(tmp_path)
+    journal = str(tmp_path / "journal.ndjson")
+
+    job = renamer_journal.JournalJob(renamer_journal.rename_with_journal, str(tmp_path), items, conflicts,
+                                     journal_path=journal, workers=1).start()
+    job._thread.join()
+    messages, finished = job.drain()
+
+    assert finished and job.error is None
+    executor, path = job.result
+    assert (executor.renamed, path) == (1, journal)
+    assert any(m.startswith("OK:") for m in messages)
+
+    failing = renamer_journal.JournalJob(renamer_journal.resume, str(tmp_path / "missing.ndjson")).start()
+    failing._thread.join()
+    assert failing.drain() == ([], True)
+    assert isinstance(failing.error, OSError)
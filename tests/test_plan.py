@@ -0,0 +1,29 @@
+import pytest
+
+import renamer_core as core
+
+
+def test_missing_plan_fails_before_the_job_starts(tmp_path):
+    with pytest.raises(FileNotFoundError):
+        core.open_plan(str(tmp_path / "missing.csv"))
+    with pytest.raises(FileNotFoundError):
+        core.PlanLoadJob(str(tmp_path), str(tmp_path / "missing.csv"))
+
+
+def test_unknown_plan_format_fails_upfront(tmp_path):
+    path = tmp_path / "plan.csv"
+    path.write_text("rel_dir,old_name\n", encoding="utf-8")
+    with pytest.raises(ValueError):
+        core.open_plan(str(path), "xml")
+
+
+def test_plan_job_reads_items(tmp_path):
+    path = tmp_path / "plan.csv"
+    path.write_text("rel_dir,old_name,new_name\n,privet.txt,привет.txt\n", encoding="utf-8")
+    job = core.PlanLoadJob(str(tmp_path), str(path)).start()
+    job._thread.join()
+    items, finished = job.drain()
+
+    assert finished and job.error is None
+    assert [(it["old_name"], it["new_name"], it["do_rename"]) for it in items] == [
+        ("privet.txt", "привет.txt", True)]
@@ -0,0 +1,152 @@
+import json
+import os
+
+import pytest
+
+import renamer_core as core
+import renamer_journal
+
+
+def _items(tmp_path, *names):
+    return core.ItemStore(core.make_item("", old, False, new) for old, new in names)
+
+
+def _touch(path, text=""):
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(text)
+
+
+def test_target_created_after_listing_is_not_overwritten(tmp_path, monkeypatch):
+    _touch(tmp_path / "privet.txt", "src")
+    items = _items(tmp_path, ("privet.txt", "привет.txt"))
+
+    schedule = core.schedule_renames
+
+    def schedule_then_race(*args, **kwargs):
+        result = schedule(*args, **kwargs)
+        # цель появилась уже после чтения снимка папки
+        _touch(tmp_path / "привет.txt", "other")
+        return result
+
+    monkeypatch.setattr(core, "schedule_renames", schedule_then_race)
+    renamed, errors = core.RenameExecutor(str(tmp_path), items, set(), workers=1).run()
+
+    assert (renamed, errors) == (0, 1)
+    assert (tmp_path / "privet.txt").read_text(encoding="utf-8") == "src"
+    assert (tmp_path / "привет.txt").read_text(encoding="utf-8") == "other"
+
+
+def test_directory_target_created_after_listing_is_refused(tmp_path, monkeypatch):
+    os.mkdir(tmp_path / "dom")
+    items = core.ItemStore([core.make_item("", "dom", True, "дом")])
+
+    schedule = core.schedule_renames
+
+    def schedule_then_race(*args, **kwargs):
+        result = schedule(*args, **kwargs)
+        # пустую папку POSIX rename заменил бы молча
+        os.mkdir(tmp_path / "дом")
+        return result
+
+    monkeypatch.setattr(core, "schedule_renames", schedule_then_race)
+    renamed, errors = core.RenameExecutor(str(tmp_path), items, set(), workers=1).run()
+
+    assert (renamed, errors) == (0, 1)
+    assert (tmp_path / "dom").is_dir()
+    assert (tmp_path / "дом").is_dir()
+
+
+def test_swap_still_renames(tmp_path):
+    _touch(tmp_path / "a", "A")
+    _touch(tmp_path / "b", "B")
+    items = _items(tmp_path, ("a", "b"), ("b", "a"))
+
+    renamed, errors = core.RenameExecutor(str(tmp_path), items, set(), workers=1).run()
+
+    assert (renamed, errors) == (2, 0)
+    assert (tmp_path / "a").read_text() == "B"
+    assert (tmp_path / "b").read_text() == "A"
+
+
+def test_cycle_failing_on_first_step_is_not_reported_as_rolled_back(tmp_path, monkeypatch):
+    _touch(tmp_path / "a", "A")
+    _touch(tmp_path / "b", "B")
+    items = _items(tmp_path, ("a", "b"), ("b", "a"))
+
+    def fail(*args):
+        raise OSError("boom")
+
+    monkeypatch.setattr(core, "_rename_at", fail)
+    messages = []
+    renamed, errors = core.RenameExecutor(str(tmp_path), items, set(), workers=1,
+                                          log=messages.append).run()
+
+    assert (renamed, errors) == (0, 2)
+    skipped = [m for m in messages if m.startswith("Пропуск (цепочка)")]
+    assert len(skipped) == 1
+    assert "не выполнен" in skipped[0]
+    assert "откачен" not in skipped[0]
+
+
+class Crash(BaseException):
+    """Обрыв процесса посреди цепочки."""
+
+
+def _journal_ops(path):
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f]
+
+
+def test_cycle_temp_step_is_journaled_before_the_next_step(tmp_path, monkeypatch):
+    _touch(tmp_path / "a", "A")
+    _touch(tmp_path / "b", "B")
+    items = _items(tmp_path, ("a", "b"), ("b", "a"))
+    rename_at = core._rename_at
+    calls = []
+
+    def crash_on_second(*args):
+        calls.append(args)
+        if len(calls) == 2:
+            raise Crash()
+        rename_at(*args)
+
+    monkeypatch.setattr(core, "_rename_at", crash_on_second)
+    path = str(tmp_path / "journal.ndjson")
+    journal = renamer_journal.RenameJournal(path, str(tmp_path))
+    with pytest.raises(Crash):
+        core.RenameExecutor(str(tmp_path), items, set(), workers=1, journal=journal).run()
+    # файл журнала не закрывается: на диске только то, что уже сброшено
+
+    records = _journal_ops(path)
+    tmp, = [r for r in records if r["op"] == "plan" and "tmp" in r]
+    assert (tmp_path / tmp["name"]).exists()
+    assert {"op": "done", "id": tmp["id"]} in records
+    journal.close()
+
+
+def test_cycle_rollback_is_journaled_before_leaving_temp_name(tmp_path, monkeypatch):
+    _touch(tmp_path / "a", "A")
+    _touch(tmp_path / "b", "B")
+    items = _items(tmp_path, ("a", "b"), ("b", "a"))
+    rename_at = core._rename_at
+    path = str(tmp_path / "journal.ndjson")
+    seen = []
+
+    def fail_third(parent_dir, dir_fd, src, dst):
+        seen.append(src)
+        if len(seen) == 3:
+            raise OSError("busy")
+        if len(seen) == 5:
+            # возврат с временного имени: отметка отката уже на диске
+            tmp_id = next(r["id"] for r in _journal_ops(path) if "tmp" in r)
+            assert _journal_ops(path)[-1] == {"op": "undone", "id": tmp_id}
+        rename_at(parent_dir, dir_fd, src, dst)
+
+    monkeypatch.setattr(core, "_rename_at", fail_third)
+    with renamer_journal.RenameJournal(path, str(tmp_path)) as journal:
+        renamed, errors = core.RenameExecutor(str(tmp_path), items, set(), workers=1, journal=journal).run()
+
+    assert (renamed, errors) == (0, 2)
+    assert len(seen) == 5
+    assert (tmp_path / "a").read_text() == "A"
+    assert (tmp_path / "b").read_text() == "B"
@@ -0,0 +1,104 @@
+import os
+
+import renamer_core as core
+
+
+def _tree(tmp_path, *paths):
+    for path in paths:
+        full = tmp_path / path
+        if path.endswith("/"):
+            full.mkdir(parents=True, exist_ok=True)
+        else:
+            full.parent.mkdir(parents=True, exist_ok=True)
+            full.write_text("", encoding="utf-8")
+
+
+def _store(*rows):
+    return core.ItemStore(core.make_item(rel_dir, old, is_dir, new) for rel_dir, old, is_dir, new in rows)
+
+
+def _steps(phases):
+    """Этапы как списки цепочек из (src, dst, final) с путями относительно папки."""
+    return [[[(os.path.basename(src), os.path.basename(dst), final) for _, src, dst, final in chain]
+             for _, chains in phase for chain in chains]
+            for phase in phases]
+
+
+def test_chain_runs_from_its_end(tmp_path):
+    _tree(tmp_path, "a", "b")
+    items = _store(("", "a", False, "b"), ("", "b", False, "c"))
+
+    phases, blocked = core.schedule_renames(str(tmp_path), items, set())
+
+    assert not blocked
+    assert _steps(phases) == [[[("b", "c", True), ("a", "b", True)]]]
+
+
+def test_cycle_is_broken_by_temp_name(tmp_path):
+    _tree(tmp_path, "a", "b", "c")
+    items = _store(("", "a", False, "b"), ("", "b", False, "c"), ("", "c", False, "a"))
+
+    phases, blocked = core.schedule_renames(str(tmp_path), items, set())
+
+    assert not blocked
+    [[chain]] = _steps(phases)
+    assert len(chain) == 4
+    first, *middle, last = chain
+    tmp = first[1]
+    assert not first[2] and core.RENAME_TMP_SUFFIX in tmp
+    assert last == (tmp, {"a": "b", "b": "c", "c": "a"}[first[0]], True)
+    assert all(final for _, _, final in middle)
+    # каждое имя освобождается раньше, чем занимается
+    taken = {"a", "b", "c"}
+    for src, dst, _ in chain:
+        assert dst not in taken
+        taken.remove(src)
+        taken.add(dst)
+    assert taken == {"a", "b", "c"}
+
+
+def test_files_go_before_dirs_and_deeper_dirs_first(tmp_path):
+    _tree(tmp_path, "top/", "top/sub/", "top/sub/f")
+    items = _store(("", "top", True, "верх"), ("top", "sub", True, "под"),
+                   ("top/sub", "f", False, "ф"))
+
+    phases, blocked = core.schedule_renames(str(tmp_path), items, set())
+
+    assert not blocked
+    assert _steps(phases) == [[[("f", "ф", True)]],
+                              [[("sub", "под", True)]],
+                              [[("top", "верх", True)]]]
+
+
+def test_chain_with_a_dir_goes_to_the_dir_phase(tmp_path):
+    _tree(tmp_path, "x/", "y", "other")
+    # файл y ждёт, пока папка x освободит имя
+    items = _store(("", "x", True, "z"), ("", "y", False, "x"), ("", "other", False, "другой"))
+
+    phases, blocked = core.schedule_renames(str(tmp_path), items, set())
+
+    assert not blocked
+    assert _steps(phases) == [[[("other", "другой", True)]],
+                              [[("x", "z", True), ("y", "x", True)]]]
+
+
+def test_chain_into_an_immovable_name_is_blocked_whole(tmp_path):
+    _tree(tmp_path, "a", "b", "c")
+    # c не переименовывается: b → c невозможно, и a → b вслед за ним
+    items = _store(("", "a", False, "b"), ("", "b", False, "c"), ("", "d", False, "e"))
+    _tree(tmp_path, "d")
+
+    phases, blocked = core.schedule_renames(str(tmp_path), items, set())
+
+    assert sorted(blocked) == [0, 1]
+    assert _steps(phases) == [[[("d", "e", True)]]]
+
+
+def test_conflict_blocks_the_item(tmp_path):
+    _tree(tmp_path, "a", "b")
+    items = _store(("", "a", False, "x"), ("", "b", False, "y"))
+
+    phases, blocked = core.schedule_renames(str(tmp_path), items, {0})
+
+    assert list(blocked) == [0]
+    assert _steps(phases) == [[[("b", "y", True)]]]
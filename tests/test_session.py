@@ -0,0 +1,23 @@
+import os
+
+import pytest
+
+import renamer_core as core
+
+
+@pytest.mark.parametrize("name", ["session.json", "session" + core.SESSION_EXT])
+def test_removed_items_are_not_saved(tmp_path, name):
+    items = core.ItemStore([
+        core.make_item("", "privet.txt", False),
+        core.make_item("", "mir.txt", False),
+        core.make_item("dom", "kot.txt", False),
+    ])
+    items.remove(1)
+
+    path = str(tmp_path / name)
+    core.save_session(path, str(tmp_path), items)
+    root, loaded = core.load_session(path)
+
+    assert root == str(tmp_path)
+    assert [core.rel_path_of(info) for info in loaded] == ["privet.txt", os.path.join("dom", "kot.txt")]
+    assert loaded.removed == 0
@@ -0,0 +1,78 @@
+import renamer_core as core
+from renamer_watch import WatchSync
+
+
+def _sync(tmp_path, *rows):
+    items = core.ItemStore(core.make_item(rel_dir, old, is_dir, new) for rel_dir, old, is_dir, new in rows)
+    dir_index = core.DirIndex(items)
+    return WatchSync(str(tmp_path), items, dir_index), items, dir_index
+
+
+def _live(items):
+    return sorted((items[i]["rel_dir"], items[i]["old_name"], items[i]["new_name"])
+                  for i in range(len(items)) if not items.flags[i] & core.FLAG_REMOVED)
+
+
+def test_delete_marks_item_and_dir_subtree_removed(tmp_path):
+    sync, items, _ = _sync(tmp_path, ("", "papka", True, "папка"), ("papka", "f", False, "ф"),
+                           ("papka/sub", "g", False, "г"), ("", "keep", False, "кип"))
+
+    changes = sync.apply([("delete", "papka", True, None)])
+
+    assert changes.deleted == 1
+    assert sorted(changes.removed) == [0, 1, 2]
+    assert items.removed == 3
+    assert not any(items.flags[i] & core.FLAG_DO_RENAME for i in changes.removed)
+    assert _live(items) == [("", "keep", "кип")]
+
+
+def test_delete_of_unknown_path_is_ignored(tmp_path):
+    sync, items, _ = _sync(tmp_path, ("", "a", False, "а"))
+
+    changes = sync.apply([("delete", "missing", False, None)])
+
+    assert not changes and changes.deleted == 0
+
+
+def test_moved_dir_keeps_edits_of_its_contents(tmp_path):
+    sync, items, dir_index = _sync(tmp_path, ("", "papka", True, "папка"),
+                                   ("papka", "f", False, "правка"))
+    items.flags[1] |= core.FLAG_LOCKED
+
+    changes = sync.apply([("move", "papka", True, "drugaya")])
+
+    assert changes.moved == 1
+    assert _live(items) == [("", "drugaya", "другая"), ("drugaya", "f", "правка")]
+    [moved_file] = dir_index.indices("drugaya")
+    assert items.flags[moved_file] & core.FLAG_LOCKED
+    assert all(items.flags[i] & core.FLAG_REMOVED for i in dir_index.indices("papka"))
+
+
+def test_move_within_dir_keeps_locked_name(tmp_path):
+    sync, items, _ = _sync(tmp_path, ("", "a", False, "моё"))
+    items.flags[0] |= core.FLAG_LOCKED
+
+    sync.apply([("move", "a", False, "b")])
+
+    assert _live(items) == [("", "b", "моё")]
+
+
+def test_move_over_existing_item_replaces_it(tmp_path):
+    sync, items, _ = _sync(tmp_path, ("", "a", False, "а"), ("", "b", False, "б"))
+
+    changes = sync.apply([("move", "a", False, "b")])
+
+    assert sorted(changes.removed) == [0, 1]
+    assert _live(items) == [("", "b", "б")]
+
+
+def test_move_from_unknown_source_scans_new_dir(tmp_path):
+    (tmp_path / "novaya").mkdir()
+    (tmp_path / "novaya" / "f").write_text("", encoding="utf-8")
+    sync, items, _ = _sync(tmp_path)
+
+    changes = sync.apply([("move", "gde-to", True, "novaya")])
+
+    assert _live(items) == [("", "novaya", core.plan_new_name("novaya", True)),
+                            ("novaya", "f", core.plan_new_name("f", False))]
+    assert changes.dirs == {"", "novaya"}